@@ -25,16 +25,39 @@ import 'package:knowledge_recsys/services/base_client.dart';
 //	############################################################################
 //	ALTRI METODI
 
+// Scarica le informazioni di tutti i film con una richiesta a '/get-movies-info'
+// per ogni blocco di 'BaseClient.moviesInfoMaxIds' film (una sola per un carosello).
+Future<Map<String, dynamic>> fetchMoviesInfo(List<String> idMovies) async {
+  final chunks = [
+    for (var i = 0; i < idMovies.length; i += BaseClient.moviesInfoMaxIds)
+      idMovies.sublist(
+        i,
+        (i + BaseClient.moviesInfoMaxIds).clamp(0, idMovies.length),
+      ),
+  ];
+
+  final responses = await Future.wait(
+    chunks.map(
+      (chunk) => BaseClient.instance
+          .getMoviesInfo(idMovies: chunk)
+          .catchError((_) => null),
+    ),
+  );
+
+  return {
+    for (final String? moviesInfo in responses) ...toMap(moviesInfo ?? '{}'),
+  };
+}
+
 Future<List<Movie>> fetchMoviesFromData(Map<String, dynamic> data) async {
-  final ret = data.entries.map((item) async {
+  final moviesInfo = await fetchMoviesInfo(data.keys.toList());
+
+  final ret = data.entries.map((item) {
     // debugPrint("${(item.key).runtimeType}, ${(item.key)}");
     // debugPrint("${(item.value).runtimeType}, ${(item.value)}");
 
-    String? movieInfo = await BaseClient.instance
-        .getMovieInfo(idMovie: item.key)
-        .catchError((_) => null);
-
-    Map<String, dynamic> movieMap = toMap(movieInfo ?? '{}');
+    // I film sconosciuti al server sono omessi dalla risposta.
+    Map<String, dynamic> movieMap = moviesInfo[item.key] ?? {};
 
     final t = safeFirst(movieMap['title']) ?? "";
     final d = safeFirst(movieMap['description']) ?? "";
@@ -75,7 +98,7 @@ Future<List<Movie>> fetchMoviesFromData(Map<String, dynamic> data) async {
     );
   }).toList();
 
-  return (await Future.wait(ret)).whereType<Movie>().toList();
+  return ret;
 }
 
 //	############################################################################
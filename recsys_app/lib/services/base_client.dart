@@ -15,8 +15,11 @@
 //	############################################################################
 //	LIBRERIE
 
+import 'dart:convert';
 import 'dart:io';
 import 'package:dio/dio.dart';
+import 'package:knowledge_recsys/services/app_router.dart';
+import 'package:knowledge_recsys/services/session_manager.dart';
 
 //	############################################################################
 //	COSTANTI E VARIABILI
@@ -37,6 +40,16 @@ extension NLDioException on DioException {
 //	############################################################################
 //	CLASSI E ROUTE
 
+// Pagina di film restituita da '/get-movies': 'nextCursor' è null sull'ultima
+// pagina, 'totalCount' è il numero di film di tutta la query.
+class MoviesPage {
+  final List<String> ids;
+  final String? nextCursor;
+  final int? totalCount;
+
+  MoviesPage({required this.ids, this.nextCursor, this.totalCount});
+}
+
 class BaseClient {
   BaseClient._privateConstructor();
   static final BaseClient instance = BaseClient._privateConstructor();
@@ -46,6 +59,12 @@ class BaseClient {
   static const serverProtocol = 'http';
   static String _serverAddress = 'localhost';
   static const serverPort = '8000';
+  static const sessionHeader = 'X-Session-Token';
+  static const nextCursorHeader = 'X-Next-Cursor';
+  static const totalCountHeader = 'X-Total-Count';
+
+  // Numero massimo di film per chiamata a '/get-movies-info' (MOVIES_INFO_MAX_IDS sul server).
+  static const moviesInfoMaxIds = 500;
 
   String get serverAddress => _serverAddress;
   set serverAddress(String address) {
@@ -63,7 +82,33 @@ class BaseClient {
       followRedirects: false,
     );
 
-    return Dio(options);
+    // Ogni richiesta include il token di sessione ottenuto da '/login-user'.
+    // Se il server non riconosce più la sessione (scaduta, rimossa o server
+    // riavviato) risponde 401: il token salvato viene eliminato e l'utente
+    // torna alla schermata di login.
+    return Dio(options)
+      ..interceptors.add(
+        InterceptorsWrapper(
+          onRequest: (options, handler) {
+            final token = SessionManager.sessionToken;
+            if (token != null) options.headers[sessionHeader] = token;
+            handler.next(options);
+          },
+          onError: (error, handler) async {
+            if (error.response?.statusCode == 401 &&
+                SessionManager.sessionToken != null) {
+              await _onInvalidSession();
+            }
+            handler.next(error);
+          },
+        ),
+      );
+  }
+
+  Future<void> _onInvalidSession() async {
+    await SessionManager.logout();
+    final router = await AppRouter.instance.router;
+    router.go('/login');
   }
 
   //  ##########################################################################
@@ -73,6 +118,12 @@ class BaseClient {
   Future<dynamic> _getRequest(
     String api, [
     Map<String, dynamic>? params,
+  ]) async => (await _getResponse(api, params)).data;
+
+  // Come '_getRequest', ma restituisce anche gli header della risposta.
+  Future<Response> _getResponse(
+    String api, [
+    Map<String, dynamic>? params,
   ]) async {
     try {
       var response = await client.request(
@@ -87,7 +138,7 @@ class BaseClient {
         throw FormatException(errorMessage);
       }
 
-      return response.data;
+      return response;
     } on DioException catch (e) {
       if (e.isNoConnectionError) {
         errorMessage = 'Sei offline!';
@@ -121,28 +172,59 @@ class BaseClient {
   Future<dynamic> getMovieInfo({required String idMovie, String? type}) async =>
       _getRequest('/get-movie-info', {'id': idMovie, 'type': type ?? ""});
 
+  // Informazioni di più film (al massimo 'moviesInfoMaxIds') con una sola
+  // richiesta: la risposta è un oggetto JSON {id: informazioni del film}.
+  Future<dynamic> getMoviesInfo({
+    required List<String> idMovies,
+    List<String>? types,
+  }) async => _getRequest('/get-movies-info', {
+    'ids': idMovies.join(','),
+    if (types != null) 'types': types.join(','),
+  });
+
   // Si può anche specificare la categoria da recuperare.
   // Future<dynamic> getMovieTitle({required String idMovie}) async =>
   //     _getRequest('/get-movie-info', {'id': idMovie, 'type': 'title'});
 
-  Future<dynamic> getMoviesFromFeature({
+  // Con 'limit' il server restituisce al più 'limit' film a partire da 'cursor'
+  // (il 'nextCursor' della pagina precedente; null per la prima pagina).
+  Future<MoviesPage> getMoviesFromFeature({
     required String featureId,
     String? order,
-  }) async => _getRequest('/get-movies', {
+    int? limit,
+    String? cursor,
+  }) async => _getMoviesPage({
     'type': 'feature',
     'id': featureId,
     if (order != null) 'order': order,
+    if (limit != null) 'limit': limit,
+    if (cursor != null) 'cursor': cursor,
   });
 
-  Future<dynamic> getMoviesFromRatings({
+  Future<MoviesPage> getMoviesFromRatings({
     required String userId,
     String? order,
-  }) async => _getRequest('/get-movies', {
+    int? limit,
+    String? cursor,
+  }) async => _getMoviesPage({
     'type': 'ratings',
     'id': userId,
     if (order != null) 'order': order,
+    if (limit != null) 'limit': limit,
+    if (cursor != null) 'cursor': cursor,
   });
 
+  Future<MoviesPage> _getMoviesPage(Map<String, dynamic> params) async {
+    final response = await _getResponse('/get-movies', params);
+    final totalCount = response.headers.value(totalCountHeader);
+
+    return MoviesPage(
+      ids: List<String>.from(json.decode(response.data)),
+      nextCursor: response.headers.value(nextCursorHeader),
+      totalCount: totalCount != null ? int.tryParse(totalCount) : null,
+    );
+  }
+
   Future<dynamic> downloadMoviePoster({required String idMovie}) async {
     try {
       var response = await client.request(
@@ -223,8 +305,11 @@ class BaseClient {
     }
   }
 
-  Future<dynamic> loginUser({required String userId}) async =>
-      _postRequest('/login-user', {'userId': userId});
+  // Restituisce il token della sessione creata dal server per l'utente.
+  Future<String?> loginUser({required String userId}) async {
+    var data = await _postRequest('/login-user', {'userId': userId});
+    return data is Map ? data['sessionToken'] as String? : null;
+  }
 
   Future<dynamic> updateParams({
     int? minSupport,
@@ -28,25 +28,36 @@ import 'package:shared_preferences/shared_preferences.dart';
 
 class SessionManager {
   static String? _userId;
+  static String? _sessionToken;
 
   static String? get userId => _userId;
+  static String? get sessionToken => _sessionToken;
   static bool get isLoggedIn => _userId != null && _userId!.isNotEmpty;
 
   static Future<void> init() async {
     final prefs = await SharedPreferences.getInstance();
     _userId = prefs.getString('userId');
+    _sessionToken = prefs.getString('sessionToken');
   }
 
-  static Future<void> login(String id) async {
-    final prefs = await SharedPreferences.getInstance();
+  static Future<void> login(String id, [String? token]) async {
     _userId = id;
+    _sessionToken = token;
+    final prefs = await SharedPreferences.getInstance();
     await prefs.setString('userId', id);
+    if (token != null) {
+      await prefs.setString('sessionToken', token);
+    } else {
+      await prefs.remove('sessionToken');
+    }
   }
 
   static Future<void> logout() async {
     final prefs = await SharedPreferences.getInstance();
     _userId = null;
+    _sessionToken = null;
     await prefs.remove('userId');
+    await prefs.remove('sessionToken');
   }
 }
 
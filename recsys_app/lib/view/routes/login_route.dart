@@ -77,8 +77,8 @@ class _LoginRouteState extends State<LoginRoute> {
       if (userList.contains(userID)) {
         BaseClient.instance
             .loginUser(userId: userID)
-            .then((_) {
-              SessionManager.login(userID);
+            .then((token) {
+              SessionManager.login(userID, token);
               if (!mounted) return;
               WidgetsBinding.instance.addPostFrameCallback((_) {
                 context.go('/home/$userID');
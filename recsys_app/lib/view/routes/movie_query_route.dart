@@ -62,17 +62,20 @@ class _MovieQueryRouteState extends State<MovieQueryRoute> {
   final List<Movie> _movies = [];
   final List<String> _movieIds = [];
 
-  // Per limitare quanti film vengono scaricati e renderizzati per volta.
+  // Per limitare quanti film vengono scaricati e renderizzati per volta:
+  // il server restituisce una pagina di '_pageSize' id per richiesta.
   final int _pageSize = 10;
 
+  // Cursore della pagina successiva (null se non ci sono altre pagine).
+  String? _nextCursor;
+  int _totalCount = 0;
+
   final ScrollController _scrollController = ScrollController();
 
   bool _loadingIds = true;
   bool _loadingMore = false;
   bool _allLoaded = false;
 
-  int _page = 0;
-
   // Per modificare l'ordinamento dei risultati.
   String _selectedOrder = 'title';
 
@@ -90,25 +93,33 @@ class _MovieQueryRouteState extends State<MovieQueryRoute> {
     super.dispose();
   }
 
+  Future<MoviesPage?> _fetchIdsPage(String? cursor) async {
+    if (widget.queryType == 'feature') {
+      return BaseClient.instance.getMoviesFromFeature(
+        featureId: (widget.extras['feature'] as Feature).featureId,
+        order: _selectedOrder,
+        limit: _pageSize,
+        cursor: cursor,
+      );
+    } else if (widget.queryType == 'ratings') {
+      return BaseClient.instance.getMoviesFromRatings(
+        userId: widget.extras['userId'] as String,
+        order: _selectedOrder,
+        limit: _pageSize,
+        cursor: cursor,
+      );
+    }
+    return null;
+  }
+
   Future<void> _fetchIdsAndFirstBatch() async {
     setState(() => _loadingIds = true);
 
     try {
-      String? data;
-      if (widget.queryType == 'feature') {
-        data = await BaseClient.instance.getMoviesFromFeature(
-          featureId: (widget.extras['feature'] as Feature).featureId,
-          order: _selectedOrder,
-        );
-      } else if (widget.queryType == 'ratings') {
-        data = await BaseClient.instance.getMoviesFromRatings(
-          userId: widget.extras['userId'] as String,
-          order: _selectedOrder,
-        );
-      }
+      final page = await _fetchIdsPage(null);
 
-      // debugPrint("$data");
-      if (data == null) {
+      // debugPrint("$page");
+      if (page == null) {
         setState(() {
           _loadingIds = false;
           _allLoaded = true;
@@ -131,8 +142,7 @@ class _MovieQueryRouteState extends State<MovieQueryRoute> {
         return;
       }
 
-      _movieIds.addAll(toList<String>(data));
-      if (_movieIds.isEmpty) {
+      if (page.ids.isEmpty) {
         setState(() {
           _loadingIds = false;
           _allLoaded = true;
@@ -155,8 +165,11 @@ class _MovieQueryRouteState extends State<MovieQueryRoute> {
         return;
       }
 
-      setState(() => _loadingIds = false);
-      await _loadNextBatch();
+      setState(() {
+        _totalCount = page.totalCount ?? page.ids.length;
+        _loadingIds = false;
+      });
+      await _loadNextBatch(page);
       return;
     } catch (err) {
       // debugPrint('\n--- ERRORE ---\n$err\n-----\n');
@@ -176,34 +189,31 @@ class _MovieQueryRouteState extends State<MovieQueryRoute> {
     }
   }
 
-  Future<void> _loadNextBatch() async {
-    if (_loadingMore || _allLoaded || _movieIds.isEmpty) return;
-    setState(() => _loadingMore = true);
-
-    final start = _page * _pageSize;
-    final end = (_page * _pageSize + _pageSize).clamp(0, _movieIds.length);
-
-    if (start >= end) {
-      setState(() {
-        _loadingMore = false;
-        _allLoaded = true;
-      });
+  // Carica la pagina successiva di film ('firstPage' se già scaricata).
+  Future<void> _loadNextBatch([MoviesPage? firstPage]) async {
+    if (_loadingMore || _allLoaded) return;
+    if (firstPage == null && _nextCursor == null) {
+      setState(() => _allLoaded = true);
       return;
     }
+    setState(() => _loadingMore = true);
 
-    final batchIds = _movieIds.sublist(start, end);
     final recommendedIds =
         widget.extras['recommendedIds'] as Map<String, double?>?;
 
     try {
+      final page = firstPage ?? await _fetchIdsPage(_nextCursor);
+      final batchIds = page?.ids ?? [];
+
       final batchMovies = await fetchMoviesFromData({
         for (var idMovie in batchIds) idMovie: recommendedIds?[idMovie],
       });
 
       setState(() {
+        _movieIds.addAll(batchIds);
         _movies.addAll(batchMovies);
-        _page++;
-        if (end >= _movieIds.length) _allLoaded = true;
+        _nextCursor = page?.nextCursor;
+        if (_nextCursor == null) _allLoaded = true;
         _loadingMore = false;
       });
     } catch (err) {
@@ -359,7 +369,8 @@ class _MovieQueryRouteState extends State<MovieQueryRoute> {
               _loadingIds = true;
               _loadingMore = false;
               _allLoaded = false;
-              _page = 0;
+              _nextCursor = null;
+              _totalCount = 0;
             });
 
             await _fetchIdsAndFirstBatch();
@@ -383,9 +394,9 @@ class _MovieQueryRouteState extends State<MovieQueryRoute> {
                     .floor()
                     .clamp(1, maxColumns);
                 final numMovies = _movies.length;
-                final resultMessage = _movieIds.isEmpty
+                final resultMessage = _totalCount == 0
                     ? "Nessun film trovato"
-                    : "${_movieIds.length} film trovati";
+                    : "$_totalCount film trovati";
 
                 return Padding(
                   padding: const EdgeInsets.all(20.0),
@@ -407,7 +418,7 @@ class _MovieQueryRouteState extends State<MovieQueryRoute> {
                               ),
                             ),
                           ),
-                          if (_movieIds.isNotEmpty)
+                          if (_totalCount > 0)
                             TextButton.icon(
                               icon: Icon(Icons.sort),
                               onPressed: _showSortOptions,
@@ -0,0 +1,325 @@
+"""
+
+	async_http_server.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Implementa un server HTTP/1.1 alternativo, basato su asyncio, che espone
+	le stesse route di RecSys_RequestHandler. Ogni connessione resta aperta
+	(keep-alive) e può inviare più richieste di seguito (pipelining): le
+	risposte sono inviate nello stesso ordine. Le route vengono eseguite da
+	un pool di thread, così il calcolo del login non blocca gli altri client,
+	mentre i poster sono inviati dal loop degli eventi senza bloccarlo.
+	La lettura, l'esecuzione e l'invio di ogni richiesta hanno un timeout di
+	TIMEOUT secondi.
+
+	Avvio: python async_http_server.py
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+from constants import *
+
+from http_server import RecSys_RequestHandler
+
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.client import parse_headers
+import asyncio
+import io
+import os
+
+#	########################################################################	#
+#	VARIABILI GLOBALI
+
+MAX_HEADER_BYTES = 64 * 1024
+"""Dimensione massima (in byte) della riga di richiesta e degli header."""
+
+MAX_BODY_BYTES = 1024 * 1024
+"""Dimensione massima (in byte) del corpo di una richiesta."""
+
+#	########################################################################	#
+#	CLASSI
+
+class RecSys_AsyncRequest(RecSys_RequestHandler):
+	"""
+	Esegue le route di RecSys_RequestHandler su una richiesta già letta dal server asyncio.
+	La risposta (stato, header e corpo) viene raccolta in memoria invece di essere scritta sul socket.
+	"""
+
+	protocol_version = 'HTTP/1.1'
+
+	def __init__(self, command: str, path: str, request_version: str, headers, body: bytes, client_address):
+
+		# BaseHTTPRequestHandler.__init__ non viene chiamato: leggerebbe la richiesta dal socket.
+		self.command = command
+		self.path = path
+		self.request_version = request_version
+		self.requestline = f'{command} {path} {request_version}'
+		self.headers = headers
+		self.client_address = client_address
+		self.rfile = io.BytesIO(body)
+		self.close_connection = False
+
+		self.status = (HTTPStatus.INTERNAL_SERVER_ERROR, None)
+		self.response_headers = []
+		self.wfile = io.BytesIO()
+
+		self.file = None
+		"""File da inviare come corpo della risposta (poster), trasferito dal loop degli eventi."""
+
+		# end
+
+	def send_response(self, code, message = None):
+
+		self.log_request(code)
+
+		# Una nuova risposta (es. 500 dopo un errore) sostituisce quella eventualmente iniziata.
+		self.status = (code, message)
+		self.response_headers = []
+		self.wfile = io.BytesIO()
+
+		self.send_header('Server', self.version_string())
+		self.send_header('Date', self.date_time_string())
+
+		# end
+
+	def send_header(self, keyword, value):
+
+		if keyword.lower() == 'connection' and value.lower() == 'close':
+			self.close_connection = True
+
+		self.response_headers.append((keyword, str(value)))
+
+		# end
+
+	def end_headers(self):
+		pass
+
+	def _write_file(self, f):
+
+		# Il descrittore viene duplicato: resta valido anche dopo la chiusura di 'f' da parte di '_send_file'.
+		self.file = os.fdopen(os.dup(f.fileno()), 'rb')
+
+		# end
+
+	def response_head(self, keep_alive: bool) -> bytes:
+		"""Restituisce riga di stato e header della risposta, con Content-Length e Connection."""
+
+		code, message = self.status
+		if message is None:
+			message = self.responses.get(code, ('',))[0]
+
+		lines = [f'{self.protocol_version} {int(code)} {message}'.replace('\r', ' ').replace('\n', ' ')]
+
+		for keyword, value in self.response_headers:
+			# La lunghezza del corpo in memoria è ricalcolata; quella dei file è già indicata da '_send_file'.
+			if keyword.lower() == 'content-length' and self.file is None:
+				continue
+			if keyword.lower() == 'connection':
+				continue
+			lines.append(f'{keyword}: {value}')
+
+		if self.file is None and code != HTTPStatus.NOT_MODIFIED:
+			lines.append(f'Content-Length: {self.wfile.getbuffer().nbytes}')
+
+		lines.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+
+		return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace')
+
+		# end
+
+	# end class
+
+class RecSys_AsyncHTTPServer:
+
+	def __init__(self, address: str = ADDRESS, port: int = PORT, workers: int = ASYNC_WORKERS, timeout: float = TIMEOUT):
+
+		self.address = address
+		self.port = port
+		self.timeout = timeout
+
+		self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recsys')
+		"""Pool di thread su cui vengono eseguite le route."""
+
+		try:
+			asyncio.run(self.serve())
+		except KeyboardInterrupt:
+			pass
+
+		print('Interruzione del server in corso...')
+		self.executor.shutdown(wait=False, cancel_futures=True)
+		print('Arrivederci!')
+
+		# end
+
+	async def serve(self):
+
+		server = await asyncio.start_server(self.handle_connection, self.address, self.port, limit=MAX_HEADER_BYTES)
+		print("Server asyncio in esecuzione su " + str(self.address) + ":" + str(self.port) + "...")
+
+		async with server:
+			await server.serve_forever()
+
+		# end
+
+	async def read_request(self, reader: asyncio.StreamReader):
+		"""
+		Legge una richiesta dalla connessione.
+
+		Returns:
+			La tupla (command, path, version, headers, body), None se il client ha chiuso
+			la connessione, oppure il codice di errore HTTP se la richiesta non è valida.
+		"""
+
+		# Le righe vuote tra una richiesta e l'altra vengono ignorate.
+		line = b'\r\n'
+		while line in (b'\r\n', b'\n'):
+			line = await reader.readline()
+			if not line:
+				return None
+
+		parts = line.decode('latin-1').split()
+		if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+			return HTTPStatus.BAD_REQUEST
+
+		command, path, version = parts
+
+		header_lines = []
+		header_size = len(line)
+
+		while True:
+			line = await reader.readline()
+			header_size += len(line)
+
+			if header_size > MAX_HEADER_BYTES:
+				return HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE
+			if line in (b'\r\n', b'\n', b''):
+				break
+
+			header_lines.append(line)
+
+		headers = parse_headers(io.BytesIO(b''.join(header_lines) + b'\r\n'))
+
+		# I corpi delle richieste (JSON) sono piccoli: si accettano solo con Content-Length.
+		if 'Transfer-Encoding' in headers:
+			return HTTPStatus.LENGTH_REQUIRED
+
+		content_length = headers.get('Content-Length', '0').strip()
+		if not content_length.isdigit():
+			return HTTPStatus.BAD_REQUEST
+		if int(content_length) > MAX_BODY_BYTES:
+			return HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+		body = await reader.readexactly(int(content_length))
+		return command, path, version, headers, body
+
+		# end
+
+	async def send_response(self, writer: asyncio.StreamWriter, request: RecSys_AsyncRequest, keep_alive: bool):
+		"""Invia la risposta raccolta da 'request': i file sono trasferiti con 'loop.sendfile'."""
+
+		writer.write(request.response_head(keep_alive))
+
+		if request.file is None:
+			writer.write(request.wfile.getvalue())
+			await writer.drain()
+			return
+
+		with request.file as f:
+			await writer.drain()
+			# Usa os.sendfile (zero-copy) dove disponibile, altrimenti invia il file a blocchi.
+			await asyncio.get_running_loop().sendfile(writer.transport, f)
+
+		# end
+
+	async def send_error(self, writer: asyncio.StreamWriter, code: HTTPStatus):
+		"""Risponde con un errore di protocollo e chiude la connessione."""
+
+		writer.write(f'HTTP/1.1 {code.value} {code.phrase}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+		await writer.drain()
+
+		# end
+
+	async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+		loop = asyncio.get_running_loop()
+		client_address = writer.get_extra_info('peername') or ('', 0)
+
+		try:
+
+			while True:
+
+				#	########################################################	#
+				#	LETTURA DELLA RICHIESTA
+				#	Il timeout comprende l'attesa della richiesta successiva su una connessione keep-alive.
+
+				try:
+					parsed = await asyncio.wait_for(self.read_request(reader), self.timeout)
+				except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+					return
+				except (asyncio.LimitOverrunError, ValueError):
+					await self.send_error(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+					return
+
+				if parsed is None:
+					return
+
+				if isinstance(parsed, HTTPStatus):
+					await self.send_error(writer, parsed)
+					return
+
+				command, path, version, headers, body = parsed
+
+				connection = headers.get('Connection', '').lower()
+				keep_alive = 'close' not in connection if version == 'HTTP/1.1' else 'keep-alive' in connection
+
+				#	########################################################	#
+				#	ESECUZIONE DELLA ROUTE
+
+				request = RecSys_AsyncRequest(command, path, version, headers, body, client_address)
+				route = getattr(request, 'do_' + command, None)
+
+				if route is None:
+					await self.send_error(writer, HTTPStatus.NOT_IMPLEMENTED)
+					return
+
+				try:
+					await asyncio.wait_for(loop.run_in_executor(self.executor, route), self.timeout)
+				except asyncio.TimeoutError:
+					await self.send_error(writer, HTTPStatus.SERVICE_UNAVAILABLE)
+					return
+				except Exception:
+					await self.send_error(writer, HTTPStatus.INTERNAL_SERVER_ERROR)
+					return
+
+				#	########################################################	#
+				#	INVIO DELLA RISPOSTA
+
+				keep_alive = keep_alive and not request.close_connection
+
+				try:
+					await asyncio.wait_for(self.send_response(writer, request, keep_alive), self.timeout)
+				except (asyncio.TimeoutError, ConnectionError):
+					return
+
+				if not keep_alive:
+					return
+
+		finally:
+			writer.close()
+			try:
+				await writer.wait_closed()
+			except ConnectionError:
+				pass
+
+		# end
+
+	# end class
+
+#	########################################################################	#
+#	MAIN
+
+if __name__ == "__main__":
+	RecSys_AsyncHTTPServer()
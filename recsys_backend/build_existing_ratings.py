@@ -20,19 +20,32 @@ from constants import ML_DATASET_PATH_MAPPING, \
     EXISTING_RATINGS_PATH
 
 #   ########################################################################   #
-#   CARICAMENTO DEI DATASET
+#   MAIN
 
-ratings = pd.read_csv(ML_DATASET_PATH_MAPPING['ratings'])
-existing_movies = pd.read_csv(EXISTING_MOVIES_PATH)
+def main():
 
-#   ########################################################################   #
-#   FILTRAGGIO DEI RATING
-#   Si lasciano solo quelli relativi ai film presenti in 'existing_movies'.
+    #   ####################################################################   #
+    #   CARICAMENTO DEI DATASET
+
+    ratings = pd.read_csv(ML_DATASET_PATH_MAPPING['ratings'])
+    existing_movies = pd.read_csv(EXISTING_MOVIES_PATH)
+
+    #   ####################################################################   #
+    #   FILTRAGGIO DEI RATING
+    #   Si lasciano solo quelli relativi ai film presenti in 'existing_movies'.
+
+    filtered_ratings = ratings[ratings["movieId"].isin(existing_movies["movieID"])]
+
+    #   ####################################################################   #
+    #   SALVATAGGIO DELL'OUTPUT
+
+    filtered_ratings.to_csv(EXISTING_RATINGS_PATH, index=False)
+    print("existing_ratings.csv created successfully!")
 
-filtered_ratings = ratings[ratings["movieId"].isin(existing_movies["movieID"])]
+    # end
 
 #   ########################################################################   #
-#   SALVATAGGIO DELL'OUTPUT
+#   ENTRY POINT
 
-filtered_ratings.to_csv(EXISTING_RATINGS_PATH, index=False)
-print("existing_ratings.csv created successfully!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
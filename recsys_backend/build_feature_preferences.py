@@ -0,0 +1,134 @@
+"""
+
+    build_feature_preferences.py \n
+    by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+    Questo script calcola, per tutti gli utenti insieme, il rating medio di
+    ogni feature: la matrice (utenti x feature) è il prodotto sparso A x X
+    tra i rating degli utenti (reali e complementati, utenti x film) e la
+    matrice film x feature, diviso per il numero di film di ogni feature.
+    Il risultato è salvato in un matrix store binario (float32) che il
+    server apre in memory-mapping: al login il calcolo delle medie diventa
+    la lettura di una riga, a cui si applica solo la soglia MIN_SUPPORT.
+
+"""
+
+#   ########################################################################   #
+#   LIBRERIE
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import load_npz
+
+from constants import EXISTING_RATINGS_PATH, \
+    MOVIE_FEATURE_MATRIX_PATH, \
+    MOVIE_INDEX_PATH, \
+    RATINGS_COMPLEMENTED_STORE_PATH, \
+    FEATURE_PREFERENCES_STORE_PATH
+from build_ratings_complemented import build_ratings_matrix
+from id_mapping import load_movie_mapping
+from matrix_store import MatrixStore, create_matrix_store
+
+#   ########################################################################   #
+#   CALCOLO DELLE PREFERENZE
+
+def feature_support(X):
+    """Numero di film di ogni feature (colonne di X), come in 'compute_feature_means'."""
+    return X.T.dot(np.ones(X.shape[0], dtype=float))
+
+    # end
+
+def feature_means_block(A_block, XT, support):
+    """
+    Rating medio di ogni feature per un blocco di utenti.
+
+    Args:
+        A_block: array denso (utenti x film) dei rating, 0 dove l'utente non ha rating.
+        XT: trasposta CSR della matrice film x feature.
+        support: numero di film di ogni feature.
+
+    Returns:
+        Array (utenti x feature) delle medie, 0 per le feature senza film.
+    """
+
+    sums = (XT @ A_block.T).T
+    return np.divide(sums, support, out=np.zeros_like(sums), where=(support != 0))
+
+    # end
+
+def build_feature_preferences(store: MatrixStore, comp_store: MatrixStore, R, X, block_size: int):
+    """
+    Scrive nello store le medie delle feature di tutti gli utenti, a blocchi di 'block_size'.
+    I rating di ogni utente sono quelli complementati, sostituiti da quelli reali dove presenti.
+    """
+
+    XT = X.T.tocsr().astype(float)
+    support = feature_support(X)
+
+    for start in range(0, R.shape[0], block_size):
+        end = min(start + block_size, R.shape[0])
+
+        A_block = np.nan_to_num(np.asarray(comp_store.data[start:end], dtype=float), nan=0.0)
+        R_block = R[start:end]
+        A_block[R_block.nonzero()] = R_block.data
+
+        store.data[start:end] = feature_means_block(A_block, XT, support)
+        print(f"Computed {end}/{R.shape[0]} users..")
+
+    # end
+
+#   ########################################################################   #
+#   MAIN
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Calcola il rating medio di ogni feature per tutti gli utenti.")
+    parser.add_argument('--output', default=FEATURE_PREFERENCES_STORE_PATH, type=str,
+        help="percorso del matrix store binario da generare")
+    parser.add_argument('--block-size', default=256, type=int,
+        help="numero di utenti elaborati insieme in ogni blocco")
+    args = parser.parse_args()
+
+    #   ####################################################################   #
+    #   CARICAMENTO DEI DATI NECESSARI
+
+    print("Loading ratings and movie-feature matrix...")
+    ratings_df = pd.read_csv(EXISTING_RATINGS_PATH)
+    movie_mapping = load_movie_mapping(MOVIE_INDEX_PATH)
+    X = load_npz(MOVIE_FEATURE_MATRIX_PATH).tocsr()
+    comp_store = MatrixStore(RATINGS_COMPLEMENTED_STORE_PATH)
+
+    if not np.array_equal(comp_store.cols.ids, movie_mapping.ids):
+        raise ValueError(f"Le colonne di {RATINGS_COMPLEMENTED_STORE_PATH} non seguono {MOVIE_INDEX_PATH}: rigenerarlo")
+
+    #   ####################################################################   #
+    #   COSTRUZIONE DELLE PREFERENZE (utenti x feature)
+
+    # Le righe seguono quelle dello store dei rating complementati.
+    user_ids = comp_store.rows.ids
+    R = build_ratings_matrix(ratings_df[ratings_df["userId"].isin(user_ids)], user_ids, movie_mapping)
+
+    tmp_path = f"{args.output}.tmp"
+    store = create_matrix_store(tmp_path, user_ids, np.arange(X.shape[1]), fill=0.0)
+
+    print(f"Computing feature preferences of {len(user_ids)} users...")
+    build_feature_preferences(store, comp_store, R, X, args.block_size)
+
+    #   ####################################################################   #
+    #   SALVATAGGIO DEGLI OUTPUT
+
+    store.flush()
+    del store
+    os.replace(tmp_path, args.output)
+    print(f"Saved feature preferences to {args.output} !")
+
+    # end
+
+#   ########################################################################   #
+#   ENTRY POINT
+
+if __name__ == '__main__':
+    main()
@@ -7,82 +7,310 @@
     valutato. Siccome il motore di raccomandazione implementato è
     knowledge-based, il rating viene stimato utilizzando la similarità
     coseno tra i film basata sulle loro feature. I risultati sono salvati
-    in file CSV separati per ogni utente.
+    in un unico matrix store binario (utenti x film, float32), in cui i film
+    già valutati dall'utente valgono NaN. Con '--export-csv' vengono scritti
+    anche i file CSV separati per ogni utente, utili per il debug.
 
 """
 
 #   ########################################################################   #
 #   LIBRERIE
 
+import argparse
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-from scipy.sparse import load_npz
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import csr_matrix, issparse, load_npz, save_npz
 
-from pathlib import Path
 from constants import EXISTING_RATINGS_PATH, \
-    EXISTING_MOVIES_PATH, \
-    MOVIE_FEATURE_MATRIX_PATH
+    MOVIE_FEATURE_MATRIX_PATH, \
+    MOVIE_INDEX_PATH, \
+    MOVIE_SIMILARIITY_KNN_PATH, \
+    RATINGS_COMPLEMENTED_DIR, \
+    RATINGS_COMPLEMENTED_STORE_PATH
+from id_mapping import load_movie_mapping
+from matrix_store import MatrixStore, create_matrix_store
+from similarity_engine import DEFAULT_MAX_MEM, \
+    PredictionAccumulator, \
+    compute_similarity, \
+    parse_memory_size, \
+    predict_from_sums, \
+    user_rating_means
 
 #   ########################################################################   #
-#   CARICAMENTO DEI DATI NECESSARI
+#   PREDIZIONE VETTORIZZATA DEI RATING
+
+def build_ratings_matrix(ratings_df, user_ids, movie_mapping):
+    """
+    Costruisce la matrice sparsa R (utenti x film) dei rating reali.
+    Le righe seguono 'user_ids' (ordinati), le colonne l'ordine della matrice film x feature.
+    """
+
+    rows = np.searchsorted(user_ids, ratings_df["userId"].to_numpy())
+    cols = movie_mapping.to_rows(ratings_df["movieId"].astype(int).to_numpy())
+
+    # Si scartano i rating di film non presenti nella matrice delle feature.
+    valid = cols >= 0
+    return csr_matrix(
+        (ratings_df["rating"].to_numpy(dtype=float)[valid], (rows[valid], cols[valid])),
+        shape=(len(user_ids), len(movie_mapping))
+    )
+
+    # end
+
+def complement_ratings_block(R_block, S):
+    """
+    Predice i rating di un blocco di utenti per tutti i film.
+
+    Per ogni film non visto 'j' la predizione è la media dei voti reali pesata
+    con la similarità: (R x S)[u, j] / (B x S)[u, j], dove B è la maschera binaria
+    dei film valutati. Se la somma delle similarità è nulla si usa la media dei
+    voti dell'utente (0.5 se non ci sono voti); il risultato è limitato tra 1 e 5.
+
+    Args:
+        R_block: matrice sparsa CSR (utenti x film) dei rating reali del blocco.
+        S: matrice di similarità (film x film), densa o sparsa, dove S[i, j] è il
+            peso del film valutato 'i' nella predizione del film 'j'. La matrice
+            coseno completa è simmetrica; per il grafo k-NN si usa la trasposta.
+
+    Returns:
+        Matrice densa float32 (utenti x film), con NaN sui film già valutati.
+    """
+
+    B_block = R_block.copy()
+    B_block.data[:] = 1.0
+
+    numerator = R_block @ S
+    denominator = B_block @ S
+
+    if issparse(numerator):
+        numerator, denominator = numerator.toarray(), denominator.toarray()
+
+    pred = predict_from_sums(np.asarray(numerator), np.asarray(denominator), user_rating_means(R_block))
+
+    # I film già valutati non hanno una predizione.
+    pred[B_block.nonzero()] = np.nan
+
+    return pred
+
+    # end
+
+def complement_users(store: MatrixStore, R, S, start: int, end: int, block_size: int):
+    """Scrive nello store le predizioni degli utenti nelle righe [start, end), a blocchi di 'block_size'."""
+
+    for block_start in range(start, end, block_size):
+        block_end = min(block_start + block_size, end)
+        store.data[block_start:block_end] = complement_ratings_block(R[block_start:block_end], S)
+
+    # end
+
+#   ########################################################################   #
+#   ESECUZIONE PARALLELA
+
+_worker_state = {}
+"""Stato di un processo worker (similarità completa): store e accumulatore, inizializzati una sola volta."""
+
+def init_columns_worker(store_path, R, X):
+    """Apre lo store finale e prepara l'accumulatore delle predizioni del worker."""
+
+    store = MatrixStore(store_path, mode='r+')
+    _worker_state['store'] = store
+    _worker_state['accumulator'] = PredictionAccumulator(R, store.data)
+    _worker_state['X'] = X
+
+    # end
+
+def complement_columns(start: int, end: int, max_mem):
+    """
+    Predice, per tutti gli utenti, i film alle colonne [start, end) dello store.
+
+    La similarità è simmetrica: le righe [start, end) contengono i pesi dei film
+    valutati nella predizione di quei film. Il worker le calcola a blocchi nel
+    budget 'max_mem' e scrive le colonne corrispondenti nello store finale, senza
+    che la matrice film x film venga mai costruita, in memoria o su disco.
+    """
 
-print("Loading ratings and similarity matrix...")
-ratings_df = pd.read_csv(EXISTING_RATINGS_PATH)
-movies_df = pd.read_csv(EXISTING_MOVIES_PATH)
-X = load_npz(MOVIE_FEATURE_MATRIX_PATH)
+    compute_similarity(_worker_state['X'], _worker_state['accumulator'], max_mem=max_mem, dtype=np.float64, rows=(start, end))
+    _worker_state['store'].flush()
+    return end - start
+
+    # end
+
+def complement_columns_parallel(store_path, R, X, workers: int, max_mem):
+    """Suddivide i film in intervalli di colonne e li elabora su un pool di 'workers' processi."""
+
+    # Più intervalli che worker, per bilanciare il carico; il budget di memoria è diviso tra i worker.
+    n_items = X.shape[0]
+    n_shards = min(n_items, workers * 4)
+    bounds = np.linspace(0, n_items, n_shards + 1).astype(int)
+    worker_mem = max(1, parse_memory_size(max_mem) // workers)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_columns_worker, initargs=(store_path, R, X)) as executor:
+        futures = [
+            executor.submit(complement_columns, start, end, worker_mem)
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+        ]
+        done = 0
+        for future in futures:
+            done += future.result()
+            print(f"Predicted {done}/{n_items} movies..")
+
+    # end
+
+def complement_shard(store_path, sim_path, R_shard, start: int, block_size: int):
+    """
+    Elabora uno shard di utenti in un processo worker (grafo k-NN).
+
+    Il grafo non viene serializzato per ogni task: il worker lo legge dal file
+    .npz condiviso. Le predizioni sono scritte direttamente nelle righe dello
+    shard all'interno dello store finale.
+    """
+
+    S = load_npz(sim_path)
+    store = MatrixStore(store_path, mode='r+')
+
+    # Le righe di 'R_shard' partono da 0, quelle dello store da 'start'.
+    for block_start in range(0, R_shard.shape[0], block_size):
+        block_end = min(block_start + block_size, R_shard.shape[0])
+        store.data[start + block_start:start + block_end] = complement_ratings_block(R_shard[block_start:block_end], S)
+
+    store.flush()
+    return R_shard.shape[0]
+
+    # end
+
+def complement_users_parallel(store_path, R, sim_path, workers: int, block_size: int):
+    """Suddivide gli utenti in shard e li elabora su un pool di 'workers' processi (grafo k-NN)."""
+
+    # Più shard che worker, per bilanciare il carico tra utenti con molti o pochi rating.
+    n_shards = min(R.shape[0], workers * 4)
+    bounds = np.linspace(0, R.shape[0], n_shards + 1).astype(int)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(complement_shard, store_path, sim_path, R[start:end], start, block_size)
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+        ]
+        done = 0
+        for future in futures:
+            done += future.result()
+            print(f"Predicted {done}/{R.shape[0]} users..")
+
+    # end
 
 #   ########################################################################   #
-#   CALCOLO DELLA SIMILARITÀ COSENO TRA TUTTI I FILM
+#   ESPORTAZIONE CSV (DEBUG)
+
+def export_csv(store: MatrixStore, output_dir=RATINGS_COMPLEMENTED_DIR):
+    """
+    Esporta il matrix store nei file CSV 'ratings_complemented_user_<id>.csv',
+    uno per utente, con le sole predizioni (i film già valutati sono esclusi).
+    """
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    movie_ids = store.cols.ids
+
+    for user_id, row in zip(store.rows.ids, store.data):
+        mask = ~np.isnan(row)
+        comp_df = pd.DataFrame({
+            "userId": user_id,
+            "movieId": movie_ids[mask],
+            "rating": row[mask].astype(float)
+        })
 
-movie_ids = movies_df['movieID'].astype(int).tolist()
-sim_matrix = cosine_similarity(X, dense_output=True)
+        output_path_user = output_dir / f'ratings_complemented_user_{user_id}.csv'
+        comp_df.to_csv(output_path_user, index=False)
+
+    print(f"Exported complemented ratings CSVs to {output_dir} !")
+
+    # end
 
 #   ########################################################################   #
-#   COSTRUZIONE DEI RATING COMPLEMENTATI UTENTE PER UTENTE
+#   MAIN
+
+def main():
 
-# Creiamo un DataFrame per accedere comodamente alla similarità tra film
-sim_df = pd.DataFrame(sim_matrix, index=movie_ids, columns=movie_ids)
+    parser = argparse.ArgumentParser(description="Stima i rating dei film non ancora valutati da ogni utente.")
+    parser.add_argument('--output', default=RATINGS_COMPLEMENTED_STORE_PATH, type=str,
+        help="percorso del matrix store binario da generare")
+    parser.add_argument('--block-size', default=128, type=int,
+        help="numero di utenti predetti insieme in ogni blocco (solo grafo k-NN)")
+    parser.add_argument('--max-mem', default=DEFAULT_MAX_MEM, type=str,
+        help="budget di memoria per blocco di similarità (es. 512M, 2G)")
+    parser.add_argument('--similarity', default='full', choices=['full', 'knn'],
+        help="similarità tra film: matrice coseno completa o grafo k-NN di build_similarity_matrix.py --top-k")
+    parser.add_argument('--workers', default=1, type=int,
+        help="numero di processi worker (1 = esecuzione sequenziale)")
+    parser.add_argument('--export-csv', action='store_true',
+        help="esporta anche i CSV per utente in " + str(RATINGS_COMPLEMENTED_DIR))
+    args = parser.parse_args()
 
-for user_id, group in ratings_df.groupby("userId"):
-    print(f"Predicting user {user_id}..")
+    #   ####################################################################   #
+    #   CARICAMENTO DEI DATI NECESSARI
 
-    # Film già valutati dall'utente
-    rated_movies = group["movieId"].astype(int).tolist()
-    rated_ratings = group["rating"].tolist()
-    rated_idx = rated_movies
+    print("Loading ratings and similarity matrix...")
+    ratings_df = pd.read_csv(EXISTING_RATINGS_PATH)
+    movie_mapping = load_movie_mapping(MOVIE_INDEX_PATH)
+    X = load_npz(MOVIE_FEATURE_MATRIX_PATH)
 
-    complemented_rows = []
+    #   ####################################################################   #
+    #   COSTRUZIONE DEI RATING COMPLEMENTATI
 
-    # Costruzione dizionario {movieId -> rating} per i film visti
-    user_ratings = {mid: r for mid, r in zip(rated_movies, rated_ratings)}
+    # Le righe della matrice film x feature seguono l'ordine di 'movie_mapping'.
+    user_ids = np.sort(ratings_df["userId"].unique())
+    R = build_ratings_matrix(ratings_df, user_ids, movie_mapping)
 
-    # Predizione rating per ogni film non ancora visto
-    for mid in movie_ids:
-        if mid not in user_ratings:
-            sims = sim_df.loc[mid, rated_idx].values
-            votes = np.array([user_ratings[m] for m in rated_movies])
+    # Lo store viene scritto su un file temporaneo e sostituito solo a fine calcolo.
+    tmp_path = f"{args.output}.tmp"
+    store = create_matrix_store(tmp_path, user_ids, movie_mapping.ids)
 
-            if sims.sum() > 0:
-                # Predizione basata su similarità pesata con i voti reali
-                pred = np.dot(sims, votes) / sims.sum()
-            else:
-                # Fallback: media dei voti reali (o 0.5 se non ci sono voti)
-                pred = np.mean(rated_ratings) if len(rated_ratings) > 0 else 0.5
+    if args.similarity == 'knn':
+        # Riga j del grafo = vicini di j: serve la trasposta, con i film valutati sulle righe.
+        print(f"Loading k-NN similarity graph from {MOVIE_SIMILARIITY_KNN_PATH}...")
+        sim_matrix = load_npz(MOVIE_SIMILARIITY_KNN_PATH).T.tocsr()
 
-            # Clipping tra 1 e 5 per mantenere i valori nel range corretto
-            pred = float(np.clip(pred, 1.0, 5.0))
-            complemented_rows.append((user_id, mid, pred))
+    if args.workers > 1 and args.similarity == 'knn':
+        # Il grafo k-NN (sparso) viene scritto una sola volta su disco e condiviso dai worker.
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(args.output))) as tmp_dir:
+            sim_path = os.path.join(tmp_dir, 'similarity.npz')
+            save_npz(sim_path, sim_matrix)
 
-            # end if
+            print(f"Predicting {len(user_ids)} users with {args.workers} workers...")
+            complement_users_parallel(tmp_path, R, sim_path, args.workers, args.block_size)
 
-        # end for mid
+    elif args.workers > 1:
+        # Ogni worker calcola le righe di similarità dei propri film e ne scrive le colonne nello store.
+        store.flush()
+        print(f"Computing cosine similarity and predicting {len(user_ids)} users with {args.workers} workers...")
+        complement_columns_parallel(tmp_path, R, X, args.workers, args.max_mem)
 
-    # Salvataggio dei rating complementati in un file CSV specifico per l'utente
-    output_path_user = Path(f'./data/ratings_complemented/ratings_complemented_user_{user_id}.csv')
-    comp_df = pd.DataFrame(complemented_rows, columns=["userId", "movieId", "rating"])
-    comp_df.to_csv(output_path_user, index=False)
+    elif args.similarity == 'knn':
+        print(f"Predicting {len(user_ids)} users...")
+        complement_users(store, R, sim_matrix, 0, len(user_ids), args.block_size)
 
-    print(f"Saved complemented ratings to {output_path_user} !")
+    else:
+        # Le predizioni sono accumulate blocco per blocco: la matrice film x film non è mai costruita.
+        print(f"Computing cosine similarity and predicting {len(user_ids)} users...")
+        compute_similarity(X, PredictionAccumulator(R, store.data), max_mem=args.max_mem, dtype=np.float64)
+
+    #   ####################################################################   #
+    #   SALVATAGGIO DEGLI OUTPUT
+
+    store.flush()
+    del store
+    os.replace(tmp_path, args.output)
+    print(f"Saved complemented ratings to {args.output} !")
+
+    if args.export_csv:
+        export_csv(MatrixStore(args.output))
+
+    # end
+
+#   ########################################################################   #
+#   ENTRY POINT
 
-    # end for user_id, group
\ No newline at end of file
+if __name__ == '__main__':
+    main()
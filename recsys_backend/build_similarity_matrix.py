@@ -10,40 +10,97 @@
     'movie_similarity_matrix.npz' e in una versione di anteprima in
     formato NPY chiamato 'movie_similarity_preview.npy'.
 
+    Con '--top-k K' viene invece costruito il grafo dei K vicini più simili
+    di ogni film (opzionalmente sopra la soglia '--min-sim'), salvato come
+    CSR compatta (float32, indici int32).
+
+    In entrambi i casi la similarità è calcolata a blocchi di righe, con
+    dimensione ricavata dal budget di memoria '--max-mem': l'anteprima densa
+    è scritta su disco blocco per blocco e non risiede mai in RAM.
+
 """
 
 #   ########################################################################    #
 #   LIBRERIE
 
-import numpy as np
-from scipy.sparse import load_npz, save_npz, csr_matrix
-from sklearn.metrics.pairwise import cosine_similarity
+import argparse
+
+from scipy.sparse import load_npz, save_npz
 
 from constants import MOVIE_FEATURE_MATRIX_PATH, \
     MOVIE_SIMILARIITY_MATRIX_PATH, \
-    MOVIE_SIMILARIITY_PREVIEW_PATH
+    MOVIE_SIMILARIITY_PREVIEW_PATH, \
+    MOVIE_SIMILARIITY_KNN_PATH
+from similarity_engine import DEFAULT_MAX_MEM, \
+    ConsumerGroup, \
+    DenseNpyWriter, \
+    SparseWriter, \
+    TopKSelector, \
+    compute_similarity
 
 #   ########################################################################    #
-#   CARICAMENTO DELLA MATRICE SPARSA (film x feature)
+#   MAIN
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Calcola la similarità coseno tra i film.")
+    parser.add_argument('--top-k', default=0, type=int,
+        help="numero di vicini da mantenere per film (0 = matrice completa)")
+    parser.add_argument('--min-sim', default=0.0, type=float,
+        help="similarità minima di un vicino (solo con --top-k)")
+    parser.add_argument('--max-mem', default=DEFAULT_MAX_MEM, type=str,
+        help="budget di memoria per blocco di similarità (es. 512M, 2G)")
+    parser.add_argument('--block-size', default=None, type=int,
+        help="numero di film per blocco (sovrascrive --max-mem)")
+    parser.add_argument('--no-preview', action='store_true',
+        help="non salva l'anteprima densa in formato .npy")
+    args = parser.parse_args()
+
+    #   ####################################################################    #
+    #   CARICAMENTO DELLA MATRICE SPARSA (film x feature)
+
+    print("Loading sparse movie-category matrix...")
+    X = load_npz(MOVIE_FEATURE_MATRIX_PATH)
+    print(f"Matrix shape: {X.shape}")  # (num_movies, num_categories)
+
+    #   ####################################################################    #
+    #   GRAFO DEI K VICINI PIÙ SIMILI
 
-print("Loading sparse movie-category matrix...")
-X = load_npz(MOVIE_FEATURE_MATRIX_PATH)
-print(f"Matrix shape: {X.shape}")  # (num_movies, num_categories)
+    if args.top_k > 0:
+        print(f"Computing top-{args.top_k} cosine neighbors...")
+        selector = TopKSelector(X.shape[0], args.top_k, args.min_sim)
+        knn_graph = compute_similarity(X, selector, args.block_size, args.max_mem)
 
-#   ########################################################################   #
-#   CALCOLO DELLA MATRICE DI SIMILARITÀ COSENO TRA I FILM
+        save_npz(MOVIE_SIMILARIITY_KNN_PATH, knn_graph)
+        print(f"Saved {knn_graph.nnz} neighbors to {MOVIE_SIMILARIITY_KNN_PATH}")
+        return
 
-print("Computing cosine similarity...")
-similarity_matrix = cosine_similarity(X, dense_output=False)  # mantiene output sparso
-similarity_matrix = csr_matrix(similarity_matrix)  # conversione a formato CSR
+    #   ####################################################################   #
+    #   CALCOLO DELLA MATRICE DI SIMILARITÀ COSENO TRA I FILM
 
-#   ########################################################################   #
-#   SALVATAGGIO DEGLI OUTPUT
+    print("Computing cosine similarity...")
+    consumers = [SparseWriter(X.shape[0])]  # mantiene output sparso (CSR)
 
-# Salvataggio della matrice di similarità in formato compresso
-save_npz(MOVIE_SIMILARIITY_MATRIX_PATH, similarity_matrix)
-print(f"Saved cosine similarity matrix to {MOVIE_SIMILARIITY_MATRIX_PATH}")
+    # L'anteprima densa in formato .npy viene scritta blocco per blocco durante il calcolo.
+    if not args.no_preview:
+        consumers.append(DenseNpyWriter(MOVIE_SIMILARIITY_PREVIEW_PATH, X.shape[0]))
+
+    similarity_matrix, *preview = compute_similarity(X, ConsumerGroup(*consumers), args.block_size, args.max_mem)
+
+    #   ####################################################################   #
+    #   SALVATAGGIO DEGLI OUTPUT
+
+    # Salvataggio della matrice di similarità in formato compresso
+    save_npz(MOVIE_SIMILARIITY_MATRIX_PATH, similarity_matrix)
+    print(f"Saved cosine similarity matrix to {MOVIE_SIMILARIITY_MATRIX_PATH}")
+
+    if preview:
+        print(f"Saved dense version preview to {MOVIE_SIMILARIITY_PREVIEW_PATH}")
+
+    # end
+
+#   ########################################################################    #
+#   ENTRY POINT
 
-# Salvataggio opzionale di una versione densa in formato .npy (anteprima)
-np.save(MOVIE_SIMILARIITY_PREVIEW_PATH, similarity_matrix.toarray())
-print(f"Saved dense version preview to {MOVIE_SIMILARIITY_PREVIEW_PATH}")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+
+    build_top_features.py \n
+    by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+    Questo script precalcola, per tutti gli utenti, il risultato della fase
+    di login del server: le top features e, per ognuna, i film non visti
+    candidati al MAB con i relativi rating complementati. Il calcolo usa le
+    stesse funzioni di http_server.py, così le liste coincidono con quelle
+    calcolate al login. Il risultato è salvato nello store SQLite
+    'top_features.sqlite', da cui il server legge la lista dell'utente con
+    una sola query quando i parametri coincidono con quelli precalcolati.
+
+"""
+
+#   ########################################################################   #
+#   LIBRERIE
+
+import argparse
+import os
+
+import numpy as np
+
+import http_server as server
+from constants import MIN_SUPPORT, \
+    TOP_FEATURES, \
+    TOP_FEATURES_STORE_PATH
+from top_features_store import create_top_features_store, encode_top_features
+
+#   ########################################################################   #
+#   CALCOLO DELLE TOP FEATURES
+
+def compute_top_features(user_id: str, min_support: int, top_features: int):
+    """Esegue per un utente il calcolo delle top features di '/login-user', senza leggere lo store."""
+
+    real_ratings, comp_ratings = server.load_user_ratings(user_id)
+    return server.compute_user_top_features(user_id, real_ratings, comp_ratings, min_support, top_features)
+
+    # end
+
+#   ########################################################################   #
+#   MAIN
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Precalcola le top features e i film candidati di tutti gli utenti.")
+    parser.add_argument('--min-support', nargs='+', default=[MIN_SUPPORT], type=int,
+        help="valori di MIN_SUPPORT da precalcolare")
+    parser.add_argument('--top-features', nargs='+', default=[TOP_FEATURES], type=int,
+        help="valori di TOP_FEATURES da precalcolare")
+    parser.add_argument('--output', default=TOP_FEATURES_STORE_PATH, type=str,
+        help="percorso dello store SQLite da generare")
+    args = parser.parse_args()
+
+    #   ####################################################################   #
+    #   UTENTI DA PRECALCOLARE
+
+    # Gli stessi utenti che possono effettuare il login.
+    if server.comp_ratings_store is not None:
+        user_ids = server.comp_ratings_store.rows.ids
+    else:
+        user_ids = np.sort(server.real_ratings_df['userId'].unique())
+
+    #   ####################################################################   #
+    #   COSTRUZIONE DELLO STORE
+
+    tmp_path = f"{args.output}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = create_top_features_store(tmp_path)
+
+    for min_support in args.min_support:
+        for top_features in args.top_features:
+            print(f"Computing top features of {len(user_ids)} users (MIN_SUPPORT={min_support}, TOP_FEATURES={top_features})...")
+
+            rows = (
+                (int(user_id), min_support, top_features, encode_top_features(compute_top_features(str(user_id), min_support, top_features)))
+                for user_id in user_ids
+            )
+
+            with connection:
+                connection.executemany('INSERT INTO user_top_features VALUES (?, ?, ?, ?)', rows)
+
+    #   ####################################################################   #
+    #   SALVATAGGIO DEGLI OUTPUT
+
+    connection.close()
+    os.replace(tmp_path, args.output)
+    print(f"Saved top features to {args.output} !")
+
+    # end
+
+#   ########################################################################   #
+#   ENTRY POINT
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,33 @@ PORT = 8000
 TIMEOUT = 30
 """Timeout massimo per le richieste HTTP (in secondi)."""
 
+ASYNC_WORKERS = 8
+"""Numero di thread con cui il server asyncio esegue le route (es. il login) senza bloccare il loop degli eventi."""
+
+SESSION_HEADER = 'X-Session-Token'
+"""Header HTTP con cui il client invia il token di sessione ottenuto da '/login-user'."""
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+"""Header HTTP con cui '/get-movies' restituisce il cursore della pagina successiva, se presente."""
+
+TOTAL_COUNT_HEADER = 'X-Total-Count'
+"""Header HTTP con cui '/get-movies' restituisce il numero totale di film della query, anche se paginata."""
+
+SESSION_MAX_COUNT = 256
+"""Numero massimo di sessioni utente mantenute contemporaneamente in memoria."""
+
+SESSION_TTL = 60 * 60
+"""Tempo di inattività (in secondi) dopo il quale una sessione utente scade."""
+
+POSTER_CACHE_MAX_AGE = 60 * 60 * 24
+"""Durata (in secondi) per cui il client può riutilizzare un poster scaricato senza rivalidarlo."""
+
+MOVIES_INFO_MAX_IDS = 500
+"""Numero massimo di film richiedibili con una sola chiamata a '/get-movies-info'."""
+
+MOVIES_STREAM_BLOCK = 1024
+"""Numero di id per blocco con cui le liste di film più lunghe vengono serializzate e inviate in streaming."""
+
 #	########################################################################	#
 #	PARAMETRI DEL SISTEMA DI RACCOMANDAZIONE
 
@@ -33,6 +60,12 @@ MOVIE_RECOMMENDATIONS = 5
 TOP_FEATURES = 5
 """Numero di feature raccomandate all’utente."""
 
+SOFTMAX_TEMPERATURE = 0.5
+"""Temperatura (tau) della softmax con cui il MAB campiona i film raccomandati per ogni feature."""
+
+MAB_SEED = None
+"""Seme del generatore casuale del MAB: None per estrazioni non riproducibili."""
+
 #	########################################################################	#
 #	PERCORSI UTILI
 
@@ -46,6 +79,9 @@ MOVIE_SIMILARIITY_PREVIEW_PATH = Path('./data/movie_cosine_similarity.npy')
 MOVIE_SIMILARIITY_MATRIX_PATH = Path('./data/movie_cosine_similarity.npz')
 """Indica il percorso del file NPZ contenente la matrice di similarità tra film."""
 
+MOVIE_SIMILARIITY_KNN_PATH = Path('./data/movie_knn_similarity.npz')
+"""Indica il percorso del file NPZ contenente il grafo dei vicini più simili di ogni film (CSR float32)."""
+
 MOVIE_FEATURE_MATRIX_PATH = Path('./data/movie_vectors_sparse.npz')
 """Indica il percorso del file NPZ contenente la matrice sparsa film x feature."""
 
@@ -55,6 +91,24 @@ FEATURE_INDEX_PATH = Path('./data/feature_index.csv')
 MOVIE_INDEX_PATH = Path('./data/movie_index.csv')
 """Indica il percorso del file CSV che mappa gli ID dei film con i loro indici nella matrice di similarità."""
 
+RATINGS_COMPLEMENTED_DIR = Path('./data/ratings_complemented')
+"""Indica il percorso della directory contenente i file CSV (di debug) dei rating complementati per utente."""
+
+RATINGS_COMPLEMENTED_STORE_PATH = Path('./data/ratings_complemented.bin')
+"""Indica il percorso del matrix store binario (utenti x film, float32) dei rating complementati."""
+
+FEATURE_PREFERENCES_STORE_PATH = Path('./data/feature_preferences.bin')
+"""Indica il percorso del matrix store binario (utenti x feature, float32) dei rating medi delle feature."""
+
+TOP_FEATURES_STORE_PATH = Path('./data/top_features.sqlite')
+"""Indica il percorso dello store SQLite delle top features precalcolate per ogni utente."""
+
+SIMILARITY_CACHE_DIR = Path('./data/similarity_cache')
+"""Indica il percorso della directory con le matrici di similarità (.npy) in cache, indicizzate per hash della matrice film x feature."""
+
+PIPELINE_MANIFEST_PATH = Path('./data/pipeline_manifest.json')
+"""Indica il percorso del manifest JSON con gli hash degli input e degli output di ogni fase della pipeline offline."""
+
 ML_DATASET_DIR = Path('./data/ml-latest-small')
 """Indica il percorso della directory del dataset 'ml-latest-small'."""
 
@@ -7,17 +7,25 @@
     Predizione di Rating. Confronta l'accuratezza (MAE, RMSE) di diversi
     algoritmi nella predizione dei rating nascosti nel test set.
     L'algoritmo custom 'RatingPredictor' replica la logica di
-    build_ratings_complemented.py con l'aggiunta di bias terms.
+    build_ratings_complemented.py con l'aggiunta di bias terms; le sue
+    predizioni sul test set sono calcolate in blocco ('predict_batch'),
+    con prodotti tra matrici sparse al posto di una chiamata per riga.
 
 """
 
 #   ########################################################################    #
 #   LIBRERIE
 
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
 import pandas as pd
 import numpy as np
-from scipy.sparse import load_npz
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import csr_matrix, load_npz
 from lenskit import crossfold as xf
 from lenskit import util
 from lenskit.algorithms import Recommender, als, item_knn as knn, user_knn as uknn
@@ -26,7 +34,12 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error
 from pathlib import Path
 from constants import EXISTING_RATINGS_PATH, \
     EXISTING_MOVIES_PATH, \
-    MOVIE_FEATURE_MATRIX_PATH
+    MOVIE_FEATURE_MATRIX_PATH, \
+    SIMILARITY_CACHE_DIR
+from id_mapping import IdMapping
+from similarity_engine import DEFAULT_MAX_MEM, \
+    SimilarityProvider, \
+    parse_memory_size
 
 #   ########################################################################    #
 #   COMANDI e MACRO
@@ -42,7 +55,7 @@ class CosineSimilarityRecommender:
     Questo recommender replica la logica di build_ratings_complemented.py
     ma aggiunge bias terms per migliorare l'accuratezza.
     """
-    def __init__(self, feature_matrix, movies_df, use_bias=True):
+    def __init__(self, feature_matrix, movies_df, use_bias=True, similarity=None):
         """
         Inizializza il recommender con la matrice di feature (X).
 
@@ -50,22 +63,21 @@ class CosineSimilarityRecommender:
             feature_matrix: La matrice sparse delle feature dei film
             movies_df: DataFrame con le informazioni sui film
             use_bias: Se True, usa bias terms (user e item bias)
+            similarity: SimilarityProvider condiviso tra più recommender; se None
+                la similarità viene calcolata (o caricata dalla cache su disco)
         """
         self.feature_matrix = feature_matrix
         self.movies_df = movies_df
         self.movie_ids = movies_df['movieID'].astype(int).tolist()
         self.use_bias = use_bias
 
-        # Calcola la similarità coseno
-        print(f"   Calculating cosine similarity matrix (bias={'ON' if use_bias else 'OFF'})...")
-        self.sim_matrix = cosine_similarity(feature_matrix, dense_output=True)
+        # Mappatura movieId <-> riga della matrice delle feature
+        self.movie_mapping = IdMapping(self.movie_ids)
 
-        # Crea un DataFrame per accedere comodamente alla similarità tra film
-        self.sim_df = pd.DataFrame(
-            self.sim_matrix,
-            index=self.movie_ids,
-            columns=self.movie_ids
-        )
+        # Similarità film x film in sola lettura, indicizzata per riga della matrice delle feature
+        if similarity is None:
+            similarity = SimilarityProvider(feature_matrix)
+        self.similarity = similarity
 
         self.user_profiles = {}  # {user_id: {movie_id: rating}}
         self.global_mean = None  # Media globale di tutti i rating
@@ -100,8 +112,45 @@ class CosineSimilarityRecommender:
                 item_mean = np.mean(ratings)
                 self.item_bias[int(item_id)] = item_mean - self.global_mean
 
+        self._build_matrices(train_data)
+
         return self
 
+    def _build_matrices(self, train_data):
+        """
+        Costruisce le strutture usate da 'predict_batch': la matrice sparsa R
+        (utenti x film) dei rating di training sui film presenti nella matrice
+        delle feature, la sua maschera binaria B, la media dei voti di ogni
+        utente e l'item bias per riga della matrice delle feature.
+        """
+        self.user_mapping = IdMapping(sorted(self.user_profiles))
+
+        user_rows = self.user_mapping.to_rows(train_data['user'].to_numpy())
+        item_rows = self.movie_mapping.to_rows(train_data['item'].astype(int).to_numpy())
+        mapped = item_rows >= 0
+
+        self.R = csr_matrix(
+            (train_data['rating'].to_numpy(dtype=float)[mapped], (user_rows[mapped], item_rows[mapped])),
+            shape=(len(self.user_mapping), len(self.movie_mapping))
+        )
+        self.B = self.R.copy()
+        self.B.data[:] = 1.0
+
+        # La media include anche i film assenti dalla matrice delle feature, come in 'predict'.
+        self.user_means = np.array([np.mean(list(self.user_profiles[u].values())) for u in self.user_mapping.ids])
+        self.rated_counts = np.diff(self.B.indptr)
+
+        self.item_bias_rows = np.zeros(len(self.movie_mapping))
+        if self.use_bias and self.item_bias:
+            bias_ids = np.fromiter(self.item_bias.keys(), dtype=np.int64)
+            bias_rows = self.movie_mapping.to_rows(bias_ids)
+            bias_values = np.fromiter(self.item_bias.values(), dtype=float)
+            self.item_bias_rows[bias_rows[bias_rows >= 0]] = bias_values[bias_rows >= 0]
+
+    def similarity_row(self, row):
+        """Restituisce la similarità coseno del film alla riga 'row' con tutti i film."""
+        return self.similarity.row(row)
+
     def predict(self, user, item):
         """
         Predice il rating per una coppia (user, item).
@@ -114,7 +163,8 @@ class CosineSimilarityRecommender:
         mid = int(item)
 
         # Verifica che il film esista nella matrice di similarità
-        if mid not in self.sim_df.index:
+        row = self.movie_mapping.row_of(mid)
+        if row is None:
             return np.nan
 
         # Ottieni il profilo dell'utente (film già valutati)
@@ -129,14 +179,14 @@ class CosineSimilarityRecommender:
         rated_ratings = list(user_ratings.values())
 
         # Filtra solo i film che esistono nella matrice di similarità
-        rated_idx = [m for m in rated_movies if m in self.sim_df.columns]
+        rated_idx = [m for m in rated_movies if m in self.movie_mapping]
 
         if len(rated_idx) == 0:
             # Fallback: media dei voti dell'utente
             return float(np.clip(np.mean(rated_ratings), 1.0, 5.0))
 
         # Logica di base
-        sims = self.sim_df.loc[mid, rated_idx].values
+        sims = self.similarity_row(row)[self.movie_mapping.to_rows(rated_idx)]
         votes = np.array([user_ratings[m] for m in rated_idx])
 
         if sims.sum() > 0:
@@ -168,6 +218,122 @@ class CosineSimilarityRecommender:
 
         return pred
 
+    def predict_batch(self, test_df):
+        """
+        Predice in blocco i rating di tutte le coppie (user, item) di 'test_df',
+        con gli stessi risultati di 'predict' chiamato riga per riga.
+
+        Le righe sono raggruppate per utente: per ogni utente la similarità tra
+        i film da predire e i film che ha valutato è calcolata con un unico
+        prodotto sparso (film da predire x film valutati), da cui si ricavano
+        con operazioni vettoriali numeratore, denominatore e similarità massima
+        (confidenza) di tutte le sue righe.
+
+        Returns:
+            Array delle predizioni nell'ordine delle righe di 'test_df'
+            (NaN dove 'predict' restituisce NaN).
+        """
+        user_rows = self.user_mapping.to_rows(test_df['user'].to_numpy())
+        item_rows = self.movie_mapping.to_rows(test_df['item'].astype(int).to_numpy())
+        preds = np.full(len(test_df), np.nan)
+
+        # Solo utenti con un profilo e film presenti nella matrice delle feature, raggruppati per utente
+        idx = np.flatnonzero((user_rows >= 0) & (item_rows >= 0))
+        idx = idx[np.argsort(user_rows[idx], kind='stable')]
+        if idx.size == 0:
+            return preds
+
+        u, i = user_rows[idx], item_rows[idx]
+
+        numerator = np.zeros(idx.size)
+        denominator = np.zeros(idx.size)
+        max_sim = np.zeros(idx.size)
+
+        bounds = np.flatnonzero(np.diff(u)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, idx.size]):
+            lo, hi = self.R.indptr[u[start]], self.R.indptr[u[start] + 1]
+            if lo == hi:
+                continue
+
+            # Similarità (film da predire x film valutati) e voti reali dell'utente
+            sims = self.similarity.submatrix(i[start:end], self.R.indices[lo:hi])
+            numerator[start:end] = sims @ self.R.data[lo:hi]
+            denominator[start:end] = sims.sum(axis=1)
+            max_sim[start:end] = sims.max(axis=1)
+
+        # Logica di base: media pesata, o media dei voti dell'utente se le similarità sono nulle
+        pred = np.divide(numerator, denominator, out=self.user_means[u].copy(), where=(denominator > 0))
+
+        # Aggiunta dei bias terms, pesati con (1 - confidenza), solo per chi ha film nella matrice
+        if self.use_bias and self.global_mean is not None:
+            confidence = np.minimum(1.0, max_sim * 2.0)
+            has_rated = self.rated_counts[u] > 0
+            pred[has_rated] += (self.item_bias_rows[i] * (1.0 - confidence))[has_rated]
+
+        pred = np.clip(pred, 1.0, 5.0)
+
+        # Film già valutati dall'utente: si restituisce il voto reale
+        rated = np.asarray(self.R[u, i]).ravel()
+        preds[idx] = np.where(rated > 0, rated, pred)
+
+        return preds
+
+    def predict_matrix(self, max_mem = DEFAULT_MAX_MEM):
+        """
+        Predice i rating di tutti gli utenti del training set (righe di
+        'user_mapping') per tutti i film della matrice delle feature, con le
+        stesse regole di 'predict': numeratori e denominatori di tutti gli
+        utenti sono calcolati con due prodotti R x S e B x S.
+
+        La similarità massima con i film valutati (confidenza dei bias) è
+        calcolata per blocchi di utenti: le righe di S dei film valutati da un
+        blocco non superano il budget di memoria 'max_mem' (es. '512M', '2G').
+
+        Returns:
+            Array denso (utenti x film) delle predizioni; i film già valutati
+            contengono il voto reale.
+        """
+        S = np.asarray(self.similarity.matrix)
+        n_users = len(self.user_mapping)
+
+        numerator = np.asarray(self.R @ S)
+        denominator = np.asarray(self.B @ S)
+
+        # Logica di base: media pesata, o media dei voti dell'utente se le similarità sono nulle
+        pred = np.repeat(self.user_means[:, None], S.shape[1], axis=1)
+        np.divide(numerator, denominator, out=pred, where=(denominator > 0))
+
+        # Aggiunta dei bias terms, pesati con (1 - confidenza)
+        if self.use_bias and self.global_mean is not None:
+            # La similarità massima con i film valutati non è un prodotto tra matrici: le righe di S
+            # dei film valutati da un blocco di utenti sono ridotte con un massimo per segmenti
+            max_sim = np.zeros_like(pred)
+            has_rated = self.rated_counts > 0
+            users = np.flatnonzero(has_rated)
+            rows_budget = max(1, parse_memory_size(max_mem) // (S.shape[1] * S.itemsize))
+
+            # Ogni blocco termina sull'ultimo utente le cui righe rientrano nel budget (almeno un utente)
+            first = 0
+            while first < users.size:
+                lo = self.R.indptr[users[first]]
+                last = max(first + 1, np.searchsorted(self.R.indptr[users + 1], lo + rows_budget, side='right'))
+                block = users[first:last]
+
+                starts = self.R.indptr[block]
+                rated = S[self.R.indices[starts[0]:self.R.indptr[block[-1] + 1]]]
+                max_sim[block] = np.maximum.reduceat(rated, starts - starts[0], axis=0)
+                first = last
+
+            pred[has_rated] += (self.item_bias_rows[None, :] * (1.0 - np.minimum(1.0, max_sim * 2.0)))[has_rated]
+
+        pred = np.clip(pred, 1.0, 5.0)
+
+        # Film già valutati dall'utente: si restituisce il voto reale
+        rated_users = np.repeat(np.arange(n_users), self.rated_counts)
+        pred[rated_users, self.R.indices] = self.R.data
+
+        return pred
+
 #   ########################################################################    #
 #   FUNZIONE DI VALUTAZIONE (SOLO PREDIZIONI)
 
@@ -178,10 +344,7 @@ def evaluate_predictions(algo_name, algo, train, test):
     if isinstance(algo, CosineSimilarityRecommender):
         # Logica per l'algoritmo custom
         fittable = algo.fit(train)
-        predictions = []
-        for _, row in test.iterrows():
-            pred = fittable.predict(row['user'], row['item'])
-            predictions.append(pred)
+        predictions = fittable.predict_batch(test)
 
         test_with_preds = test.copy()
         test_with_preds['prediction'] = predictions
@@ -203,12 +366,113 @@ def evaluate_predictions(algo_name, algo, train, test):
 
     return pd.DataFrame()
 
+#   ########################################################################    #
+#   CROSS VALIDATION PARALLELA
+
+def build_algorithms(X, movies_df, similarity=None):
+    """Restituisce gli algoritmi da valutare, indicizzati per nome."""
+
+    # Due versioni del cosine similarity predictor (con e senza bias), che condividono la stessa similarità
+    if similarity is None:
+        similarity = SimilarityProvider(X)
+
+    return {
+        'CosineSimilarityPredictor (no bias)': CosineSimilarityRecommender(X, movies_df, use_bias=False, similarity=similarity),
+        'CosineSimilarityPredictor (with bias)': CosineSimilarityRecommender(X, movies_df, use_bias=True, similarity=similarity),
+        'ItemKNN': knn.ItemItem(50),
+        'ALS': als.BiasedMF(50, iterations=10),
+        'UserKNN': uknn.UserUser(50),
+    }
+
+_worker_state = {}
+"""Stato di un processo worker: fold della cross validation e algoritmi, inizializzati una sola volta."""
+
+def init_worker(folds, X, movies_df, similarity):
+    """
+    Inizializza un processo worker. I fold e la matrice delle feature sono
+    ricevuti una sola volta per processo (su Linux, con 'fork', sono condivisi
+    in copy-on-write; altrove sono serializzati una volta per worker); la
+    similarità è aperta in memory-mapping dal file in cache, condiviso tra
+    tutti i worker, e non viene ricalcolata per ogni task.
+    """
+    _worker_state['folds'] = folds
+    _worker_state['algorithms'] = build_algorithms(X, movies_df, similarity)
+
+def error_metrics(df):
+    """MAE, RMSE e numero di predizioni valide di un DataFrame con 'rating' e 'prediction'."""
+    df = df.dropna(subset=['prediction'])
+    return {
+        'MAE': mean_absolute_error(df['rating'], df['prediction']) if len(df) else np.nan,
+        'RMSE': np.sqrt(mean_squared_error(df['rating'], df['prediction'])) if len(df) else np.nan,
+        'N_predictions': len(df)
+    }
+
+def evaluate_fold(fold, algo_name):
+    """Valuta l'algoritmo 'algo_name' sul fold 'fold' e ne restituisce le metriche di errore e il tempo."""
+    train, test = _worker_state['folds'][fold]
+    algo = _worker_state['algorithms'][algo_name]
+
+    start = time.perf_counter()
+    preds = evaluate_predictions(algo_name, algo, train, test)
+    elapsed = time.perf_counter() - start
+
+    if preds.empty:
+        return None
+
+    return {'Algorithm': algo_name, 'Fold': fold, **error_metrics(preds), 'Time_s': elapsed}
+
+def run_cross_validation(folds, X, movies_df, similarity, algo_names, workers=1):
+    """
+    Valuta ogni coppia (fold, algoritmo) su un pool di 'workers' processi
+    (in sequenza se workers <= 1) e restituisce le metriche di ogni coppia.
+    """
+    tasks = [(fold, algo_name) for fold in range(len(folds)) for algo_name in algo_names]
+    rows = []
+
+    def collect(task, get_result):
+        fold, algo_name = task
+        label = f"{algo_name} (fold {fold + 1}/{len(folds)})"
+        try:
+            result = get_result()
+            if result is not None:
+                rows.append(result)
+                print(f"    -> {label:<55} Fatto! ({result['Time_s']:.1f}s)")
+        except Exception as e:
+            print(f"    -> {label:<55} ERRORE: {type(e).__name__}: {e}")
+
+    if workers <= 1:
+        init_worker(folds, X, movies_df, similarity)
+        for task in tasks:
+            collect(task, lambda: evaluate_fold(*task))
+    else:
+        # 'fork' è sicuro solo su Linux: su macOS le librerie di sistema e BLAS avviano thread
+        # (per questo il metodo predefinito è 'spawn'); altrove si usa il metodo predefinito
+        # e la similarità è condivisa tramite il file in cache aperto in memory-mapping.
+        mp_context = get_context('fork') if sys.platform.startswith('linux') else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=init_worker,
+                                 initargs=(folds, X, movies_df, similarity)) as executor:
+            futures = {executor.submit(evaluate_fold, *task): task for task in tasks}
+            for future in as_completed(futures):
+                collect(futures[future], future.result)
+
+    return pd.DataFrame(rows)
+
 #   ########################################################################    #
 #   FUNZIONE PRINCIPALE
 
 def main():
     """Pipeline di valutazione focalizzata su MAE e RMSE."""
 
+    parser = argparse.ArgumentParser(description="Valuta l'accuratezza della predizione dei rating (MAE, RMSE).")
+    parser.add_argument('--folds', default=1, type=int,
+        help="numero di fold della cross validation (partizioni degli utenti)")
+    parser.add_argument('--workers', default=os.cpu_count(), type=int,
+        help="numero di processi worker per le coppie (fold, algoritmo); 1 = in sequenza")
+    parser.add_argument('--no-similarity-cache', action='store_true',
+        help="calcola la similarità in memoria, senza leggere o scrivere la cache in " + str(SIMILARITY_CACHE_DIR)
+            + " (fuori da Linux, con più worker, la matrice viene copiata in ogni worker)")
+    args = parser.parse_args()
+
     print("=" * 80)
     print("VALUTAZIONE ACCURATEZZA PREDIZIONE RATING (MAE, RMSE)")
     print("=" * 80)
@@ -233,46 +497,37 @@ def main():
 
     print("\n2. Inizializzazione algoritmi...")
 
-    # Crea due versioni del cosine similarity predictor: con e senza bias
-    cosine_predictor_no_bias = CosineSimilarityRecommender(X, movies_df, use_bias=False)
-    cosine_predictor_with_bias = CosineSimilarityRecommender(X, movies_df, use_bias=True)
+    # La similarità è calcolata una sola volta (o caricata dalla cache) e condivisa da tutti i recommender
+    similarity = SimilarityProvider(X, None if args.no_similarity_cache else SIMILARITY_CACHE_DIR)
+    if similarity.from_cache:
+        print(f"   ✓ Similarità tra film caricata da {similarity.path}")
+    else:
+        print(f"   ✓ Similarità tra film calcolata{f' e salvata in {similarity.path}' if similarity.path else ''}")
 
-    algorithms = {
-        'CosineSimilarityPredictor (no bias)': cosine_predictor_no_bias,
-        'CosineSimilarityPredictor (with bias)': cosine_predictor_with_bias,
-        'ItemKNN': knn.ItemItem(50),
-        'ALS': als.BiasedMF(50, iterations=10),
-        'UserKNN': uknn.UserUser(50),
-    }
-    print(f"   ✓ {len(algorithms)} algoritmi configurati per la predizione")
+    algo_names = list(build_algorithms(X, movies_df, similarity))
+    print(f"   ✓ {len(algo_names)} algoritmi configurati per la predizione")
 
     #   ####################################################################    #
     #   3. CROSS VALIDATION
 
     print(f"\n3. Esecuzione valutazione...")
-    all_preds = []
 
-    # Suddivide i dati in training e test
-    train, test = next(xf.partition_users(ratings, 1, xf.SampleFrac(0.2)))
-    print(f"   - Training set: {len(train)} rating")
-    print(f"   - Test set: {len(test)} rating (da predire)")
+    # Suddivide i dati in training e test: ogni fold ha come test il 20% dei rating di un gruppo di utenti
+    folds = [(train, test) for train, test in xf.partition_users(ratings, args.folds, xf.SampleFrac(0.2))]
+    for fold, (train, test) in enumerate(folds):
+        print(f"   - Fold {fold + 1}: {len(train)} rating di training, {len(test)} rating da predire")
 
-    for algo_name, algo in algorithms.items():
-        print(f"    -> Eseguendo {algo_name:<30}...", end="", flush=True)
-        try:
-            preds = evaluate_predictions(algo_name, algo, train, test)
-            if not preds.empty:
-                all_preds.append(preds)
-                print(" Fatto!")
-        except Exception as e:
-            print(f"ERRORE: {type(e).__name__}: {e}")
+    workers = max(1, min(args.workers, len(folds) * len(algo_names)))
+    print(f"   - {len(folds) * len(algo_names)} coppie (fold, algoritmo) su {workers} processi")
+
+    start = time.perf_counter()
+    fold_results = run_cross_validation(folds, X, movies_df, similarity, algo_names, workers)
+    wall_time = time.perf_counter() - start
 
-    if not all_preds:
+    if fold_results.empty:
         print("\nNessuna predizione generata!")
         return
 
-    all_preds_df = pd.concat(all_preds, ignore_index=True)
-
     #   ####################################################################    #
     #   4. CALCOLO E VISUALIZZAZIONE DELLE METRICHE DI ERRORE
 
@@ -280,26 +535,29 @@ def main():
     print("RISULTATI - METRICHE DI ERRORE")
     print("=" * 80 + "\n")
 
-    # Rimuove le righe dove la predizione è fallita
-    valid_preds = all_preds_df.dropna(subset=['prediction'])
+    valid_results = fold_results.dropna(subset=['MAE', 'RMSE'])
 
-    if valid_preds.empty:
+    if valid_results.empty:
         print("Nessuna predizione valida generata!")
         return
 
-    # Calcola le metriche per ogni algoritmo
-    results = valid_preds.groupby('Algorithm').apply(
-        lambda df: pd.Series({
-            'MAE': mean_absolute_error(df['rating'], df['prediction']),
-            'RMSE': np.sqrt(mean_squared_error(df['rating'], df['prediction'])),
-            'N_predictions': len(df)
-        })
-    )
+    # Media e deviazione standard delle metriche sui fold, tempo medio per fold di ogni algoritmo
+    grouped = valid_results.groupby('Algorithm')
+    results = pd.DataFrame({
+        'MAE': grouped['MAE'].mean(),
+        'MAE_std': grouped['MAE'].std(ddof=0),
+        'RMSE': grouped['RMSE'].mean(),
+        'RMSE_std': grouped['RMSE'].std(ddof=0),
+        'N_predictions': grouped['N_predictions'].sum(),
+        'N_folds': grouped['Fold'].count(),
+        'Time_s': grouped['Time_s'].mean()
+    })
 
     # Ordina i risultati per RMSE
     results = results.sort_values('RMSE')
 
-    print(results)
+    print(results.to_string())
+    print(f"\nTempo totale: {wall_time:.1f}s ({len(folds)} fold, {workers} processi)")
 
     # Calcola il miglioramento
     if 'CosineSimilarityPredictor (no bias)' in results.index \
@@ -317,6 +575,10 @@ def main():
     results.to_csv(output_path)
     print(f"\nRisultati salvati in: {output_path}")
 
+    folds_path = output_path.with_name('prediction_error_folds.csv')
+    fold_results.sort_values(['Algorithm', 'Fold']).to_csv(folds_path, index=False)
+    print(f"Risultati per fold salvati in: {folds_path}")
+
     # end
 
 #   ########################################################################    #
@@ -15,31 +15,30 @@
 
 from constants import *
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from id_mapping import IdMapping
+from matrix_store import MatrixStore
+from poster_index import PosterIndex
+from session_store import RecSys_SessionStore
+from top_features_store import TopFeaturesStore
+
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qsl
 import json
+import os
 
 import numpy as np
 import pandas as pd
-from scipy.sparse import load_npz
+from scipy.sparse import csr_matrix, load_npz
 
 #	########################################################################	#
 #	VARIABILI GLOBALI
 
-user_id = ""
-"""Identificativo dell'utente di cui si vogliono verificare le raccomandazioni."""
+sessions = RecSys_SessionStore()
+"""Store delle sessioni utente, ognuna con le preferenze calcolate al login."""
 
-top_features_list = []
-"""Lista di features, caratterizzate da (id, category, name, average_rating), a cui sono collegati i movies, caratterizzati da (movieId, rating, seen_bool), che includono tale feature."""
-
-real_ratings = {}
-"""Dizionario contenente i rating reali assegnati dall'utente loggato."""
-
-comp_ratings = {}
-"""Dizionario contenente i rating complementari predetti dal sistema per l'utente loggato."""
-
-all_ratings = {}
-"""Dizionario unificato contenente tutti i rating (reali e complementari) per l'utente loggato."""
+posters = PosterIndex(POSTER_DIR)
+"""Indice movieId -> percorso del poster, ricostruito solo quando cambia la directory."""
 
 #	########################################################################	#
 #	DATAFRAMES
@@ -61,54 +60,348 @@ feature_index_df = pd.read_csv(FEATURE_INDEX_PATH)
 
 U = real_ratings_df['userId'].unique().shape[0]
 
+real_ratings_order = np.argsort(real_ratings_df['userId'].to_numpy(), kind='stable')
+real_ratings_users = real_ratings_df['userId'].to_numpy()[real_ratings_order]
+"""Id utente dei rating reali, ordinati: i rating di un utente sono una fetta contigua trovata con 'searchsorted'."""
+real_ratings_movies = real_ratings_df['movieId'].to_numpy(dtype=np.int64)[real_ratings_order]
+real_ratings_values = real_ratings_df['rating'].to_numpy(dtype=float)[real_ratings_order]
+
 #	########################################################################	#
 #	MATRIX
 
 movie_features_matrix = load_npz(MOVIE_FEATURE_MATRIX_PATH)
 """Matrice sparsa contenente la rappresentazione vettoriale di un film secondo le sue features."""
 
+movie_features_csc = movie_features_matrix.tocsc()
+"""Copia CSC della matrice movie/features: indice inverso feature -> righe (film) ordinate."""
+movie_features_csc.eliminate_zeros()
+movie_features_csc.sort_indices()
+
 M, F = movie_features_matrix.shape
 
+feature_support = movie_features_matrix.T.dot(np.ones(M, dtype=float))
+"""Numero di film di ogni feature, calcolato una sola volta all'avvio."""
+
+comp_ratings_store = MatrixStore(RATINGS_COMPLEMENTED_STORE_PATH) if RATINGS_COMPLEMENTED_STORE_PATH.exists() else None
+"""Matrix store (utenti x film) dei rating complementati, mappato in memoria. Se assente si usano i CSV per utente."""
+
+feature_prefs_store = MatrixStore(FEATURE_PREFERENCES_STORE_PATH) if FEATURE_PREFERENCES_STORE_PATH.exists() else None
+"""Matrix store (utenti x feature) dei rating medi delle feature, mappato in memoria. Se assente le medie sono calcolate al login."""
+
+if feature_prefs_store is not None and feature_prefs_store.shape[1] != F:
+	print(f"{FEATURE_PREFERENCES_STORE_PATH} non corrisponde alla matrice delle features: le medie saranno calcolate al login.")
+	feature_prefs_store = None
+
+top_features_store = TopFeaturesStore(TOP_FEATURES_STORE_PATH) if TOP_FEATURES_STORE_PATH.exists() else None
+"""Store SQLite delle top features precalcolate per ogni utente. Se assente le top features sono calcolate al login."""
+
+#	########################################################################	#
+#	MAB
+
+mab_rng = np.random.default_rng(MAB_SEED)
+"""Generatore con cui il MAB campiona i film raccomandati."""
+
+#	########################################################################	#
+#	MAPPATURA DEGLI ID
+
+movie_mapping = IdMapping(movie_index_df.sort_values('matrix_id')['movie_id'].to_numpy())
+"""Mappatura O(1) tra l'id di un film e il suo indice all'interno della matrice movie/features."""
+
+#	########################################################################	#
+#	ORDINAMENTI PRECALCOLATI
+
+def build_title_rank():
+	"""
+	Restituisce per ogni riga della matrice movie/features la posizione del film nell'ordine
+	alfabetico dei titoli (-1 per i film senza titolo): un sottoinsieme di film si ordina
+	per titolo con un solo 'argsort' sui ranghi.
+	"""
+
+	title_order = movie_titles_df.sort_values('movie_name', kind='stable').drop_duplicates('movieID')
+	rows = movie_mapping.to_rows(title_order['movieID'].to_numpy())
+	valid = rows >= 0
+
+	title_rank = np.full(M, -1, dtype=np.int64)
+	title_rank[rows[valid]] = np.arange(np.count_nonzero(valid))
+	return title_rank
+
+	# end
+
+movie_title_rank = build_title_rank()
+"""Rango alfabetico del titolo di ogni film, indicizzato per riga della matrice movie/features."""
+
+movie_id_strings = movie_mapping.to_ids(np.arange(M)).astype(str).astype(object)
+"""Id dei film come stringhe, indicizzati per riga della matrice movie/features."""
+
+#	########################################################################	#
+#	DOCUMENTI DEI FILM
+#	Titoli, descrizioni e feature raggruppate per categoria, precalcolati all'avvio per '/get-movie-info' e '/get-movies-info'.
+
+movie_titles = movie_titles_df.dropna(subset=['movie_name']) \
+	.groupby('movieID')['movie_name'].agg(lambda names: names.astype(str).tolist()).to_dict()
+"""Dizionario movieId -> lista dei titoli del film."""
+
+movie_abstracts = movie_abstracts_df.dropna(subset=['value']) \
+	.groupby('movieId')['value'].agg(lambda values: values.astype(str).tolist()).to_dict()
+"""Dizionario movieId -> lista delle descrizioni del film."""
+
+feature_order = feature_index_df.dropna(subset=['feature']) \
+	.assign(feature=lambda df: df['feature'].astype(str)) \
+	.sort_values(['category', 'feature'], kind='stable')
+"""Feature (con nome) ordinate per (categoria, nome): la posizione di una feature in questo ordine è il suo rango."""
+
+feature_rank = np.full(F, -1, dtype=np.int64)
+feature_rank[feature_order['feature_id'].to_numpy()] = np.arange(len(feature_order))
+
+ranked_feature_names = feature_order['feature'].to_numpy(dtype=object)
+ranked_feature_categories, category_names = pd.factorize(feature_order['category'], sort=True)
+
+def build_ranked_movie_features():
+	"""
+	Restituisce la matrice CSR (film x rango) con le colonne della matrice movie/features
+	rinumerate per rango: le feature di ogni riga risultano raggruppate per categoria e ordinate per nome.
+	"""
+
+	coo = movie_features_matrix.tocoo()
+	keep = (coo.data > 0) & (feature_rank[coo.col] >= 0)
+
+	ranked = csr_matrix(
+		(np.ones(np.count_nonzero(keep), dtype=np.uint8), (coo.row[keep], feature_rank[coo.col[keep]])),
+		shape=(M, len(feature_order))
+	)
+	ranked.sum_duplicates()
+	ranked.sort_indices()
+	return ranked
+
+	# end
+
+movie_features_ranked = build_ranked_movie_features()
+"""Per ogni film, i ranghi delle sue feature in ordine crescente (cioè per categoria e nome)."""
+
+def movie_features_by_category(matrix_id: int) -> dict:
+	"""Restituisce le feature del film raggruppate per categoria, {categoria: nomi ordinati}, senza usare pandas."""
+
+	start, end = movie_features_ranked.indptr[matrix_id], movie_features_ranked.indptr[matrix_id + 1]
+	ranks = movie_features_ranked.indices[start:end]
+	categories = ranked_feature_categories[ranks]
+
+	# I ranghi sono ordinati: ogni categoria occupa un intervallo contiguo.
+	bounds = np.flatnonzero(np.diff(categories)) + 1
+	names = ranked_feature_names[ranks].tolist()
+
+	return {
+		category_names[categories[first]]: names[first:last]
+		for first, last in zip([0, *bounds.tolist()], [*bounds.tolist(), ranks.size])
+	}
+
+	# end
+
+def movie_static_document(movie_id: int, matrix_id: int) -> dict:
+	"""Restituisce le informazioni statiche di un film: titolo, descrizione e feature per categoria."""
+
+	return {
+		'title': movie_titles.get(movie_id, []),
+		'description': movie_abstracts.get(movie_id, []),
+		**movie_features_by_category(matrix_id)
+	}
+
+	# end
+
+DOCUMENT_FIELDS = ['title', 'description', *sorted(CATEGORIES_PATH_MAPPING.keys())]
+"""Campi statici dei documenti dei film, nell'ordine in cui compaiono nel JSON."""
+
+def build_movie_documents():
+	"""
+	Serializza una sola volta i documenti statici di tutti i film.
+
+	Ogni campo presente è salvato come frammento JSON ', "campo": valore' e i frammenti
+	sono concatenati, film dopo film, in un unico buffer di byte.
+
+	Returns:
+		Coppia (buffer, bounds): i frammenti del film di riga 'matrix_id' occupano
+		buffer[bounds[matrix_id, 0]:bounds[matrix_id, -1]], il j-esimo campo di
+		DOCUMENT_FIELDS buffer[bounds[matrix_id, j]:bounds[matrix_id, j + 1]] (vuoto se assente).
+	"""
+
+	fragments = []
+	bounds = np.zeros((M, len(DOCUMENT_FIELDS) + 1), dtype=np.int64)
+	offset = 0
+
+	for matrix_id, movie_id in enumerate(movie_mapping.to_ids(np.arange(M)).tolist()):
+		document = movie_static_document(movie_id, matrix_id)
+		bounds[matrix_id, 0] = offset
+
+		for j, field in enumerate(DOCUMENT_FIELDS):
+			if field in document:
+				fragment = f', {json.dumps(field)}: {json.dumps(document[field])}'.encode('utf_8')
+				fragments.append(fragment)
+				offset += len(fragment)
+			bounds[matrix_id, j + 1] = offset
+
+	return b''.join(fragments), bounds
+
+	# end
+
+movie_documents, movie_documents_bounds = build_movie_documents()
+"""Documenti statici dei film, come frammenti JSON pronti da inviare (vedi 'build_movie_documents')."""
+
 #	########################################################################	#
 #	ALTRE FUNZIONI
 
-def load_user_ratings():
+def feature_movie_rows(feature_id: int) -> np.ndarray:
+	"""Restituisce, in ordine crescente, gli indici di riga dei film che includono la feature. Costo O(NNZ della colonna)."""
+
+	start, end = movie_features_csc.indptr[feature_id], movie_features_csc.indptr[feature_id + 1]
+	return movie_features_csc.indices[start:end]
+
+	# end
+
+def movie_document_json(movie_id: int, matrix_id: int, fields = None, session = None) -> bytes:
+	"""
+	Restituisce il documento JSON di un film, unendo i frammenti statici precalcolati e il rating dell'utente.
+
+	Args:
+		movie_id: id del film.
+		matrix_id: indice del film nella matrice movie/features.
+		fields: insieme delle informazioni richieste (CATEGORIES e 'rating'); se None, tutte.
+		session: sessione dell'utente, necessaria per 'rating' e 'seen'.
+
+	Returns:
+		Il documento in byte (b'{}' se nessuna informazione è disponibile).
+	"""
+
+	bounds = movie_documents_bounds[matrix_id]
+
+	if fields is None:
+		body = movie_documents[bounds[0]:bounds[-1]]
+	else:
+		body = b''.join(
+			movie_documents[bounds[j]:bounds[j + 1]]
+			for j, field in enumerate(DOCUMENT_FIELDS) if field in fields
+		)
+
+	# Solo il rating dipende dall'utente: viene aggiunto in coda ai frammenti statici.
+	if (fields is None or 'rating' in fields) and session is not None:
+		if movie_id in session.real_ratings:
+			body += b', "seen": true'
+		elif movie_id in session.comp_ratings:
+			body += b', "seen": false'
+		if movie_id in session.all_ratings:
+			body += b', "rating": ' + json.dumps(session.all_ratings[movie_id]).encode('utf_8')
+
+	# Si rimuove il separatore ', ' iniziale del primo frammento.
+	return b'{' + body[2:] + b'}'
+
+	# end
+
+def order_by_title(rows: np.ndarray) -> np.ndarray:
+	"""Ordina le righe dei film per titolo, scartando i film senza titolo."""
+
+	ranks = movie_title_rank[rows]
+	has_title = ranks >= 0
+	return rows[has_title][np.argsort(ranks[has_title])]
+
+	# end
+
+def order_by_rating(rows: np.ndarray, movie_ratings: np.ndarray) -> np.ndarray:
+	"""Ordina le righe dei film per rating decrescente dell'utente; a parità di rating mantiene l'ordine di partenza."""
+
+	return rows[np.argsort(-movie_ratings[rows], kind='stable')]
+
+	# end
+
+def load_user_ratings(user_id: str):
 
 	# print("2a")
-	real = real_ratings_df[real_ratings_df["userId"] == int(user_id)][["movieId", "rating"]]
-	real = dict(zip(real['movieId'].astype(int), real['rating'].astype(float)))
+	start, end = np.searchsorted(real_ratings_users, [int(user_id), int(user_id) + 1])
+	real = dict(zip(real_ratings_movies[start:end].tolist(), real_ratings_values[start:end].tolist()))
 
 	# print("2b")
-	comp = pd.read_csv(f'./data/ratings_complemented/ratings_complemented_user_{user_id}.csv')
-	comp = dict(zip(comp['movieId'].astype(int), comp['rating'].astype(float)))
+	if comp_ratings_store is not None:
+		# Lettura diretta della riga dell'utente dal file mappato in memoria: nessun parsing.
+		row = comp_ratings_store.row(int(user_id))
+		if row is None:
+			raise ValueError('ID utente non valido')
+		mask = ~np.isnan(row)
+		comp = dict(zip(comp_ratings_store.cols.ids[mask].tolist(), row[mask].astype(float).tolist()))
+	else:
+		comp = pd.read_csv(RATINGS_COMPLEMENTED_DIR / f'ratings_complemented_user_{user_id}.csv')
+		comp = dict(zip(comp['movieId'].astype(int), comp['rating'].astype(float)))
 
 	return real, comp
 
 	# end
 
+def build_ratings_vector(all_ratings: dict) -> np.ndarray:
+	"""Restituisce il vettore (M) dei rating ordinato secondo la matrice delle features, con 0 dove non ci sono rating."""
+
+	# Scatter vettorizzato dei rating sugli indici di riga risolti tramite 'movie_mapping'.
+	movie_ratings = np.zeros(M, dtype=float)
+	rated_ids = np.fromiter(all_ratings.keys(), dtype=np.int64, count=len(all_ratings))
+	rated_values = np.fromiter(all_ratings.values(), dtype=float, count=len(all_ratings))
+	rated_rows = movie_mapping.to_rows(rated_ids)
+
+	valid = (rated_rows >= 0) & (rated_rows < M)
+	movie_ratings[rated_rows[valid]] = rated_values[valid]
+
+	return movie_ratings
+
+	# end
+
 def compute_feature_means(ratings, min_support: int):
 
 	# print("4")
 	sum_per_feature = movie_features_matrix.T.dot(ratings)
-	count_per_feature = movie_features_matrix.T.dot(np.ones(M, dtype=float))
 
 	means = np.divide(
 		sum_per_feature,
-		count_per_feature,
+		feature_support,
 		out = np.zeros_like(sum_per_feature),
-		where = (count_per_feature != 0)
+		where = (feature_support != 0)
 	)
 
 	# Filtra le feature che hanno un numero di occorrenze sufficiente rispetto alla soglia minima di supporto.
-	mask = count_per_feature >= min_support
+	mask = feature_support >= min_support
 
 	# print("5b")
 	return means * mask
 
 	# end
 
+def lookup_feature_means(user_id: str, min_support: int):
+	"""
+	Legge le medie delle feature dell'utente dal matrix store precalcolato
+	e applica la soglia di supporto. Restituisce None se l'utente non è presente.
+	"""
+
+	if feature_prefs_store is None:
+		return None
+
+	row = feature_prefs_store.row(int(user_id))
+	if row is None:
+		return None
+
+	return row.astype(float) * (feature_support >= min_support)
+
+	# end
+
+def lookup_top_features(user_id: str, min_support, top_features):
+	"""
+	Legge le top features dell'utente, con i film non visti associati, dallo store precalcolato.
+	Restituisce None se lo store è assente o non contiene l'utente con i parametri indicati.
+	"""
+
+	if top_features_store is None or not isinstance(min_support, int) or not isinstance(top_features, int):
+		return None
+
+	return top_features_store.get(int(user_id), min_support, top_features)
+
+	# end
+
 def extract_user_top_features(feature_means, top_features: int):
 
+	top_features_list = []
+
 	# Controllo che esista almeno una feature di interesse.
 	if (feature_means.sum() > 0.0):
 
@@ -129,22 +422,19 @@ def extract_user_top_features(feature_means, top_features: int):
 				"rating": float(feature_rating_value) # Inseriamo il valore del rating (float) nel campo 'rating', come richiesto
 			})
 
+	return top_features_list
+
 	# end
 
-def attach_movies_to_features(real_ratings, comp_ratings):
+def attach_movies_to_features(top_features_list, real_ratings, comp_ratings):
 
 	# print("6")
 	for f in top_features_list:
 		feat_id = f["id"]
-		col = movie_features_matrix[:, feat_id].toarray().ravel()
-		indices = np.where(col == 1)[0]
+		indices = feature_movie_rows(feat_id)
 
 		movies = []
-		for idx in indices:
-			movie_row = movie_index_df[movie_index_df["matrix_id"] == idx]
-			if movie_row.empty:
-				continue
-			m_id = int(movie_row["movie_id"].iloc[0])
+		for m_id in movie_mapping.to_ids(indices).tolist():
 			if m_id in real_ratings:
 				movies.append((m_id, real_ratings[m_id], True))
 			elif m_id in comp_ratings:
@@ -154,69 +444,96 @@ def attach_movies_to_features(real_ratings, comp_ratings):
 
 	# end
 
-def extract_user_preferences(min_support: int, top_features: int):
+def compute_user_top_features(user_id: str, real_ratings: dict, comp_ratings: dict, min_support: int, top_features: int):
+	"""Calcola al momento le top features dell'utente e vi associa i film (visti e non visti)."""
 
 	#	################################################################	#
-	#	INIZIALIZZAZIONE DELLE VARIABILI
+	#	RATING MEDIO PRECALCOLATO DELLE FEATURES
+	#	Se l'utente è nel matrix store delle preferenze basta leggerne la riga e applicare la soglia di supporto.
 
-	global real_ratings
-	global comp_ratings
-	global all_ratings
-	top_features_list.clear()
+	feature_means = lookup_feature_means(user_id, min_support)
 
-	if isinstance(min_support, int) and min_support <= 0:
-		min_support = MIN_SUPPORT
+	if feature_means is None:
 
-	if isinstance(top_features, int) and top_features <= 0:
-		top_features = TOP_FEATURES
+		#	############################################################	#
+		#	CREZIONE VETTORE DEI RATING
+		#	Ordinato secondo la matrice delle features, e riempito con 0 dove non ci sono rating.
 
-	if not isinstance(user_id, str) or not user_id.isdigit():
-		raise ValueError('ID utente non valido')
+		# print("3b")
+		movie_ratings = build_ratings_vector({**comp_ratings, **real_ratings})
+
+		# # Debug output
+		# non_zero_ratings = np.count_nonzero(movie_ratings)
+		# print(f"DEBUG: Non-zero movie ratings: {non_zero_ratings}")
+
+		#	############################################################	#
+		#	CALCOLO RATING MEDIO DELLE FEATURES
+		#	Il tempo di esecuzione è proporzionale al numero di elementi non-nulli nella matrice sparsa, cioè O(NNZ).
+
+		feature_means = compute_feature_means(movie_ratings, min_support)
+
+	# print("Feature means:", feature_means.shape)
+	# print("Movie ratings:", movie_ratings.shape)
+	# print("OK: feature and movie ratings extracted!")
 
 	#	################################################################	#
-	#	ESTRAZIONE DEI RATINGS PER L'UTENTE
+	#	ESTRAZIONE DELLE TOP FEATURES DELL'UTENTE
 
-	# Utilizzo "dict unpacking" per unire tutti i rating in un unico dizionario.
-	real_ratings, comp_ratings = load_user_ratings()
-	all_ratings = {**comp_ratings, **real_ratings}
+	top_features_list = extract_user_top_features(feature_means, top_features)
 
 	#	################################################################	#
-	#	CREZIONE VETTORE DEI RATING
-	#	Ordinato secondo la matrice delle features, e riempito con 0 dove non ci sono rating.
+	#	ASSOCIAZIONE DEI MOVIE ALLE FEATURES ESTRATTE
 
-	# print("3b")
-	movie_ratings = np.zeros(M, dtype=float)
-	for movie_id, rating in all_ratings.items():
+	attach_movies_to_features(top_features_list, real_ratings, comp_ratings)
 
-		idx = movie_index_df.loc[movie_index_df['movie_id'] == movie_id, 'matrix_id']
-		idx = int(idx.iloc[0]) if not idx.empty else None
+	return top_features_list
 
-		if idx and 0 <= idx < M:
-			movie_ratings[idx] = rating
+	# end
 
-	# # Debug output
-	# non_zero_ratings = np.count_nonzero(movie_ratings)
-	# print(f"DEBUG: Non-zero movie ratings: {non_zero_ratings}")
+def extract_user_preferences(session, min_support: int, top_features: int):
 
 	#	################################################################	#
-	#	CALCOLO RATING MEDIO DELLE FEATURES
-	#	Il tempo di esecuzione è proporzionale al numero di elementi non-nulli nella matrice sparsa, cioè O(NNZ).
+	#	INIZIALIZZAZIONE DELLE VARIABILI
 
-	feature_means = compute_feature_means(movie_ratings, min_support)
+	user_id = session.user_id
 
-	# print("Feature means:", feature_means.shape)
-	# print("Movie ratings:", movie_ratings.shape)
-	# print("OK: feature and movie ratings extracted!")
+	if isinstance(min_support, int) and min_support <= 0:
+		min_support = MIN_SUPPORT
+
+	if isinstance(top_features, int) and top_features <= 0:
+		top_features = TOP_FEATURES
+
+	if not isinstance(user_id, str) or not user_id.isdigit():
+		raise ValueError('ID utente non valido')
 
 	#	################################################################	#
-	#	ESTRAZIONE DELLE TOP FEATURES DELL'UTENTE
+	#	ESTRAZIONE DEI RATINGS PER L'UTENTE
 
-	extract_user_top_features(feature_means, top_features)
+	# Utilizzo "dict unpacking" per unire tutti i rating in un unico dizionario.
+	real_ratings, comp_ratings = load_user_ratings(user_id)
+	all_ratings = {**comp_ratings, **real_ratings}
 
 	#	################################################################	#
-	#	ASSOCIAZIONE DEI MOVIE ALLE FEATURES ESTRATTE
+	#	TOP FEATURES PRECALCOLATE
+	#	Con i parametri precalcolati la lista dell'utente è letta dallo store, altrimenti viene calcolata al momento.
 
-	attach_movies_to_features(real_ratings, comp_ratings)
+	top_features_list = lookup_top_features(user_id, min_support, top_features)
+
+	if top_features_list is None:
+		top_features_list = compute_user_top_features(user_id, real_ratings, comp_ratings, min_support, top_features)
+
+	#	################################################################	#
+	#	AGGIORNAMENTO DELLA SESSIONE
+	#	Lo stato viene sostituito in blocco, così le richieste concorrenti non vedono mai risultati parziali.
+
+	session.min_support = min_support
+	session.top_features = top_features
+	session.real_ratings = real_ratings
+	session.comp_ratings = comp_ratings
+	session.all_ratings = all_ratings
+	session.movie_ratings = build_ratings_vector(all_ratings)
+	session.top_features_list = top_features_list
+	session.candidates = build_candidate_segments(top_features_list)
 
 	#	################################################################	#
 	#	STAMPA FINALE
@@ -234,73 +551,125 @@ def extract_user_preferences(min_support: int, top_features: int):
 
 	# end
 
-def mab_softmax_predictions(
-		temperature : float,
-		k : int
-	):
+def build_candidate_segments(top_features_list: list):
+	"""
+	Raccoglie i film non visti delle top features in segmenti contigui di array (come in una matrice CSR).
+
+	Returns:
+		candidates: tupla (features, indptr, movie_ids, ratings), dove 'features' è la lista delle
+		feature con almeno un film non visto e i film della i-esima sono in [indptr[i], indptr[i + 1]).
 	"""
-	Esegue MAB softmax prediction solo su film non visti (seen == False).
+
+	features, lengths, movie_ids, ratings = [], [], [], []
+
+	for f in top_features_list:
+		# Considera solo i film non visti
+		movies = [m for m in f.get("movies", []) if not m[2]]
+		if not movies:
+			continue
+
+		features.append(f)
+		lengths.append(len(movies))
+		movie_ids.extend(m[0] for m in movies)
+		ratings.extend(m[1] for m in movies)
+
+	indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+	np.cumsum(lengths, out=indptr[1:])
+
+	return features, indptr, np.array(movie_ids, dtype=np.int64), np.array(ratings, dtype=float)
+
+	# end
+
+def sample_candidates(candidates, temperature: float, k: int, rng = None):
+	"""
+	Esegue MAB softmax prediction su tutti i segmenti di film non visti insieme.
+
+	Per ogni feature vengono estratti k film senza reinserimento con il trucco Gumbel-top-k:
+	ai logit (rating / tau) si somma rumore di Gumbel e si prendono i k valori più alti di ogni
+	segmento, nell'ordine in cui li avrebbe estratti un campionamento sequenziale.
 
 	Args:
+		candidates: segmenti di film non visti (vedi 'build_candidate_segments'), oppure None.
 		temperature: parametro tau della softmax.
-		k: numero di film da estrarre per feature.
+		k: numero di film da estrarre per feature (0 = tutti).
+		rng: generatore 'np.random.Generator' (se None si usa 'mab_rng').
 
 	Returns:
-		predictions: dizionario feature_id -> lista di predizioni [(movieId, rating, seen_bool, prob)]
+		predictions: lista di feature, ognuna con i film estratti {movieId: {movie_rating, seen, softmax_prob}}
 	"""
 
-	if isinstance(k, int) and k < 0:
-		k = MOVIE_RECOMMENDATIONS
+	if candidates is None or not candidates[0]:
+		return []
 
-	predictions = []
-	# predictions = {}
-	min_k = k
+	features, indptr, movie_ids, ratings = candidates
 
-	for f in top_features_list:
-		movies = f.get("movies", [])
+	if isinstance(k, int) and k < 0:
+		k = MOVIE_RECOMMENDATIONS
 
-		if not movies:
-			continue
+	if rng is None:
+		rng = mab_rng
 
-		# Considera solo i film non visti
-		movies = [m for m in movies if not m[2]]
-		if not movies:
-			continue
+	lengths = np.diff(indptr)
+	segment = np.repeat(np.arange(len(features)), lengths)
 
-		if k == 0:
-			min_k = len(movies)
+	# Softmax stabile: prima dell'esponenziale si sottrae il logit massimo di ogni segmento.
+	logits = ratings / temperature
+	logits -= np.maximum.reduceat(logits, indptr[:-1])[segment]
+	probs = np.exp(logits)
+	probs /= np.add.reduceat(probs, indptr[:-1])[segment]
 
-		# Estrai solo i rating
-		ratings = np.array([m[1] for m in movies], dtype=float)
+	# Gumbel-top-k: ordina ogni segmento per chiave decrescente e tiene le prime 'sample_size' posizioni.
+	keys = logits + rng.gumbel(size=logits.size)
+	order = np.lexsort((-keys, segment))
+	rank = np.arange(order.size) - indptr[segment]
 
-		# Calcola softmax con temperatura tau
-		probs = np.exp(ratings / temperature)
-		probs /= np.sum(probs)
+	sample_size = lengths if k == 0 else np.minimum(k, lengths)
+	chosen = order[rank < sample_size[segment]]
 
-		# Campiona k film in base alle probabilità
-		sample_size = min(min_k, len(movies))
-		chosen_idx = np.random.choice(len(movies), size=sample_size, replace=False, p=probs)
+	predictions = []
 
+	for f, idx in zip(features, np.split(chosen, np.cumsum(sample_size)[:-1])):
 		predictions.append({
-		# predictions[f["id"]] = {
 			"feature_id": f["id"],
 			"category": f["category"],
 			"feature_name": f["name"],
 			"feature_rating": f["rating"],
 			"movies": {
-				movies[idx][0]: {
-					"movie_rating": movies[idx][1],
-					"seen": movies[idx][2],
-					"softmax_prob": probs[idx]
+				m_id: {
+					"movie_rating": rating,
+					"seen": False,
+					"softmax_prob": prob
 				}
-			for idx in chosen_idx}
-		# }
+			for m_id, rating, prob in zip(movie_ids[idx].tolist(), ratings[idx].tolist(), probs[idx].tolist())}
 		})
 
 	return predictions
 
 	# end
 
+def mab_softmax_predictions(
+		top_features_list : list,
+		temperature : float,
+		k : int,
+		rng = None
+	):
+	"""
+	Esegue MAB softmax prediction solo su film non visti (seen == False).
+
+	Args:
+		top_features_list: top features dell'utente, con i film associati.
+		temperature: parametro tau della softmax.
+		k: numero di film da estrarre per feature.
+		rng: generatore 'np.random.Generator' (se None si usa 'mab_rng').
+
+	Returns:
+		predictions: lista di feature, ognuna con i film estratti {movieId: {movie_rating, seen, softmax_prob}}
+	"""
+
+	return sample_candidates(build_candidate_segments(top_features_list), temperature, k, rng)
+
+	# end
+
 #	########################################################################	#
 #	CLASSI
 
@@ -308,7 +677,8 @@ class RecSys_HTTPServer:
 
 	def __init__(self):
 
-		server = HTTPServer((ADDRESS, PORT), RecSys_RequestHandler)
+		# Un thread per richiesta: le sessioni permettono di servire più utenti contemporaneamente.
+		server = ThreadingHTTPServer((ADDRESS, PORT), RecSys_RequestHandler)
 		print("Server in esecuzione su " + str(ADDRESS) + ":" + str(PORT) + "...")
 
 		try:
@@ -336,6 +706,98 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 		self.send_header('Access-Control-Allow-Origin', '*')
 		self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
 		self.send_header('Access-Control-Allow-Headers', '*')
+		self.send_header('Access-Control-Expose-Headers', f'{SESSION_HEADER}, {NEXT_CURSOR_HEADER}, {TOTAL_COUNT_HEADER}')
+		# end
+
+	def _get_session(self):
+		"""Restituisce la sessione indicata dall'header (o dal parametro 'session'), se valida."""
+
+		token = self.headers.get(SESSION_HEADER)
+		if not token:
+			token = dict(parse_qsl(urlparse(self.path).query)).get('session')
+
+		return sessions.get(token)
+
+		# end
+
+	def _send_file(self, path, content_type: str):
+		"""
+		Invia un file con Content-Length, ETag, Last-Modified e Cache-Control.
+		Se l'ETag coincide con 'If-None-Match' risponde 304 senza corpo,
+		altrimenti trasferisce il file direttamente dal disco al socket.
+		"""
+
+		with open(path, 'rb') as f:
+			stat = os.fstat(f.fileno())
+			etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+			if_none_match = self.headers.get('If-None-Match', '')
+			if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+				self.send_response(304) # NOT MODIFIED
+				self._send_cors_headers()
+				self.send_header('ETag', etag)
+				self.send_header('Cache-Control', f'public, max-age={POSTER_CACHE_MAX_AGE}')
+				self.end_headers()
+				return
+
+			self.send_response(200)
+			self._send_cors_headers()
+			self.send_header('Content-type', content_type)
+			self.send_header('Content-Length', str(stat.st_size))
+			self.send_header('ETag', etag)
+			self.send_header('Last-Modified', formatdate(stat.st_mtime, usegmt=True))
+			self.send_header('Cache-Control', f'public, max-age={POSTER_CACHE_MAX_AGE}')
+			self.end_headers()
+
+			self._write_file(f)
+
+		# end
+
+	def _write_file(self, f):
+		"""Trasferisce il contenuto del file aperto 'f' sul socket del client."""
+
+		# 'socket.sendfile' usa os.sendfile (zero-copy) dove disponibile, altrimenti invia a blocchi.
+		self.wfile.flush()
+		self.connection.sendfile(f)
+
+		# end
+
+	def _send_json_list(self, items, headers: dict = None):
+		"""
+		Invia una lista JSON di stringhe (array numpy di oggetti). Le liste corte sono inviate con
+		Content-Length; quelle con più di MOVIES_STREAM_BLOCK elementi sono serializzate e inviate
+		a blocchi, senza Content-Length: in HTTP/1.0 la fine della risposta è la chiusura della connessione.
+		"""
+
+		headers = headers or {}
+
+		self.send_response(200)
+		self._send_cors_headers()
+		self.send_header('Content-type', 'application/json')
+		for name, value in headers.items():
+			self.send_header(name, value)
+
+		if len(items) <= MOVIES_STREAM_BLOCK:
+			output = json.dumps(items.tolist()).encode(encoding='utf_8')
+			self.send_header('Content-Length', str(len(output)))
+			self.end_headers()
+			self.wfile.write(output)
+			return
+
+		self.end_headers()
+		self.wfile.write(b'[')
+		for start in range(0, len(items), MOVIES_STREAM_BLOCK):
+			block = json.dumps(items[start:start + MOVIES_STREAM_BLOCK].tolist())[1:-1]
+			self.wfile.write((', ' + block if start else block).encode(encoding='utf_8'))
+		self.wfile.write(b']')
+
+		# end
+
+	def _send_invalid_session(self):
+		self.send_response(401, 'Sessione non valida o scaduta.') # UNAUTHORIZED
+		self._send_cors_headers()
+		self.send_header('Content-type', 'text/plain')
+		self.end_headers()
 		# end
 
 	def do_OPTIONS(self):
@@ -364,13 +826,10 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 		global M
 		global F
 
-		# Dict
-		global real_ratings
-		global comp_ratings
-		global all_ratings
-
 		try:
 
+			session = self._get_session()
+
 			if urlparse(self.path).path.endswith('/get-users'):
 
 				output = json.dumps(real_ratings_df['userId'].unique().astype(str).tolist())
@@ -386,10 +845,12 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 
 			if urlparse(self.path).path.endswith('/get-params'):
 
+				params_owner = session if session is not None else RecSys_RequestHandler
+
 				output = json.dumps({
-					"minSupport": RecSys_RequestHandler.min_support,
-					"movieRecommendations": RecSys_RequestHandler.movie_recommendations,
-					"topFeatures": RecSys_RequestHandler.top_features
+					"minSupport": params_owner.min_support,
+					"movieRecommendations": params_owner.movie_recommendations,
+					"topFeatures": params_owner.top_features
 				})
 
 				self.send_response(200) # OK
@@ -403,9 +864,14 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 
 			if urlparse(self.path).path.endswith('/get-recommendations'):
 
-				recs = mab_softmax_predictions(
-					temperature=0.5,
-					k=RecSys_RequestHandler.movie_recommendations
+				if session is None:
+					self._send_invalid_session()
+					return
+
+				recs = sample_candidates(
+					session.candidates,
+					temperature=SOFTMAX_TEMPERATURE,
+					k=session.movie_recommendations
 				)
 
 				output = json.dumps(recs)
@@ -450,6 +916,20 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 						self.end_headers()
 						return
 
+				# Paginazione opzionale: 'limit' film a partire dalla posizione indicata dal cursore.
+				selected_limit = params.get('limit', '0')
+				selected_cursor = params.get('cursor', '0')
+
+				if not selected_limit.isdigit() or not selected_cursor.isdigit():
+					self.send_response(400, 'Paginazione non valida.') # BAD REQUEST
+					self._send_cors_headers()
+					self.send_header('Content-type', 'text/plain')
+					self.end_headers()
+					return
+
+				selected_limit = int(selected_limit)
+				selected_cursor = int(selected_cursor)
+
 				if 'order' in params.keys():
 					selected_order = params['order']
 					if selected_order not in ['title', 'rating']:
@@ -460,42 +940,40 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 						return
 
 				if selected_type == 'feature':
-					feature_column = movie_features_matrix[:, selected_id].toarray().ravel()
-					related_matrix_ids = np.where(feature_column > 0)[0]
-					related_movie_ids = movie_index_df.loc[
-						movie_index_df['matrix_id'].isin(related_matrix_ids), 'movie_id'
-					]
+					related_rows = feature_movie_rows(selected_id)
 				elif selected_type == 'ratings':
-					related_movie_ids = real_ratings_df.loc[
-						real_ratings_df['userId'] == selected_id
-					]['movieId']
+					start, end = np.searchsorted(real_ratings_users, [selected_id, selected_id + 1])
+					related_rows = movie_mapping.to_rows(real_ratings_movies[start:end])
+					related_rows = related_rows[related_rows >= 0]
 
 				if selected_order == 'title':
-					related_movie_ids = movie_titles_df.loc[
-						movie_titles_df['movieID'].isin(related_movie_ids)
-					].sort_values(by='movie_name')['movieID'].astype(str).tolist()
+					related_rows = order_by_title(related_rows)
 				elif selected_order == 'rating':
-					related_movie_ids = sorted(
-						related_movie_ids,
-						key = lambda movie_id: all_ratings.get(int(movie_id), 0),
-						reverse = True
-					)
-					related_movie_ids = [str(mid) for mid in related_movie_ids]
+					if session is None:
+						self._send_invalid_session()
+						return
+
+					related_rows = order_by_rating(related_rows, session.movie_ratings)
 
-				if not related_movie_ids:
+				if related_rows.size == 0:
 					self.send_response(404, f'Nessun movie trovato.') # NOT FOUND
 					self._send_cors_headers()
 					self.send_header('Content-type', 'text/plain')
 					self.end_headers()
 					return
 
-				output = json.dumps(related_movie_ids)
+				# L'ordinamento è deterministico: il cursore (posizione nella lista ordinata) individua sempre la stessa pagina.
+				headers = {TOTAL_COUNT_HEADER: str(related_rows.size)}
 
-				self.send_response(200)
-				self._send_cors_headers()
-				self.send_header('Content-type', 'application/json')
-				self.end_headers()
-				self.wfile.write(output.encode(encoding='utf_8'))
+				if selected_limit > 0:
+					page_end = selected_cursor + selected_limit
+					if page_end < related_rows.size:
+						headers[NEXT_CURSOR_HEADER] = str(page_end)
+					related_rows = related_rows[selected_cursor:page_end]
+				else:
+					related_rows = related_rows[selected_cursor:]
+
+				self._send_json_list(movie_id_strings[related_rows], headers)
 				return
 
 				# end if '/get-movies'
@@ -510,11 +988,7 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 					self.end_headers()
 					return
 
-				file_name_path = None
-
-				for file in POSTER_DIR.glob("*.jpg"):
-					if file.name.startswith(selected_id + '_') and file.is_file:
-						file_name_path = POSTER_DIR.resolve().joinpath(file.name)
+				file_name_path = posters.lookup(selected_id)
 
 				if not file_name_path:
 					self.send_response(404, 'Copertina non trovata') # NOT FOUND
@@ -523,15 +997,55 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 					self.end_headers()
 					return
 
-				with open(file_name_path, 'rb') as f:
-					self.send_response(200)
+				self._send_file(file_name_path, 'image/jpeg')
+				return
+
+				# end if '/download-movie-poster'
+
+			elif urlparse(self.path).path.endswith('/get-movies-info'):
+				params = dict(parse_qsl(urlparse(self.path).query))
+				selected_ids = params.get('ids', '').split(',')
+				selected_types = None
+
+				if 'types' in params.keys():
+					selected_types = set(params['types'].split(','))
+					if not selected_types <= set(CATEGORIES + ['rating']):
+						self.send_response(400, 'Informazione non disponibile.') # BAD REQUEST
+						self._send_cors_headers()
+						self.send_header('Content-type', 'text/plain')
+						self.end_headers()
+						return
+
+				if not all(selected_id.isdigit() for selected_id in selected_ids) or len(selected_ids) > MOVIES_INFO_MAX_IDS:
+					self.send_response(400, 'ID non validi.') # BAD REQUEST
 					self._send_cors_headers()
-					self.send_header('Content-type', 'image/jpeg')
+					self.send_header('Content-type', 'text/plain')
 					self.end_headers()
-					self.wfile.write(f.read())
 					return
 
-				# end if '/download-movie-poster'
+				# Il rating dipende dall'utente loggato.
+				if (selected_types is None or 'rating' in selected_types) and session is None:
+					self._send_invalid_session()
+					return
+
+				# Risoluzione in blocco degli indici: i film sconosciuti vengono omessi dalla risposta.
+				movie_ids = np.array(selected_ids, dtype=np.int64)
+				matrix_ids = movie_mapping.to_rows(movie_ids)
+
+				output = b'{' + b', '.join(
+					b'"%d": ' % movie_id + movie_document_json(movie_id, matrix_id, selected_types, session)
+					for movie_id, matrix_id in dict(zip(movie_ids.tolist(), matrix_ids.tolist())).items()
+					if 0 <= matrix_id < M
+				) + b'}'
+
+				self.send_response(200)
+				self._send_cors_headers()
+				self.send_header('Content-type', 'application/json')
+				self.end_headers()
+				self.wfile.write(output)
+				return
+
+				# end if '/get-movies-info'
 
 			elif urlparse(self.path).path.endswith('/get-movie-info'):
 				params = dict(parse_qsl(urlparse(self.path).query))
@@ -554,8 +1068,7 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 					self.end_headers()
 					return
 
-				matrix_id = movie_index_df.loc[movie_index_df['movie_id'] == int(selected_id), 'matrix_id']
-				matrix_id = int(matrix_id.iloc[0]) if not matrix_id.empty else None
+				matrix_id = movie_mapping.row_of(int(selected_id))
 
 				if matrix_id is None:
 					self.send_response(400, f'ID non valido.') # BAD REQUEST
@@ -571,53 +1084,25 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 					self.end_headers()
 					return
 
-				results = {}
-
-				# Recupero 'title' e 'description' direttamente dai file CSV.
-				if selected_type == "" or selected_type == 'title':
-					title_row = movie_titles_df.loc[movie_titles_df['movieID'] == int(selected_id)]
-					results['title'] = title_row['movie_name'].dropna().astype(str).tolist()
-
-				if selected_type == "" or selected_type == 'description':
-					desc_row = movie_abstracts_df.loc[movie_abstracts_df['movieId'] == int(selected_id)]
-					results['description'] = desc_row['value'].dropna().astype(str).tolist()
-
-				# Recupero tutte le altre features dalla matrice 'movie_features_matrix'.
-				if selected_type == "" or selected_type in CATEGORIES_PATH_MAPPING.keys():
-					movie_column = movie_features_matrix[matrix_id, :].toarray().ravel()
-					related_matrix_ids = np.where(movie_column > 0)[0]
-					related_features_df = feature_index_df.loc[
-						feature_index_df['feature_id'].isin(related_matrix_ids)
-					]
-
-					for category, group in related_features_df.groupby('category'):
-						if selected_type == "" or selected_type == category:
-							results[category] = sorted(group['feature'].dropna().astype(str).tolist())
-						if selected_type == category:
-							break
-
-				# Recupero il rating dal dict 'all_ratings'.
-				if selected_type == "" or selected_type == 'rating':
-					if int(selected_id) in real_ratings:
-						results['seen'] = True
-					elif int(selected_id) in comp_ratings:
-						results['seen'] = False
-					results['rating'] = all_ratings[int(selected_id)]
-
-				if not results:
+				# Il rating dipende dall'utente loggato.
+				if (selected_type == "" or selected_type == 'rating') and session is None:
+					self._send_invalid_session()
+					return
+
+				output = movie_document_json(int(selected_id), matrix_id, {selected_type} if selected_type else None, session)
+
+				if output == b'{}':
 					self.send_response(404, f'Informazione "{selected_type}" non trovata per movie "{selected_id}"') # NOT FOUND
 					self._send_cors_headers()
 					self.send_header('Content-type', 'text/plain')
 					self.end_headers()
 					return
 
-				output = json.dumps(results)
-
 				self.send_response(200)
 				self._send_cors_headers()
 				self.send_header('Content-type', 'application/json')
 				self.end_headers()
-				self.wfile.write(output.encode(encoding='utf_8'))
+				self.wfile.write(output)
 				return
 
 				# end if '/get-movie-info'
@@ -642,9 +1127,6 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 
 	def do_POST(self):
 
-		# Variabili globali
-		global user_id
-
 		try:
 
 			if urlparse(self.path).path.endswith('/login-user'):
@@ -669,15 +1151,32 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 					self.end_headers()
 					return
 
-				user_id = data
-				extract_user_preferences(
-					RecSys_RequestHandler.min_support,
-					RecSys_RequestHandler.top_features
-				)
+				session = sessions.create(data)
+				session.min_support = RecSys_RequestHandler.min_support
+				session.movie_recommendations = RecSys_RequestHandler.movie_recommendations
+				session.top_features = RecSys_RequestHandler.top_features
+
+				try:
+					extract_user_preferences(
+						session,
+						session.min_support,
+						session.top_features
+					)
+				except BaseException:
+					sessions.remove(session.token)
+					raise
+
+				output = json.dumps({
+					"userId": session.user_id,
+					"sessionToken": session.token
+				})
 
 				self.send_response(201, f'Utente <{data}> loggato con successo!') # CREATED
 				self._send_cors_headers()
+				self.send_header(SESSION_HEADER, session.token)
+				self.send_header('Content-type', 'application/json')
 				self.end_headers()
+				self.wfile.write(output.encode(encoding='utf_8'))
 				return
 
 				# end if '/login-user'
@@ -704,14 +1203,20 @@ class RecSys_RequestHandler(BaseHTTPRequestHandler):
 					self.end_headers()
 					return
 
-				RecSys_RequestHandler.min_support = data['minSupport']
-				RecSys_RequestHandler.movie_recommendations = data['movieRecommendations']
-				RecSys_RequestHandler.top_features = data['topFeatures']
+				session = self._get_session()
 
-				extract_user_preferences(
-					RecSys_RequestHandler.min_support,
-					RecSys_RequestHandler.top_features
-				)
+				if session is None:
+					self._send_invalid_session()
+					return
+
+				# I parametri sono propri della sessione: non influenzano gli altri utenti.
+				with session.lock:
+					session.movie_recommendations = data['movieRecommendations']
+					extract_user_preferences(
+						session,
+						data['minSupport'],
+						data['topFeatures']
+					)
 
 				self.send_response(201, f'Parametri aggiornati con successo!') # CREATED
 				self._send_cors_headers()
@@ -0,0 +1,103 @@
+"""
+
+	id_mapping.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Implementa la mappatura tra gli identificativi esterni (es. movieId di
+	MovieLens) e gli indici di riga delle matrici. La mappatura è costruita
+	una sola volta in due array NumPy (diretto e inverso), così che la
+	risoluzione di uno o più identificativi sia O(1) e vettorizzabile.
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+from constants import *
+
+import numpy as np
+import pandas as pd
+
+#	########################################################################	#
+#	CLASSI
+
+class IdMapping:
+	"""
+	Mappa biunivoca tra identificativi interi non negativi e indici di riga.
+	'ids[i]' è l'identificativo della riga 'i'; 'rows[id]' è la riga
+	dell'identificativo 'id', oppure -1 se l'identificativo non è presente.
+	"""
+
+	def __init__(self, ids):
+		"""
+		Costruisce la mappatura a partire dagli identificativi ordinati per riga.
+
+		Args:
+			ids: sequenza di identificativi interi, dove la posizione è l'indice di riga.
+		"""
+
+		self.ids = np.asarray(ids, dtype=np.int64)
+		"""Array inverso: indice di riga -> identificativo."""
+
+		if self.ids.size and self.ids.min() < 0:
+			raise ValueError('Gli identificativi devono essere non negativi')
+
+		size = int(self.ids.max()) + 1 if self.ids.size else 0
+		self.rows = np.full(size, -1, dtype=np.int32)
+		"""Array diretto (denso): identificativo -> indice di riga (-1 se assente)."""
+		self.rows[self.ids] = np.arange(self.ids.size, dtype=np.int32)
+
+		if np.count_nonzero(self.rows >= 0) != self.ids.size:
+			raise ValueError('Gli identificativi devono essere univoci')
+
+		# end
+
+	def __len__(self):
+		return self.ids.size
+
+	def __contains__(self, id):
+		return self.row_of(id) is not None
+
+	def to_rows(self, ids) -> np.ndarray:
+		"""Risolve in blocco gli identificativi in indici di riga (-1 per quelli assenti)."""
+
+		ids = np.asarray(ids, dtype=np.int64)
+		rows = np.full(ids.shape, -1, dtype=np.int32)
+
+		valid = (ids >= 0) & (ids < self.rows.size)
+		rows[valid] = self.rows[ids[valid]]
+		return rows
+
+		# end
+
+	def to_ids(self, rows) -> np.ndarray:
+		"""Risolve in blocco gli indici di riga nei rispettivi identificativi."""
+		return self.ids[np.asarray(rows, dtype=np.int64)]
+
+	def row_of(self, id: int):
+		"""Restituisce l'indice di riga dell'identificativo, oppure None se assente."""
+
+		if not 0 <= id < self.rows.size:
+			return None
+
+		row = int(self.rows[id])
+		return row if row >= 0 else None
+
+		# end
+
+	# end class
+
+#	########################################################################	#
+#	ALTRE FUNZIONI
+
+def load_movie_mapping(path = MOVIE_INDEX_PATH) -> IdMapping:
+	"""Carica il file 'movie_index.csv' e restituisce la mappatura movieId <-> matrix_id."""
+
+	movie_index_df = pd.read_csv(path, dtype=int).sort_values('matrix_id')
+
+	if not np.array_equal(movie_index_df['matrix_id'].to_numpy(), np.arange(len(movie_index_df))):
+		raise ValueError(f'Indici di matrice non contigui in {path}')
+
+	return IdMapping(movie_index_df['movie_id'].to_numpy())
+
+	# end
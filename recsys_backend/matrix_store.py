@@ -0,0 +1,156 @@
+"""
+
+	matrix_store.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Implementa un formato binario compatto per matrici dense indicizzate da
+	identificativi (es. utenti x film). Il file contiene un header con le
+	dimensioni, il tipo dei valori e le mappe degli id di righe e colonne,
+	seguito dai valori in ordine row-major. Il file viene scritto una sola
+	volta e poi letto tramite 'np.memmap', così che l'accesso ad una riga
+	non richieda alcun parsing.
+
+	Layout del file (little-endian):
+		magic (8 byte) | version (u4) | dtype (4 byte ASCII) | n_rows (u8) | n_cols (u8) | data_offset (u8)
+		row_ids (i8 x n_rows) | col_ids (i8 x n_cols) | padding | data (dtype x n_rows x n_cols)
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+from id_mapping import IdMapping
+
+from pathlib import Path
+import struct
+
+import numpy as np
+
+#	########################################################################	#
+#	VARIABILI GLOBALI
+
+STORE_MAGIC = b'RECSYSMX'
+"""Sequenza iniziale che identifica un file di tipo matrix store."""
+
+STORE_VERSION = 1
+"""Versione corrente del formato."""
+
+STORE_HEADER = struct.Struct('<8sI4sQQQ')
+"""Struttura dell'header a dimensione fissa."""
+
+STORE_ALIGNMENT = 64
+"""Allineamento (in byte) dell'inizio dei dati, per letture efficienti delle righe."""
+
+#	########################################################################	#
+#	CLASSI
+
+class MatrixStore:
+	"""Matrice densa su disco, letta tramite memory-mapping e indicizzata per id."""
+
+	def __init__(self, path, mode: str = 'r'):
+		"""
+		Apre un matrix store esistente.
+
+		Args:
+			path: percorso del file.
+			mode: 'r' per la sola lettura, 'r+' per aggiornare i valori.
+		"""
+
+		self.path = Path(path)
+
+		with open(self.path, 'rb') as f:
+			magic, version, dtype, n_rows, n_cols, data_offset = STORE_HEADER.unpack(f.read(STORE_HEADER.size))
+
+			if magic != STORE_MAGIC:
+				raise ValueError(f'{self.path} non è un matrix store')
+			if version != STORE_VERSION:
+				raise ValueError(f'Versione {version} di {self.path} non supportata')
+
+			row_ids = np.frombuffer(f.read(8 * n_rows), dtype='<i8')
+			col_ids = np.frombuffer(f.read(8 * n_cols), dtype='<i8')
+
+		self.rows = IdMapping(row_ids)
+		"""Mappatura id di riga <-> indice di riga."""
+
+		self.cols = IdMapping(col_ids)
+		"""Mappatura id di colonna <-> indice di colonna."""
+
+		self.data = np.memmap(
+			self.path,
+			dtype=np.dtype(dtype.rstrip(b'\x00').decode('ascii')),
+			mode=mode,
+			offset=data_offset,
+			shape=(n_rows, n_cols)
+		)
+		"""Valori della matrice, mappati in memoria."""
+
+		# end
+
+	@property
+	def shape(self):
+		return self.data.shape
+
+	def row(self, row_id: int):
+		"""Restituisce la riga associata all'id (vista sul file, senza copie), oppure None se assente."""
+
+		index = self.rows.row_of(row_id)
+		return self.data[index] if index is not None else None
+
+		# end
+
+	def flush(self):
+		self.data.flush()
+
+	# end class
+
+#	########################################################################	#
+#	ALTRE FUNZIONI
+
+def create_matrix_store(path, row_ids, col_ids, dtype = np.float32, fill = np.nan) -> MatrixStore:
+	"""
+	Crea un nuovo matrix store con tutti i valori pari a 'fill' e lo apre in scrittura.
+
+	Args:
+		path: percorso del file da creare (sovrascritto se esistente).
+		row_ids: id delle righe, nell'ordine delle righe.
+		col_ids: id delle colonne, nell'ordine delle colonne.
+		dtype: tipo dei valori (es. float32).
+		fill: valore iniziale di tutte le celle.
+
+	Returns:
+		Il matrix store aperto in modalità 'r+'.
+	"""
+
+	row_ids = np.asarray(row_ids, dtype='<i8')
+	col_ids = np.asarray(col_ids, dtype='<i8')
+	dtype = np.dtype(dtype).newbyteorder('<')
+
+	data_offset = STORE_HEADER.size + 8 * (row_ids.size + col_ids.size)
+	data_offset += -data_offset % STORE_ALIGNMENT
+
+	header = STORE_HEADER.pack(
+		STORE_MAGIC,
+		STORE_VERSION,
+		dtype.str.encode('ascii'),
+		row_ids.size,
+		col_ids.size,
+		data_offset
+	)
+
+	with open(path, 'wb') as f:
+		f.write(header)
+		f.write(row_ids.tobytes())
+		f.write(col_ids.tobytes())
+		f.truncate(data_offset + dtype.itemsize * row_ids.size * col_ids.size)
+
+	store = MatrixStore(path, mode='r+')
+
+	# Inizializzazione a blocchi di righe, per non allocare l'intera matrice in RAM.
+	if fill != 0:
+		block = max(1, (1 << 24) // max(1, dtype.itemsize * col_ids.size))
+		for start in range(0, row_ids.size, block):
+			store.data[start:start + block] = fill
+
+	return store
+
+	# end
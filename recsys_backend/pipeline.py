@@ -0,0 +1,435 @@
+"""
+
+    pipeline.py \n
+    by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+    Questo script esegue la pipeline offline del sistema di raccomandazione
+    come un grafo (DAG) di fasi, ognuna con i propri file di input e di output:
+
+        existing_ratings      (build_existing_ratings.py)
+        movie_vectors         (vector_builder.py)
+        ratings_complemented  (build_ratings_complemented.py)  <- existing_ratings, movie_vectors
+        feature_preferences   (build_feature_preferences.py)   <- existing_ratings, movie_vectors, ratings_complemented
+        top_features          (build_top_features.py)          <- existing_ratings, movie_vectors, ratings_complemented, feature_preferences
+
+    La similarità coseno completa non è una fase: build_ratings_complemented.py
+    la calcola a blocchi senza salvarla. Con '--knn K' viene aggiunta la fase
+
+        similarity_knn        (build_similarity_matrix.py)     <- movie_vectors
+
+    che salva il grafo dei K vicini più simili, usato da ratings_complemented
+    al posto della similarità completa.
+
+    Gli hash SHA-256 degli input e degli output di ogni fase completata sono
+    registrati in un manifest JSON. Una fase viene saltata se i suoi input, i
+    suoi argomenti e i suoi output non sono cambiati dall'ultima esecuzione;
+    altrimenti viene rieseguita, e con essa solo le fasi a valle i cui input
+    risultano modificati. Le fasi indipendenti sono eseguite in parallelo, ognuna
+    in un processo separato.
+
+"""
+
+#   ########################################################################   #
+#   LIBRERIE
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from constants import ML_DATASET_PATH_MAPPING, \
+    CATEGORIES_PATH_MAPPING, \
+    EXISTING_MOVIES_PATH, \
+    EXISTING_RATINGS_PATH, \
+    MOVIE_FEATURE_MATRIX_PATH, \
+    FEATURE_INDEX_PATH, \
+    MOVIE_INDEX_PATH, \
+    MOVIE_SIMILARIITY_KNN_PATH, \
+    RATINGS_COMPLEMENTED_STORE_PATH, \
+    FEATURE_PREFERENCES_STORE_PATH, \
+    TOP_FEATURES_STORE_PATH, \
+    PIPELINE_MANIFEST_PATH
+
+#   ########################################################################   #
+#   VARIABILI GLOBALI
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+"""Directory degli script della pipeline (eseguiti dalla directory di lavoro corrente, come i percorsi './data')."""
+
+HASH_CHUNK_SIZE = 1 << 20
+"""Dimensione (in byte) dei blocchi letti per calcolare l'hash di un file."""
+
+print_lock = threading.Lock()
+"""Serializza le stampe delle fasi eseguite in parallelo."""
+
+#   ########################################################################   #
+#   CLASSI
+
+class Stage:
+    """Fase della pipeline: uno script con i suoi file di input e di output."""
+
+    def __init__(self, name: str, script: str, inputs, outputs, args=()):
+
+        self.name = name
+        self.script = script
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.args = list(args)
+
+        # end
+
+    def command(self):
+        return [sys.executable, str(SCRIPT_DIR / self.script), *self.args]
+
+    # end class
+
+class Manifest:
+    """
+    Manifest JSON degli hash delle fasi completate.
+
+    Per ogni file viene memorizzato anche (dimensione, mtime): se non sono
+    cambiati l'hash registrato viene riutilizzato senza rileggere il file.
+    """
+
+    def __init__(self, path=PIPELINE_MANIFEST_PATH):
+
+        self.path = Path(path)
+        self.lock = threading.Lock()
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+        # end
+
+    def _known_files(self):
+        for entry in self.entries.values():
+            yield from entry.get('inputs', {}).items()
+            yield from entry.get('outputs', {}).items()
+
+    def file_hash(self, path: Path):
+        """Hash SHA-256 di 'path', o None se il file non esiste."""
+
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+
+        with self.lock:
+            for known_path, info in self._known_files():
+                if known_path == str(path) and info['size'] == st.st_size and info['mtime_ns'] == st.st_mtime_ns:
+                    return info
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        return {'sha256': digest.hexdigest(), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+        # end
+
+    def snapshot(self, paths):
+        return {str(p): self.file_hash(p) for p in paths}
+
+    def is_up_to_date(self, stage: Stage):
+        """
+        Restituisce (True, None) se la fase non va rieseguita, altrimenti
+        (False, motivo).
+        """
+
+        entry = self.entries.get(stage.name)
+        if entry is None:
+            return False, "mai eseguita"
+
+        if entry.get('args') != stage.args:
+            return False, "argomenti cambiati"
+
+        for label, paths in (('inputs', stage.inputs), ('outputs', stage.outputs)):
+            for path, info in self.snapshot(paths).items():
+                if info is None:
+                    return False, f"{path} mancante"
+
+                recorded = entry[label].get(path)
+                if recorded is None or recorded['sha256'] != info['sha256']:
+                    return False, f"{path} modificato"
+
+        return True, None
+
+        # end
+
+    def record(self, stage: Stage, inputs: dict):
+        """Registra gli hash della fase appena completata e salva il manifest."""
+
+        outputs = self.snapshot(stage.outputs)
+
+        with self.lock:
+            self.entries[stage.name] = {
+                'args': stage.args,
+                'inputs': inputs,
+                'outputs': outputs,
+                'completed_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+
+            # Scrittura atomica: il manifest non resta mai a metà.
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+        # end
+
+    # end class
+
+#   ########################################################################   #
+#   DEFINIZIONE DELLA PIPELINE
+
+def build_stages(incremental: bool = False, knn: int = 0):
+    """
+    Restituisce le fasi della pipeline, in un ordine topologico.
+    Con 'knn' > 0 i rating complementati usano il grafo dei 'knn' vicini più simili.
+    """
+
+    similarity_stages = []
+    complemented_inputs = [EXISTING_RATINGS_PATH, MOVIE_FEATURE_MATRIX_PATH, MOVIE_INDEX_PATH]
+    complemented_args = []
+
+    if knn > 0:
+        similarity_stages.append(Stage(
+            'similarity_knn', 'build_similarity_matrix.py',
+            inputs=[MOVIE_FEATURE_MATRIX_PATH],
+            outputs=[MOVIE_SIMILARIITY_KNN_PATH],
+            args=['--top-k', str(knn)]
+        ))
+        complemented_inputs.append(MOVIE_SIMILARIITY_KNN_PATH)
+        complemented_args = ['--similarity', 'knn']
+
+    return [
+        Stage(
+            'existing_ratings', 'build_existing_ratings.py',
+            inputs=[ML_DATASET_PATH_MAPPING['ratings'], EXISTING_MOVIES_PATH],
+            outputs=[EXISTING_RATINGS_PATH]
+        ),
+        Stage(
+            'movie_vectors', 'vector_builder.py',
+            inputs=[EXISTING_MOVIES_PATH, *CATEGORIES_PATH_MAPPING.values()],
+            outputs=[MOVIE_FEATURE_MATRIX_PATH, FEATURE_INDEX_PATH, MOVIE_INDEX_PATH],
+            args=['--incremental'] if incremental else []
+        ),
+        *similarity_stages,
+        Stage(
+            'ratings_complemented', 'build_ratings_complemented.py',
+            inputs=complemented_inputs,
+            outputs=[RATINGS_COMPLEMENTED_STORE_PATH],
+            args=complemented_args
+        ),
+        Stage(
+            'feature_preferences', 'build_feature_preferences.py',
+            inputs=[EXISTING_RATINGS_PATH, MOVIE_FEATURE_MATRIX_PATH, MOVIE_INDEX_PATH, RATINGS_COMPLEMENTED_STORE_PATH],
+            outputs=[FEATURE_PREFERENCES_STORE_PATH]
+        ),
+        Stage(
+            'top_features', 'build_top_features.py',
+            inputs=[
+                EXISTING_RATINGS_PATH, MOVIE_FEATURE_MATRIX_PATH, FEATURE_INDEX_PATH, MOVIE_INDEX_PATH,
+                RATINGS_COMPLEMENTED_STORE_PATH, FEATURE_PREFERENCES_STORE_PATH
+            ],
+            outputs=[TOP_FEATURES_STORE_PATH]
+        ),
+    ]
+
+    # end
+
+def stage_dependencies(stages):
+    """Una fase dipende da quelle che producono uno dei suoi input."""
+
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    return {
+        stage.name: {producers[path] for path in stage.inputs if path in producers} - {stage.name}
+        for stage in stages
+    }
+
+    # end
+
+def select_stages(stages, targets):
+    """Restringe la pipeline alle fasi 'targets' e a tutte quelle da cui dipendono."""
+
+    if not targets:
+        return stages
+
+    deps = stage_dependencies(stages)
+    unknown = set(targets) - deps.keys()
+    if unknown:
+        raise ValueError(f"Fasi sconosciute: {', '.join(sorted(unknown))}")
+
+    selected, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(deps[name])
+
+    return [stage for stage in stages if stage.name in selected]
+
+    # end
+
+#   ########################################################################   #
+#   ESECUZIONE
+
+def log(stage_name: str, *lines):
+    """Stampa le righe con il prefisso della fase, senza mescolarle con quelle delle altre fasi."""
+
+    with print_lock:
+        sys.stdout.write(''.join(f"[{stage_name}] {line}\n" for line in lines))
+        sys.stdout.flush()
+
+    # end
+
+def run_stage(stage: Stage, manifest: Manifest, force_reason: str, dry_run: bool):
+    """
+    Esegue una fase se non è aggiornata (o se 'force_reason' non è None).
+    Restituisce lo stato ('skipped', 'done', 'would-run' o 'failed') e il tempo impiegato.
+    """
+
+    start = time.perf_counter()
+    reason = force_reason
+
+    if reason is None:
+        up_to_date, reason = manifest.is_up_to_date(stage)
+        if up_to_date:
+            log(stage.name, "aggiornata, saltata.")
+            return 'skipped', 0.0
+
+    if dry_run:
+        log(stage.name, f"da eseguire ({reason}).")
+        return 'would-run', 0.0
+
+    log(stage.name, f"esecuzione ({reason}): {' '.join(stage.command()[1:])}")
+
+    # Gli hash degli input sono presi prima dell'esecuzione: se un input cambia nel
+    # frattempo, la fase risulterà non aggiornata alla prossima esecuzione.
+    inputs = manifest.snapshot(stage.inputs)
+    result = subprocess.run(stage.command(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    elapsed = time.perf_counter() - start
+
+    # L'output di ogni fase è stampato per intero al termine, per non mescolare le fasi parallele.
+    log(stage.name, *result.stdout.splitlines())
+
+    if result.returncode != 0:
+        log(stage.name, f"FALLITA (exit code {result.returncode}).")
+        return 'failed', elapsed
+
+    manifest.record(stage, inputs)
+    log(stage.name, f"completata in {elapsed:.1f}s.")
+    return 'done', elapsed
+
+    # end
+
+def run_pipeline(stages, manifest: Manifest, jobs: int = 2, force=(), dry_run: bool = False):
+    """
+    Esegue le fasi rispettando le dipendenze, con al più 'jobs' fasi in parallelo.
+    Una fase parte solo quando tutte le fasi da cui dipende sono terminate; se una
+    fase fallisce, le fasi a valle non vengono eseguite.
+
+    Returns:
+        Dizionario {nome fase: stato}.
+    """
+
+    deps = stage_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    status = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        while len(status) < len(stages):
+
+            for name, stage_deps in deps.items():
+                if name in status or name in running.values():
+                    continue
+
+                if any(status.get(dep) in ('failed', 'blocked') for dep in stage_deps):
+                    log(name, "non eseguita: una fase a monte è fallita.")
+                    status[name] = 'blocked'
+
+                elif all(dep in status for dep in stage_deps):
+                    force_reason = None
+                    if name in force:
+                        force_reason = "forzata"
+                    elif dry_run and any(status[dep] == 'would-run' for dep in stage_deps):
+                        # In dry-run gli output a monte non cambiano: la fase va considerata da eseguire.
+                        force_reason = "fase a monte da eseguire"
+
+                    future = executor.submit(run_stage, by_name[name], manifest, force_reason, dry_run)
+                    running[future] = name
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                status[running.pop(future)] = future.result()[0]
+
+    return status
+
+    # end
+
+#   ########################################################################   #
+#   MAIN
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Esegue la pipeline offline, ricostruendo solo le fasi non aggiornate.")
+    parser.add_argument('targets', nargs='*',
+        help="fasi da aggiornare (con le fasi da cui dipendono); di default tutte")
+    parser.add_argument('--jobs', default=2, type=int,
+        help="numero massimo di fasi eseguite in parallelo")
+    parser.add_argument('--force', nargs='*', default=None,
+        help="riesegue le fasi indicate (tutte, se nessuna è indicata) anche se aggiornate")
+    parser.add_argument('--incremental', action='store_true',
+        help="esegue vector_builder.py in modalità incrementale (id di film e feature stabili)")
+    parser.add_argument('--knn', default=0, type=int,
+        help="complementa i rating con il grafo dei K vicini più simili (0 = similarità completa)")
+    parser.add_argument('--manifest', default=PIPELINE_MANIFEST_PATH, type=str,
+        help="percorso del manifest con gli hash delle fasi completate")
+    parser.add_argument('--dry-run', action='store_true',
+        help="mostra le fasi che verrebbero eseguite, senza eseguirle")
+    args = parser.parse_args()
+
+    stages = build_stages(args.incremental, args.knn)
+
+    try:
+        stages = select_stages(stages, args.targets)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.force is None:
+        force = set()
+    else:
+        force = set(args.force) or {stage.name for stage in stages}
+
+    start = time.perf_counter()
+    status = run_pipeline(stages, Manifest(args.manifest), args.jobs, force, args.dry_run)
+
+    print(f"\nPipeline terminata in {time.perf_counter() - start:.1f}s:")
+    for stage in stages:
+        print(f"  {stage.name:<24} {status[stage.name]}")
+
+    if any(s in ('failed', 'blocked') for s in status.values()):
+        sys.exit(1)
+
+    # end
+
+#   ########################################################################   #
+#   ENTRY POINT
+
+if __name__ == '__main__':
+    main()
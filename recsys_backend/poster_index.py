@@ -0,0 +1,77 @@
+"""
+
+	poster_index.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Implementa l'indice in memoria dei poster dei film. I file della directory
+	dei poster sono nominati '<movieId>_<titolo>.jpg': l'indice associa ad ogni
+	movieId il percorso del relativo poster, così da non dover scansionare la
+	directory ad ogni richiesta. L'indice viene ricostruito solo quando la
+	directory cambia (nuovi file, rinomine o cancellazioni).
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+from constants import *
+
+import os
+import threading
+
+#	########################################################################	#
+#	CLASSI
+
+class PosterIndex:
+	"""Indice movieId -> percorso del poster, aggiornato al variare della directory."""
+
+	def __init__(self, directory = POSTER_DIR, extension: str = '.jpg'):
+
+		self.directory = os.path.abspath(directory)
+		self.extension = extension
+		self._paths = {}
+		self._mtime_ns = None
+		self._lock = threading.Lock()
+
+		self.refresh()
+
+		# end
+
+	def refresh(self, force: bool = False):
+		"""Ricostruisce l'indice se la directory è stata modificata dall'ultima scansione."""
+
+		mtime_ns = os.stat(self.directory).st_mtime_ns
+		if not force and mtime_ns == self._mtime_ns:
+			return
+
+		with self._lock:
+			if not force and mtime_ns == self._mtime_ns:
+				return
+
+			paths = {}
+			with os.scandir(self.directory) as entries:
+				for entry in entries:
+					if not entry.name.endswith(self.extension) or not entry.is_file():
+						continue
+					movie_id, sep, _ = entry.name.partition('_')
+					if sep and movie_id.isdigit():
+						paths[movie_id] = entry.path
+
+			# Sostituzione atomica: i lettori vedono sempre un indice completo.
+			self._paths = paths
+			self._mtime_ns = mtime_ns
+
+		# end
+
+	def lookup(self, movie_id: str):
+		"""Restituisce il percorso del poster del film, oppure None se non presente."""
+
+		self.refresh()
+		return self._paths.get(movie_id)
+
+		# end
+
+	def __len__(self):
+		return len(self._paths)
+
+	# end class
@@ -0,0 +1,212 @@
+"""
+
+    ranking_eval.py \n
+    by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+    Questo file implementa la valutazione top-N delle raccomandazioni:
+    precision@k, recall@k, nDCG@k e copertura del catalogo. Tutti gli utenti
+    del test set sono valutati insieme: le predizioni sono una matrice
+    (utenti x film), i film del training set vengono esclusi, i top-k film
+    di ogni utente sono selezionati con 'argpartition' e le metriche sono
+    calcolate con operazioni vettoriali, senza cicli sugli utenti.
+
+    Un film del test set è rilevante se l'utente lo ha valutato almeno
+    '--threshold'; sono considerati solo i film presenti nella matrice delle
+    feature, gli unici che possono essere raccomandati.
+
+"""
+
+#   ########################################################################    #
+#   LIBRERIE
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, load_npz
+from lenskit import crossfold as xf
+
+from constants import EXISTING_RATINGS_PATH, \
+    EXISTING_MOVIES_PATH, \
+    MOVIE_FEATURE_MATRIX_PATH
+from eval import CosineSimilarityRecommender
+from similarity_engine import SimilarityProvider
+
+#   ########################################################################    #
+#   VARIABILI GLOBALI
+
+DEFAULT_K = 10
+"""Numero di film raccomandati (k) su cui sono calcolate le metriche."""
+
+RELEVANCE_THRESHOLD = 4.0
+"""Rating minimo perché un film del test set sia considerato rilevante per l'utente."""
+
+#   ########################################################################    #
+#   SELEZIONE DEI TOP-K
+
+def relevance_matrix(test_df, user_mapping, movie_mapping, threshold=RELEVANCE_THRESHOLD):
+    """
+    Costruisce la matrice booleana sparsa (utenti x film) dei film rilevanti del test set.
+    Righe e colonne seguono 'user_mapping' e 'movie_mapping'; le coppie con utenti o
+    film non presenti nelle mappature sono scartate.
+    """
+
+    user_rows = user_mapping.to_rows(test_df['user'].to_numpy())
+    item_rows = movie_mapping.to_rows(test_df['item'].astype(int).to_numpy())
+    keep = (user_rows >= 0) & (item_rows >= 0) & (test_df['rating'].to_numpy() >= threshold)
+
+    relevant = csr_matrix(
+        (np.ones(np.count_nonzero(keep), dtype=bool), (user_rows[keep], item_rows[keep])),
+        shape=(len(user_mapping), len(movie_mapping))
+    )
+    relevant.sum_duplicates()
+    return relevant
+
+def top_k_items(scores, k, exclude=None):
+    """
+    Seleziona i 'k' film con punteggio più alto per ogni utente.
+
+    Args:
+        scores: array (utenti x film) dei punteggi (es. rating predetti).
+        k: numero di film da selezionare per utente.
+        exclude: matrice sparsa (utenti x film) dei film da escludere (es. il training set).
+
+    Returns:
+        Array int (utenti x k) degli indici dei film, in ordine di punteggio decrescente.
+    """
+
+    scores = np.array(scores, dtype=float)
+    if exclude is not None:
+        scores[exclude.nonzero()] = -np.inf
+
+    k = min(k, scores.shape[1])
+
+    # 'argpartition' seleziona i top-k in tempo lineare, poi si ordinano solo i k selezionati
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+#   ########################################################################    #
+#   METRICHE DI RANKING
+
+def ranking_metrics(top_items, relevant):
+    """
+    Calcola le metriche top-N sugli utenti con almeno un film rilevante.
+
+    Args:
+        top_items: array (utenti x k) dei film raccomandati (vedi 'top_k_items').
+        relevant: matrice sparsa booleana (utenti x film) dei film rilevanti.
+
+    Returns:
+        Dizionario con Precision@k, Recall@k, nDCG@k (medie sugli utenti),
+        Coverage@k (frazione del catalogo raccomandata ad almeno un utente)
+        e il numero di utenti valutati.
+    """
+
+    k = top_items.shape[1]
+    n_relevant = np.diff(relevant.indptr)
+    users = n_relevant > 0
+
+    hits = np.take_along_axis(relevant.toarray(), top_items, axis=1)[users]
+    n_relevant = n_relevant[users]
+    n_hits = hits.sum(axis=1)
+
+    # DCG con guadagno binario, IDCG con tutti i film rilevanti nelle prime posizioni
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = hits @ discounts
+    idcg = np.cumsum(discounts)[np.minimum(n_relevant, k) - 1]
+
+    return {
+        f'Precision@{k}': np.mean(n_hits / k) if n_hits.size else np.nan,
+        f'Recall@{k}': np.mean(n_hits / n_relevant) if n_hits.size else np.nan,
+        f'nDCG@{k}': np.mean(dcg / idcg) if n_hits.size else np.nan,
+        f'Coverage@{k}': np.unique(top_items[users]).size / relevant.shape[1],
+        'N_users': int(np.count_nonzero(users))
+    }
+
+def evaluate_ranking(scores, train_matrix, relevant, k=DEFAULT_K):
+    """Seleziona i top-k film non visti di ogni utente e ne calcola le metriche di ranking."""
+    return ranking_metrics(top_k_items(scores, k, exclude=train_matrix), relevant)
+
+#   ########################################################################    #
+#   FUNZIONE PRINCIPALE
+
+def main():
+    """Valutazione top-N dei predictor basati sulla similarità coseno."""
+
+    parser = argparse.ArgumentParser(description="Valuta le raccomandazioni top-N (precision, recall, nDCG, copertura).")
+    parser.add_argument('--k', default=DEFAULT_K, type=int,
+        help="numero di film raccomandati per utente")
+    parser.add_argument('--threshold', default=RELEVANCE_THRESHOLD, type=float,
+        help="rating minimo di un film rilevante nel test set")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"VALUTAZIONE RACCOMANDAZIONI TOP-{args.k} (Precision, Recall, nDCG, Coverage)")
+    print("=" * 80)
+
+    #   ####################################################################    #
+    #   1. CARICAMENTO DATI
+
+    print("\n1. Caricamento dati...")
+    try:
+        ratings_raw = pd.read_csv(EXISTING_RATINGS_PATH)
+        movies_df = pd.read_csv(EXISTING_MOVIES_PATH)
+        X = load_npz(MOVIE_FEATURE_MATRIX_PATH)
+    except FileNotFoundError as e:
+        print(f"❌ ERRORE: {e}")
+        return
+
+    ratings = ratings_raw.rename(columns={'userId': 'user', 'movieId': 'item'})[['user', 'item', 'rating']]
+    train, test = next(xf.partition_users(ratings, 1, xf.SampleFrac(0.2)))
+    print(f"   ✓ {len(train)} rating di training, {len(test)} rating di test")
+
+    similarity = SimilarityProvider(X)
+
+    #   ####################################################################    #
+    #   2. VALUTAZIONE DEI RANKING
+
+    print("\n2. Valutazione...")
+    results = {}
+
+    for name, use_bias in [('CosineSimilarityPredictor (no bias)', False), ('CosineSimilarityPredictor (with bias)', True)]:
+        start = time.perf_counter()
+        algo = CosineSimilarityRecommender(X, movies_df, use_bias=use_bias, similarity=similarity).fit(train)
+        relevant = relevance_matrix(test, algo.user_mapping, algo.movie_mapping, args.threshold)
+
+        results[name] = evaluate_ranking(algo.predict_matrix(), algo.B, relevant, args.k)
+        results[name]['Time_s'] = time.perf_counter() - start
+        print(f"    -> {name:<40} Fatto! ({results[name]['Time_s']:.1f}s)")
+
+    # Baseline: i film più valutati nel training set, uguali per tutti gli utenti
+    start = time.perf_counter()
+    popularity = np.asarray(algo.B.sum(axis=0)).ravel()
+    results['Popularity'] = evaluate_ranking(np.broadcast_to(popularity, algo.B.shape), algo.B, relevant, args.k)
+    results['Popularity']['Time_s'] = time.perf_counter() - start
+    print(f"    -> {'Popularity':<40} Fatto! ({results['Popularity']['Time_s']:.1f}s)")
+
+    #   ####################################################################    #
+    #   3. VISUALIZZAZIONE E SALVATAGGIO DEI RISULTATI
+
+    results = pd.DataFrame.from_dict(results, orient='index').rename_axis('Algorithm')
+    results = results.sort_values(f'nDCG@{args.k}', ascending=False)
+
+    print("\n" + "=" * 80)
+    print("RISULTATI - METRICHE DI RANKING")
+    print("=" * 80 + "\n")
+    print(results.to_string())
+
+    output_path = Path('./evaluation_results/ranking_evaluation.csv')
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(output_path)
+    print(f"\nRisultati salvati in: {output_path}")
+
+    # end
+
+#   ########################################################################    #
+#   ENTRY POINT
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+
+	session_store.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Implementa le sessioni utente del server HTTP. Ogni login genera un token
+	di sessione a cui è associato lo stato delle preferenze calcolate per
+	l'utente (top features, rating reali e complementari). Le sessioni sono
+	conservate in uno store limitato (LRU) con scadenza per inattività (TTL),
+	accessibile in modo sicuro da più thread.
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+from constants import *
+
+from collections import OrderedDict
+import secrets
+import threading
+import time
+
+#	########################################################################	#
+#	CLASSI
+
+class UserSession:
+	"""Stato delle preferenze calcolate per un utente loggato."""
+
+	def __init__(self, token: str, user_id: str):
+		"""
+		Inizializza una sessione vuota per l'utente indicato.
+
+		Args:
+			token: token di sessione restituito al client.
+			user_id: identificativo dell'utente loggato.
+		"""
+
+		self.token = token
+		"""Token di sessione restituito al client da '/login-user'."""
+
+		self.user_id = user_id
+		"""Identificativo dell'utente a cui appartiene la sessione."""
+
+		self.min_support = MIN_SUPPORT
+		self.movie_recommendations = MOVIE_RECOMMENDATIONS
+		self.top_features = TOP_FEATURES
+
+		self.top_features_list = []
+		"""Lista di features, caratterizzate da (id, category, name, average_rating), a cui sono collegati i movies, caratterizzati da (movieId, rating, seen_bool), che includono tale feature."""
+
+		self.candidates = None
+		"""Film non visti delle top features in segmenti contigui (vedi 'build_candidate_segments'), campionati dal MAB a ogni '/get-recommendations'."""
+
+		self.real_ratings = {}
+		"""Dizionario contenente i rating reali assegnati dall'utente."""
+
+		self.comp_ratings = {}
+		"""Dizionario contenente i rating complementari predetti dal sistema per l'utente."""
+
+		self.all_ratings = {}
+		"""Dizionario unificato contenente tutti i rating (reali e complementari) per l'utente."""
+
+		self.movie_ratings = None
+		"""Vettore (M) di tutti i rating dell'utente, indicizzato per riga della matrice movie/features (0 dove non ci sono rating)."""
+
+		self.last_access = time.monotonic()
+		"""Istante dell'ultimo accesso alla sessione, usato per la scadenza (TTL)."""
+
+		self.lock = threading.Lock()
+		"""Serializza il ricalcolo delle preferenze della stessa sessione."""
+
+		# end
+
+	# end class
+
+class RecSys_SessionStore:
+	"""
+	Store delle sessioni con politica LRU e scadenza per inattività.
+	Quando si supera 'max_sessions' viene eliminata la sessione usata meno
+	di recente; le sessioni inattive da più di 'ttl' secondi non sono più valide.
+	"""
+
+	def __init__(self, max_sessions: int = SESSION_MAX_COUNT, ttl: float = SESSION_TTL):
+
+		self.max_sessions = max_sessions
+		self.ttl = ttl
+		self._sessions = OrderedDict()
+		self._lock = threading.Lock()
+
+		# end
+
+	def _evict_expired(self, now: float):
+
+		# Le sessioni sono ordinate per ultimo accesso: le scadute sono in testa.
+		while self._sessions:
+			token, session = next(iter(self._sessions.items()))
+			if now - session.last_access <= self.ttl:
+				break
+			del self._sessions[token]
+
+		# end
+
+	def create(self, user_id: str) -> UserSession:
+		"""Crea una nuova sessione per l'utente e ne restituisce lo stato."""
+
+		session = UserSession(secrets.token_urlsafe(32), user_id)
+
+		with self._lock:
+			self._evict_expired(session.last_access)
+			self._sessions[session.token] = session
+			while len(self._sessions) > self.max_sessions:
+				self._sessions.popitem(last=False)
+
+		return session
+
+		# end
+
+	def get(self, token: str):
+		"""Restituisce la sessione associata al token, oppure None se assente o scaduta."""
+
+		if not token:
+			return None
+
+		now = time.monotonic()
+
+		with self._lock:
+			self._evict_expired(now)
+			session = self._sessions.get(token)
+			if session is None:
+				return None
+			session.last_access = now
+			self._sessions.move_to_end(token)
+
+		return session
+
+		# end
+
+	def remove(self, token: str):
+		"""Elimina la sessione associata al token, se presente."""
+
+		with self._lock:
+			self._sessions.pop(token, None)
+
+		# end
+
+	def __len__(self):
+		with self._lock:
+			return len(self._sessions)
+
+	# end class
@@ -0,0 +1,494 @@
+"""
+
+    similarity_engine.py \n
+    by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+    Questo file implementa il calcolo a blocchi della similarità coseno tra i
+    film. Le righe della matrice film x feature vengono normalizzate (norma L2)
+    una sola volta; la similarità viene poi calcolata per blocchi di righe,
+    dimensionati in base ad un budget di memoria, e ogni blocco viene passato
+    ad un "consumer" (scrittura su disco, selezione dei top-k vicini,
+    accumulo delle predizioni dei rating), senza mai costruire l'intera
+    matrice film x film in memoria.
+
+    'SimilarityProvider' calcola invece la matrice completa una sola volta e
+    la salva su disco, indicizzata per hash della matrice film x feature: le
+    esecuzioni successive sugli stessi dati la aprono in memory-mapping, in
+    sola lettura, senza ricalcolarla.
+
+"""
+
+#   ########################################################################   #
+#   LIBRERIE
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+from constants import SIMILARITY_CACHE_DIR
+
+#   ########################################################################   #
+#   VARIABILI GLOBALI
+
+DEFAULT_MAX_MEM = '1G'
+"""Budget di memoria predefinito per un blocco di similarità (e le strutture temporanee dei consumer)."""
+
+BLOCK_OVERHEAD = 6
+"""
+Stima del numero di copie di un blocco denso presenti contemporaneamente in
+memoria: il prodotto sparso intermedio, il blocco denso e le strutture
+temporanee dei consumer grandi quanto il blocco (es. argpartition). Le
+strutture di dimensione diversa sono dichiarate dal consumer con 'row_bytes()'.
+"""
+
+PREDICTION_BYTES_PER_USER = 48
+"""
+Byte per utente e per riga del blocco allocati da 'PredictionAccumulator.consume':
+numeratore, denominatore e tre array temporanei float64, la maschera e le predizioni float32.
+"""
+
+#   ########################################################################   #
+#   NORMALIZZAZIONE E DIMENSIONAMENTO
+
+def normalize_rows(X, dtype = np.float32):
+    """
+    Restituisce una copia CSR di X con righe a norma L2 unitaria.
+    Le righe nulle (film senza feature) restano nulle, come in 'cosine_similarity'.
+    """
+
+    X = csr_matrix(X, dtype=dtype)
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=(norms > 0))
+    return csr_matrix(diags(inv_norms.astype(dtype)) @ X)
+
+    # end
+
+def parse_memory_size(value) -> int:
+    """Converte una dimensione come '512M', '2G' o '1048576' nel numero di byte corrispondente."""
+
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    text = str(value).strip().upper().removesuffix('B')
+
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+    # end
+
+def block_rows_for_budget(n_items: int, max_mem, dtype = np.float32, consumer_row_bytes: int = 0) -> int:
+    """
+    Calcola quante righe di similarità (ognuna lunga 'n_items') possono essere
+    elaborate insieme senza superare il budget di memoria 'max_mem'.
+    'consumer_row_bytes' sono i byte allocati in più dal consumer per ogni riga del blocco.
+    """
+
+    row_bytes = n_items * np.dtype(dtype).itemsize * BLOCK_OVERHEAD + consumer_row_bytes
+    return max(1, min(n_items, parse_memory_size(max_mem) // max(1, row_bytes)))
+
+    # end
+
+#   ########################################################################   #
+#   CALCOLO A BLOCCHI
+
+def iter_similarity_blocks(Xn, block_rows: int, rows = None):
+    """
+    Genera la matrice di similarità per blocchi di righe.
+
+    Args:
+        Xn: matrice film x feature con righe normalizzate (vedi 'normalize_rows').
+        block_rows: numero di righe (film) per blocco.
+        rows: intervallo (start, end) delle righe da generare; se None tutte.
+
+    Yields:
+        Coppie (start, block), dove 'block' è l'array denso con le similarità
+        delle righe [start, start + len(block)) verso tutti i film.
+    """
+
+    XnT = Xn.T.tocsc()
+    first, last = rows if rows is not None else (0, Xn.shape[0])
+
+    for start in range(first, last, block_rows):
+        end = min(start + block_rows, last)
+        yield start, (Xn[start:end] @ XnT).toarray()
+
+    # end
+
+def compute_similarity(X, consumer, block_rows: int = None, max_mem = DEFAULT_MAX_MEM, dtype = np.float32, rows = None):
+    """
+    Calcola la similarità coseno tra le righe di X passando ogni blocco a 'consumer'.
+
+    Args:
+        X: matrice sparsa film x feature.
+        consumer: oggetto con i metodi 'consume(start, block)' e 'result()' e,
+            opzionalmente, 'row_bytes()' (byte allocati in più per ogni riga del blocco).
+        block_rows: numero di righe per blocco; se None è ricavato da 'max_mem'.
+        max_mem: budget di memoria per blocco (es. '512M', '2G').
+        dtype: tipo dei valori di similarità (float32 o float64).
+        rows: intervallo (start, end) delle righe da calcolare; se None tutte.
+
+    Returns:
+        Il valore restituito da 'consumer.result()'.
+    """
+
+    if block_rows is None:
+        consumer_row_bytes = consumer.row_bytes() if hasattr(consumer, 'row_bytes') else 0
+        block_rows = block_rows_for_budget(X.shape[0], max_mem, dtype, consumer_row_bytes)
+
+    Xn = normalize_rows(X, dtype)
+
+    for start, block in iter_similarity_blocks(Xn, block_rows, rows):
+        consumer.consume(start, block)
+
+    return consumer.result()
+
+    # end
+
+#   ########################################################################   #
+#   CONSUMER
+
+class ConsumerGroup:
+    """Inoltra ogni blocco a più consumer, così da calcolare la similarità una sola volta."""
+
+    def __init__(self, *consumers):
+        self.consumers = consumers
+
+    def consume(self, start: int, block):
+        for consumer in self.consumers:
+            consumer.consume(start, block)
+
+    def row_bytes(self):
+        return sum(consumer.row_bytes() for consumer in self.consumers if hasattr(consumer, 'row_bytes'))
+
+    def result(self):
+        return [consumer.result() for consumer in self.consumers]
+
+    # end class
+
+class SparseWriter:
+    """Raccoglie i valori non nulli di ogni blocco e restituisce la matrice di similarità in formato CSR."""
+
+    def __init__(self, n_items: int, dtype = np.float32):
+
+        self.n_items = n_items
+        self.dtype = dtype
+        self._blocks = []
+
+        # end
+
+    def consume(self, start: int, block):
+        self._blocks.append(csr_matrix(block, dtype=self.dtype))
+
+    def result(self):
+
+        if not self._blocks:
+            return csr_matrix((self.n_items, self.n_items), dtype=self.dtype)
+
+        # Concatenazione diretta degli array CSR dei blocchi di righe.
+        indptr = [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for b in self._blocks:
+            indptr.append(b.indptr[1:].astype(np.int64) + offset)
+            offset += b.nnz
+
+        return csr_matrix(
+            (
+                np.concatenate([b.data for b in self._blocks]),
+                np.concatenate([b.indices for b in self._blocks]),
+                np.concatenate(indptr)
+            ),
+            shape=(self.n_items, self.n_items)
+        )
+
+        # end
+
+    # end class
+
+class DenseNpyWriter:
+    """
+    Scrive la matrice di similarità densa in un file .npy, un blocco di righe
+    alla volta, tramite memory-mapping: la matrice non risiede mai in RAM.
+    """
+
+    def __init__(self, path, n_items: int, dtype = np.float32):
+
+        self.path = path
+        self._out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(n_items, n_items))
+
+        # end
+
+    def consume(self, start: int, block):
+        self._out[start:start + block.shape[0]] = block
+
+    def result(self):
+
+        self._out.flush()
+        del self._out
+        return self.path
+
+        # end
+
+    # end class
+
+class DenseArrayWriter:
+    """Scrive la matrice di similarità densa in un array in memoria, un blocco di righe alla volta."""
+
+    def __init__(self, n_items: int, dtype = np.float32):
+        self._out = np.empty((n_items, n_items), dtype=dtype)
+
+    def consume(self, start: int, block):
+        self._out[start:start + block.shape[0]] = block
+
+    def result(self):
+        return self._out
+
+    # end class
+
+class TopKSelector:
+    """
+    Mantiene, per ogni film, solo i 'k' vicini più simili (escluso il film stesso)
+    con similarità almeno pari a 'min_sim'. Il risultato è un grafo k-NN in formato
+    CSR con valori float32 e indici int32.
+    """
+
+    def __init__(self, n_items: int, k: int, min_sim: float = 0.0):
+
+        self.n_items = n_items
+        self.k = min(k, max(n_items - 1, 0))
+        self.min_sim = min_sim
+        self._counts = []
+        self._indices = []
+        self._data = []
+
+        # end
+
+    def consume(self, start: int, block):
+
+        rows = np.arange(block.shape[0])
+
+        # Il film non è vicino di sé stesso (la diagonale viene ripristinata per gli altri consumer).
+        diagonal = block[rows, start + rows].copy()
+        block[rows, start + rows] = -np.inf
+
+        if self.k > 0:
+            top = np.argpartition(-block, self.k - 1, axis=1)[:, :self.k]
+        else:
+            top = np.empty((block.shape[0], 0), dtype=np.intp)
+
+        # Indici di colonna ordinati per riga, come richiesto dal formato CSR canonico.
+        top = np.sort(top, axis=1)
+        values = np.take_along_axis(block, top, axis=1)
+        block[rows, start + rows] = diagonal
+
+        # Si scartano i vicini sotto soglia e quelli senza feature in comune.
+        keep = (values > 0) & (values >= self.min_sim)
+
+        self._counts.append(keep.sum(axis=1))
+        self._indices.append(top[keep].astype(np.int32))
+        self._data.append(values[keep].astype(np.float32))
+
+        # end
+
+    def result(self):
+
+        counts = np.concatenate(self._counts) if self._counts else np.zeros(0, dtype=np.int64)
+        indptr = np.zeros(self.n_items + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        if indptr[-1] <= np.iinfo(np.int32).max:
+            indptr = indptr.astype(np.int32)
+
+        return csr_matrix(
+            (
+                np.concatenate(self._data) if self._data else np.zeros(0, dtype=np.float32),
+                np.concatenate(self._indices) if self._indices else np.zeros(0, dtype=np.int32),
+                indptr
+            ),
+            shape=(self.n_items, self.n_items)
+        )
+
+        # end
+
+    # end class
+
+class PredictionAccumulator:
+    """
+    Predice i rating di tutti gli utenti per i film di ogni blocco.
+
+    Il blocco di righe [start, end) della similarità contiene i pesi dei film
+    valutati nella predizione dei film start..end-1, quindi per quelle colonne
+    numeratore e denominatore sono R x S_block^T e B x S_block^T, dove B è la
+    maschera binaria dei film valutati. Le predizioni sono scritte in 'out'
+    (es. le righe di un matrix store), con NaN sui film già valutati.
+    """
+
+    def __init__(self, R, out):
+        """
+        Args:
+            R: matrice sparsa CSR (utenti x film) dei rating reali.
+            out: array (utenti x film) in cui scrivere le predizioni.
+        """
+
+        self.R = csr_matrix(R, dtype=np.float64)
+        self.B = self.R.copy()
+        self.B.data[:] = 1.0
+        self.B_csc = self.B.tocsc()
+        self.user_means = user_rating_means(self.R)
+        self.out = out
+
+        # end
+
+    def row_bytes(self):
+        """Ogni riga del blocco diventa una colonna (lunga quanto il numero di utenti) delle predizioni."""
+        return self.R.shape[0] * PREDICTION_BYTES_PER_USER
+
+    def consume(self, start: int, block):
+
+        end = start + block.shape[0]
+        numerator = np.asarray(self.R @ block.T)
+        denominator = np.asarray(self.B @ block.T)
+
+        pred = predict_from_sums(numerator, denominator, self.user_means)
+        pred[self.B_csc[:, start:end].nonzero()] = np.nan
+
+        self.out[:, start:end] = pred
+
+        # end
+
+    def result(self):
+        return self.out
+
+    # end class
+
+#   ########################################################################   #
+#   MATRICE DI SIMILARITÀ CONDIVISA
+
+def feature_matrix_hash(X) -> str:
+    """Hash SHA-256 del contenuto della matrice film x feature (forma canonica CSR)."""
+
+    X = csr_matrix(X, copy=True)
+    X.sum_duplicates()
+    X.sort_indices()
+
+    digest = hashlib.sha256()
+    digest.update(np.asarray(X.shape, dtype=np.int64).tobytes())
+    digest.update(X.indptr.astype(np.int64).tobytes())
+    digest.update(X.indices.astype(np.int64).tobytes())
+    digest.update(X.data.astype(np.float64).tobytes())
+    return digest.hexdigest()
+
+    # end
+
+class SimilarityProvider:
+    """
+    Matrice di similarità coseno (film x film) calcolata una sola volta e
+    condivisa, in sola lettura, tra più recommender o processi.
+
+    Le righe e le colonne sono indicizzate per posizione (riga della matrice
+    film x feature). Con 'cache_dir' la matrice viene salvata in un file .npy
+    il cui nome contiene l'hash di X: se il file esiste già viene aperto in
+    memory-mapping invece di ricalcolare la similarità, e i processi che lo
+    aprono condividono le stesse pagine della page cache. Quando viene scritto
+    un nuovo file, quelli calcolati per altre matrici film x feature sono
+    eliminati. Con cache_dir=None la matrice è calcolata e mantenuta in memoria.
+    In entrambi i casi il calcolo procede a blocchi nel budget 'max_mem'.
+    """
+
+    def __init__(self, X, cache_dir = SIMILARITY_CACHE_DIR, dtype = np.float64, max_mem = DEFAULT_MAX_MEM):
+
+        self.n_items = X.shape[0]
+        self.dtype = np.dtype(dtype)
+        self.key = feature_matrix_hash(X)
+        self.path = None
+        self.from_cache = False
+        self._matrix = None
+
+        if cache_dir is None:
+            self._matrix = compute_similarity(X, DenseArrayWriter(self.n_items, self.dtype), max_mem=max_mem, dtype=self.dtype)
+            self._matrix.setflags(write=False)
+            return
+
+        self.path = Path(cache_dir) / f'cosine_{self.key[:16]}_{self.dtype.name}.npy'
+        self.from_cache = self.path.exists()
+
+        if not self.from_cache:
+            # Scrittura su file temporaneo, blocco per blocco, e sostituzione solo a calcolo completato.
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            compute_similarity(X, DenseNpyWriter(tmp_path, self.n_items, self.dtype), max_mem=max_mem, dtype=self.dtype)
+            os.replace(tmp_path, self.path)
+            self._prune_cache()
+
+        # end
+
+    def _prune_cache(self):
+        """Elimina dalla cache le matrici calcolate per altre matrici film x feature."""
+
+        for path in self.path.parent.glob('cosine_*.npy'):
+            if not path.name.startswith(f'cosine_{self.key[:16]}_'):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+        # end
+
+    @property
+    def matrix(self):
+        """La matrice di similarità (n_items x n_items), in sola lettura."""
+
+        if self._matrix is None:
+            self._matrix = np.load(self.path, mmap_mode='r')
+        return self._matrix
+
+        # end
+
+    def row(self, row: int):
+        """Similarità del film alla riga 'row' con tutti i film."""
+        return self.matrix[row]
+
+    def submatrix(self, rows, cols):
+        """Similarità tra i film alle righe 'rows' e quelli alle righe 'cols'."""
+        return self.matrix[np.ix_(np.asarray(rows), np.asarray(cols))]
+
+    def __getstate__(self):
+
+        # Con la cache su disco ai processi worker viene passato solo il percorso del file.
+        state = self.__dict__.copy()
+        if self.path is not None:
+            state['_matrix'] = None
+        return state
+
+        # end
+
+    # end class
+
+#   ########################################################################   #
+#   PREDIZIONE DEI RATING
+
+def user_rating_means(R):
+    """Media dei rating reali di ogni utente (righe di R), 0.5 per gli utenti senza rating."""
+
+    counts = np.diff(R.indptr)
+    sums = np.asarray(R.sum(axis=1)).ravel()
+    return np.divide(sums, counts, out=np.full(len(counts), 0.5), where=(counts > 0))
+
+    # end
+
+def predict_from_sums(numerator, denominator, user_means):
+    """
+    Combina le somme pesate nelle predizioni finali (float32): numeratore / denominatore
+    dove la somma delle similarità è positiva, altrimenti la media dei voti dell'utente;
+    il risultato è limitato tra 1 e 5.
+    """
+
+    has_similarity = denominator > 0
+    pred = np.divide(numerator, denominator, out=np.zeros_like(numerator, dtype=float), where=has_similarity)
+    pred = np.where(has_similarity, pred, user_means[:, None])
+
+    # Clipping tra 1 e 5 per mantenere i valori nel range corretto
+    return np.clip(pred, 1.0, 5.0).astype(np.float32)
+
+    # end
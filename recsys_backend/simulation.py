@@ -0,0 +1,252 @@
+"""
+
+    simulation.py \n
+    by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+    Questo script simula offline il percorso login -> top features -> MAB
+    del server per tutti gli utenti del dataset, su una griglia di parametri
+    (MIN_SUPPORT, TOP_FEATURES, MOVIE_RECOMMENDATIONS e temperatura della
+    softmax), usando le stesse funzioni di http_server.py.
+
+    Per ogni utente una parte dei rating reali viene nascosta: i rating
+    complementati sono ricalcolati sui soli rating rimasti, così che i film
+    nascosti possano essere raccomandati. Per ogni configurazione vengono
+    misurati il tempo medio di ogni fase e l'hit rate, cioè la frazione di
+    utenti a cui è stato raccomandato almeno un film nascosto che avevano
+    apprezzato. Le configurazioni sono valutate in parallelo su un pool di
+    processi e la tabella di confronto è salvata in 'evaluation_results'.
+
+"""
+
+#   ########################################################################    #
+#   LIBRERIE
+
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import http_server as server
+from build_ratings_complemented import build_ratings_matrix
+from constants import MIN_SUPPORT, \
+    TOP_FEATURES, \
+    MOVIE_RECOMMENDATIONS, \
+    SOFTMAX_TEMPERATURE
+from similarity_engine import DEFAULT_MAX_MEM, PredictionAccumulator, compute_similarity
+
+#   ########################################################################    #
+#   VARIABILI GLOBALI
+
+STAGES = ['load_ratings', 'ratings_vector', 'feature_means', 'top_features', 'attach_movies', 'mab']
+"""Fasi del percorso login -> raccomandazioni di cui viene misurato il tempo."""
+
+LIKED_THRESHOLD = 4.0
+"""Rating minimo perché un film nascosto sia considerato apprezzato dall'utente."""
+
+_worker_state = {}
+"""Dati della simulazione condivisi da un processo worker (ricevuti una sola volta per processo)."""
+
+#   ########################################################################    #
+#   PREPARAZIONE DEI DATI
+
+def holdout_split(ratings_df, holdout: float, seed: int):
+    """Nasconde una frazione 'holdout' dei rating reali di ogni utente."""
+
+    hidden = ratings_df.groupby('userId', group_keys=False).sample(frac=holdout, random_state=seed)
+    return ratings_df.drop(hidden.index), hidden
+
+def complement_ratings(train_df, user_ids, max_mem = DEFAULT_MAX_MEM):
+    """
+    Ricalcola i rating complementati (utenti x film, NaN sui film visti) sui soli
+    rating di training, come build_ratings_complemented.py ma in memoria.
+    """
+
+    R = build_ratings_matrix(train_df, user_ids, server.movie_mapping)
+    comp = np.full(R.shape, np.nan, dtype=np.float32)
+    compute_similarity(server.movie_features_matrix, PredictionAccumulator(R, comp), max_mem=max_mem, dtype=np.float64)
+    return comp
+
+def init_worker(user_ids, train_df, hidden_df, comp, seed):
+    """Riceve una sola volta per processo i dati della simulazione."""
+
+    _worker_state['user_ids'] = user_ids
+    _worker_state['train'] = {u: df for u, df in train_df.groupby('userId')}
+    _worker_state['liked'] = {
+        u: set(df.loc[df['rating'] >= LIKED_THRESHOLD, 'movieId'].astype(int))
+        for u, df in hidden_df.groupby('userId')
+    }
+    _worker_state['comp'] = comp
+    _worker_state['seed'] = seed
+
+#   ########################################################################    #
+#   SIMULAZIONE
+
+def simulate_user(user_row: int, min_support: int, top_features: int, movie_recommendations: int, temperature: float, timings: dict):
+    """
+    Esegue per un utente le fasi di '/login-user' e '/get-recommendations',
+    sommando in 'timings' il tempo di ogni fase.
+
+    Returns:
+        Coppia (film raccomandati, numero di top features estratte).
+    """
+
+    user_id = int(_worker_state['user_ids'][user_row])
+
+    t0 = time.perf_counter()
+    train = _worker_state['train'].get(user_id)
+    real_ratings = {} if train is None else dict(zip(train['movieId'].astype(int), train['rating'].astype(float)))
+    row = _worker_state['comp'][user_row]
+    mask = ~np.isnan(row)
+    comp_ratings = dict(zip(server.movie_mapping.ids[mask].tolist(), row[mask].astype(float).tolist()))
+    all_ratings = {**comp_ratings, **real_ratings}
+
+    t1 = time.perf_counter()
+    movie_ratings = server.build_ratings_vector(all_ratings)
+
+    t2 = time.perf_counter()
+    feature_means = server.compute_feature_means(movie_ratings, min_support)
+
+    t3 = time.perf_counter()
+    top_features_list = server.extract_user_top_features(feature_means, top_features)
+
+    t4 = time.perf_counter()
+    server.attach_movies_to_features(top_features_list, real_ratings, comp_ratings)
+
+    t5 = time.perf_counter()
+    # Generatore per utente: a parità di parametri le estrazioni del MAB sono riproducibili.
+    rng = np.random.default_rng(_worker_state['seed'] + user_id)
+    predictions = server.mab_softmax_predictions(top_features_list, temperature, movie_recommendations, rng=rng)
+
+    t6 = time.perf_counter()
+
+    for stage, elapsed in zip(STAGES, np.diff([t0, t1, t2, t3, t4, t5, t6])):
+        timings[stage] += elapsed
+
+    recommended = {int(m) for p in predictions for m in p['movies']}
+    return recommended, len(top_features_list)
+
+def simulate_shard(config_id: int, config: dict, start: int, end: int):
+    """Simula una configurazione sugli utenti nelle righe [start, end) e ne restituisce i totali."""
+
+    totals = dict.fromkeys(STAGES, 0.0)
+    totals.update(users=end - start, hit_users=0, hits=0, recommended=0, n_top_features=0)
+
+    for user_row in range(start, end):
+        recommended, n_top = simulate_user(user_row, timings=totals, **config)
+        liked = _worker_state['liked'].get(int(_worker_state['user_ids'][user_row]), set())
+
+        user_hits = len(recommended & liked)
+        totals['hit_users'] += user_hits > 0
+        totals['hits'] += user_hits
+        totals['recommended'] += len(recommended)
+        totals['n_top_features'] += n_top
+
+    return config_id, totals
+
+def summarize(config: dict, totals: dict):
+    """Metriche di una configurazione a partire dai totali dei suoi shard."""
+
+    n_users = totals['users']
+    return {
+        **config,
+        'hit_rate': totals['hit_users'] / n_users,
+        'precision': totals['hits'] / totals['recommended'] if totals['recommended'] else 0.0,
+        'avg_recommended': totals['recommended'] / n_users,
+        'avg_top_features': totals['n_top_features'] / n_users,
+        **{f'{stage}_ms': 1000 * totals[stage] / n_users for stage in STAGES},
+        'total_ms': 1000 * sum(totals[stage] for stage in STAGES) / n_users
+    }
+
+#   ########################################################################    #
+#   MAIN
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Simula offline login -> top features -> MAB per tutti gli utenti su una griglia di parametri.")
+    parser.add_argument('--min-support', nargs='+', default=[MIN_SUPPORT], type=int,
+        help="valori di MIN_SUPPORT da simulare")
+    parser.add_argument('--top-features', nargs='+', default=[TOP_FEATURES], type=int,
+        help="valori di TOP_FEATURES da simulare")
+    parser.add_argument('--movie-recommendations', nargs='+', default=[MOVIE_RECOMMENDATIONS], type=int,
+        help="valori di MOVIE_RECOMMENDATIONS da simulare")
+    parser.add_argument('--temperature', nargs='+', default=[SOFTMAX_TEMPERATURE], type=float,
+        help="temperature della softmax da simulare")
+    parser.add_argument('--holdout', default=0.2, type=float,
+        help="frazione dei rating reali di ogni utente nascosta alla simulazione")
+    parser.add_argument('--seed', default=42, type=int,
+        help="seme per la suddivisione dei rating e per le estrazioni del MAB")
+    parser.add_argument('--workers', default=os.cpu_count(), type=int,
+        help="numero di processi worker (1 = esecuzione sequenziale)")
+    parser.add_argument('--output', default='./evaluation_results/simulation_results.csv', type=str,
+        help="percorso del CSV con la tabella di confronto")
+    args = parser.parse_args()
+
+    #   ####################################################################    #
+    #   PREPARAZIONE DEI DATI
+
+    ratings_df = server.real_ratings_df
+    user_ids = np.sort(ratings_df['userId'].unique())
+    train_df, hidden_df = holdout_split(ratings_df, args.holdout, args.seed)
+    print(f"{len(user_ids)} utenti: {len(train_df)} rating visibili, {len(hidden_df)} nascosti")
+
+    print("Ricalcolo dei rating complementati sui rating visibili...")
+    start = time.perf_counter()
+    comp = complement_ratings(train_df, user_ids)
+    print(f"Fatto in {time.perf_counter() - start:.1f}s")
+
+    #   ####################################################################    #
+    #   SIMULAZIONE DELLA GRIGLIA DI PARAMETRI
+
+    configs = [
+        dict(min_support=ms, top_features=tf, movie_recommendations=k, temperature=tau)
+        for ms, tf, k, tau in itertools.product(args.min_support, args.top_features, args.movie_recommendations, args.temperature)
+    ]
+    workers = max(1, args.workers)
+    print(f"Simulazione di {len(configs)} configurazioni su {workers} processi...")
+
+    # Ogni configurazione è divisa in shard di utenti, così anche una sola configurazione usa tutti i worker.
+    bounds = np.linspace(0, len(user_ids), min(len(user_ids), workers) + 1).astype(int)
+    tasks = [(i, config, start, end) for i, config in enumerate(configs) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    start = time.perf_counter()
+    initargs = (user_ids, train_df, hidden_df, comp, args.seed)
+
+    if workers == 1:
+        init_worker(*initargs)
+        shards = [simulate_shard(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+            shards = list(executor.map(simulate_shard, *zip(*tasks)))
+
+    totals = [None] * len(configs)
+    for config_id, shard in shards:
+        totals[config_id] = shard if totals[config_id] is None else {k: totals[config_id][k] + v for k, v in shard.items()}
+
+    results = [summarize(config, config_totals) for config, config_totals in zip(configs, totals)]
+    print(f"Fatto in {time.perf_counter() - start:.1f}s")
+
+    #   ####################################################################    #
+    #   TABELLA DI CONFRONTO
+
+    results = pd.DataFrame(results).sort_values('hit_rate', ascending=False, ignore_index=True)
+
+    with pd.option_context('display.width', 200, 'display.float_format', '{:.4f}'.format):
+        print(results.to_string(index=False))
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(output_path, index=False)
+    print(f"\nRisultati salvati in: {output_path}")
+
+    # end
+
+#   ########################################################################    #
+#   ENTRY POINT
+
+if __name__ == '__main__':
+    main()
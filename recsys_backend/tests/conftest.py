@@ -0,0 +1,21 @@
+"""
+
+	conftest.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Configurazione comune dei test del backend: i moduli del backend sono
+	importabili da qualsiasi cartella di esecuzione. I test che richiedono i
+	file in './data' creano una propria cartella di dati minima.
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+import os
+import sys
+
+#	########################################################################	#
+#	PERCORSI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,68 @@
+"""
+
+	test_session_store.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Verifica lo store delle sessioni: una sessione non è più valida quando
+	scade per inattività, quando viene eliminata dalla politica LRU oppure
+	quando il token è sconosciuto (es. dopo il riavvio del server).
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+from session_store import RecSys_SessionStore
+
+#	########################################################################	#
+#	TEST
+
+def test_valid_session_is_returned():
+
+	store = RecSys_SessionStore(max_sessions=2, ttl=60)
+	session = store.create('1')
+
+	assert store.get(session.token) is session
+	assert session.user_id == '1'
+
+	# end
+
+def test_least_recently_used_session_is_evicted():
+
+	store = RecSys_SessionStore(max_sessions=2, ttl=60)
+	first = store.create('1')
+	second = store.create('2')
+
+	# L'accesso a 'first' la rende la più recente: viene eliminata 'second'.
+	assert store.get(first.token) is first
+	third = store.create('3')
+
+	assert store.get(second.token) is None
+	assert store.get(first.token) is first
+	assert store.get(third.token) is third
+	assert len(store) == 2
+
+	# end
+
+def test_expired_session_is_removed():
+
+	store = RecSys_SessionStore(max_sessions=2, ttl=60)
+	expired = store.create('1')
+	expired.last_access -= store.ttl + 1
+
+	assert store.get(expired.token) is None
+	assert len(store) == 0
+
+	# end
+
+def test_unknown_or_removed_token_is_rejected():
+
+	store = RecSys_SessionStore(max_sessions=2, ttl=60)
+	session = store.create('1')
+	store.remove(session.token)
+
+	assert store.get(session.token) is None
+	assert store.get('token-sconosciuto') is None
+	assert store.get(None) is None
+
+	# end
@@ -0,0 +1,136 @@
+"""
+
+	test_sessions.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Verifica che le route che richiedono una sessione rispondano 401 quando il
+	token non è più valido: sessione scaduta per inattività, eliminata dalla
+	politica LRU oppure sconosciuta (es. dopo il riavvio del server). Il client
+	usa questa risposta per tornare alla schermata di login.
+
+	Il server legge i propri file da './data' all'importazione: i test creano
+	una cartella 'data' minima (tre film, due feature, due utenti) e importano
+	il server da lì.
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+from http import HTTPStatus
+from http.client import parse_headers
+import importlib
+import io
+import os
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix, save_npz
+
+from constants import SESSION_HEADER
+from session_store import RecSys_SessionStore
+
+#	########################################################################	#
+#	FIXTURE
+
+FIXTURE_FILES = {
+	'data/movie_index.csv': 'movie_id,matrix_id\n1,0\n2,1\n3,2\n',
+	'data/feature_index.csv': 'feature_id,category,feature\n0,genres,Drama\n1,actors,Someone\n',
+	'data/CSVs/existing_movies.csv': 'movieID,movie_name\n1,Primo\n2,Secondo\n3,Terzo\n',
+	'data/CSVs/movie_abstracts.csv': 'movieId,value\n1,Uno\n2,Due\n3,Tre\n',
+	'data/CSVs/existing_ratings.csv': 'userId,movieId,rating,timestamp\n1,1,4.0,0\n1,2,3.0,0\n2,3,5.0,0\n',
+}
+"""File minimi letti dal server all'avvio."""
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+	"""Importa il server sulla cartella 'data' di test e restituisce il modulo."""
+
+	root = tmp_path_factory.mktemp('server')
+	for name, content in FIXTURE_FILES.items():
+		(root / name).parent.mkdir(parents=True, exist_ok=True)
+		(root / name).write_text(content)
+
+	(root / 'data/movie_posters').mkdir()
+	save_npz(root / 'data/movie_vectors_sparse.npz', csr_matrix(np.array([[1, 0], [1, 1], [0, 1]], dtype=float)))
+
+	cwd = os.getcwd()
+	os.chdir(root)
+	try:
+		yield importlib.import_module('http_server')
+	finally:
+		os.chdir(cwd)
+
+	# end
+
+@pytest.fixture
+def sessions(server, monkeypatch):
+	"""Sostituisce lo store delle sessioni del server con uno store di una sola sessione."""
+
+	store = RecSys_SessionStore(max_sessions=1, ttl=60)
+	monkeypatch.setattr(server, 'sessions', store)
+	return store
+
+	# end
+
+#	########################################################################	#
+#	FUNZIONI DI SUPPORTO
+
+def get(server, path: str, token: str = None) -> int:
+	"""Esegue una GET su RecSys_RequestHandler, senza socket, e restituisce il codice della risposta."""
+
+	raw_headers = f'{SESSION_HEADER}: {token}\r\n' if token else ''
+
+	# BaseHTTPRequestHandler.__init__ leggerebbe la richiesta dal socket: gli attributi sono impostati qui.
+	handler = server.RecSys_RequestHandler.__new__(server.RecSys_RequestHandler)
+	handler.command = 'GET'
+	handler.path = path
+	handler.request_version = 'HTTP/1.1'
+	handler.requestline = f'GET {path} HTTP/1.1'
+	handler.headers = parse_headers(io.BytesIO(raw_headers.encode('latin-1') + b'\r\n'))
+	handler.client_address = ('127.0.0.1', 0)
+	handler.rfile = io.BytesIO()
+	handler.wfile = io.BytesIO()
+	handler.close_connection = True
+
+	handler.do_GET()
+
+	status_line = handler.wfile.getvalue().split(b'\r\n', 1)[0]
+	return int(status_line.split()[1])
+
+	# end
+
+#	########################################################################	#
+#	TEST
+
+def test_valid_session_is_accepted(server, sessions):
+
+	session = sessions.create('1')
+	assert get(server, '/get-recommendations', session.token) == HTTPStatus.OK
+
+	# end
+
+def test_evicted_session_is_unauthorized(server, sessions):
+
+	evicted = sessions.create('1')
+	sessions.create('2')
+
+	assert get(server, '/get-recommendations', evicted.token) == HTTPStatus.UNAUTHORIZED
+
+	# end
+
+def test_expired_session_is_unauthorized(server, sessions):
+
+	expired = sessions.create('1')
+	expired.last_access -= sessions.ttl + 1
+
+	assert get(server, '/get-recommendations', expired.token) == HTTPStatus.UNAUTHORIZED
+
+	# end
+
+def test_unknown_session_is_unauthorized(server, sessions):
+
+	assert get(server, '/get-recommendations', 'token-sconosciuto') == HTTPStatus.UNAUTHORIZED
+	assert get(server, '/get-recommendations') == HTTPStatus.UNAUTHORIZED
+
+	# end
@@ -0,0 +1,73 @@
+"""
+
+    test_similarity_engine.py \n
+    by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+    Verifica che il calcolo a blocchi delle predizioni rispetti il budget di
+    memoria '--max-mem': il picco di memoria allocata durante il calcolo,
+    compresi i prodotti (utenti x blocco) di 'PredictionAccumulator', non deve
+    superare il budget.
+
+"""
+
+#   ########################################################################   #
+#   LIBRERIE
+
+import tracemalloc
+
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+from similarity_engine import PredictionAccumulator, \
+    compute_similarity, \
+    parse_memory_size
+
+#   ########################################################################   #
+#   TEST
+
+@pytest.mark.parametrize('n_users, n_items, max_mem', [
+    (3000, 1000, '4M'),     # blocco e predizioni di dimensioni simili
+    (20000, 500, '8M'),     # molti utenti: dominano i prodotti utenti x blocco
+    (500, 3000, '16M'),     # molti film: domina il blocco di similarità
+])
+def test_prediction_accumulator_peak_memory(n_users, n_items, max_mem):
+
+    X = sparse_random(n_items, 200, density=0.05, format='csr', random_state=1)
+    R = sparse_random(n_users, n_items, density=0.02, format='csr', random_state=2)
+    R.data = np.round(R.data * 4 + 1)
+
+    out = np.zeros((n_users, n_items), dtype=np.float32)
+    accumulator = PredictionAccumulator(R, out)
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        compute_similarity(X, accumulator, max_mem=max_mem, dtype=np.float64)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    assert peak <= parse_memory_size(max_mem)
+    assert np.isfinite(out[R.toarray() == 0]).all()
+
+    # end
+
+def test_prediction_accumulator_column_ranges():
+
+    X = sparse_random(300, 50, density=0.1, format='csr', random_state=3)
+    R = sparse_random(200, 300, density=0.05, format='csr', random_state=4)
+    R.data = np.round(R.data * 4 + 1)
+
+    expected = np.zeros((200, 300), dtype=np.float32)
+    compute_similarity(X, PredictionAccumulator(R, expected), max_mem='64K', dtype=np.float64)
+
+    # Come i worker di build_ratings_complemented.py: ogni intervallo di righe scrive le proprie colonne.
+    out = np.zeros_like(expected)
+    accumulator = PredictionAccumulator(R, out)
+    for start, end in [(0, 70), (70, 71), (71, 300)]:
+        compute_similarity(X, accumulator, max_mem='64K', dtype=np.float64, rows=(start, end))
+
+    np.testing.assert_array_equal(out, expected)
+
+    # end
@@ -0,0 +1,71 @@
+"""
+
+    test_similarity_provider.py \n
+    by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+    Verifica 'SimilarityProvider': la matrice in memoria è calcolata a blocchi
+    nel budget di memoria e coincide con quella in cache; la cache mantiene
+    solo la matrice della matrice film x feature corrente.
+
+"""
+
+#   ########################################################################   #
+#   LIBRERIE
+
+import tracemalloc
+
+import numpy as np
+from scipy.sparse import random as sparse_random
+
+from similarity_engine import SimilarityProvider, normalize_rows
+
+#   ########################################################################   #
+#   TEST
+
+def feature_matrix(seed: int, n_items: int = 400):
+    return sparse_random(n_items, 100, density=0.05, format='csr', random_state=seed)
+
+def test_in_memory_matrix_matches_cache(tmp_path):
+
+    X = feature_matrix(1)
+    Xn = normalize_rows(X, np.float64)
+    expected = (Xn @ Xn.T).toarray()
+
+    in_memory = SimilarityProvider(X, cache_dir=None, max_mem='64K')
+    cached = SimilarityProvider(X, cache_dir=tmp_path, max_mem='64K')
+
+    np.testing.assert_allclose(in_memory.matrix, expected, atol=1e-12)
+    np.testing.assert_array_equal(in_memory.matrix, cached.matrix)
+
+    # end
+
+def test_in_memory_matrix_peak_memory():
+
+    n_items = 2000
+    X = feature_matrix(2, n_items)
+    matrix_bytes = n_items * n_items * 8
+
+    tracemalloc.start()
+    try:
+        SimilarityProvider(X, cache_dir=None, max_mem='1M')
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # Oltre alla matrice risultante, solo i blocchi nel budget (e le strutture sparse di X).
+    assert peak <= matrix_bytes + (2 << 20)
+
+    # end
+
+def test_cache_keeps_only_current_matrix(tmp_path):
+
+    old = SimilarityProvider(feature_matrix(3), cache_dir=tmp_path)
+    new = SimilarityProvider(feature_matrix(4), cache_dir=tmp_path)
+
+    assert not old.path.exists()
+    assert sorted(tmp_path.glob('cosine_*.npy')) == [new.path]
+
+    # Una seconda apertura della matrice corrente la legge dalla cache.
+    assert SimilarityProvider(feature_matrix(4), cache_dir=tmp_path).from_cache
+
+    # end
@@ -0,0 +1,87 @@
+"""
+
+	test_top_features_store.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Verifica lo store SQLite delle top features precalcolate: la lettura
+	restituisce la lista nel formato della sessione e tutti i thread delle
+	richieste condividono un'unica connessione in sola lettura.
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+
+from top_features_store import TopFeaturesStore, create_top_features_store, encode_top_features
+
+#	########################################################################	#
+#	FIXTURE
+
+TOP_FEATURES_LIST = [
+	{
+		"id": 7, "category": "genres", "name": "Drama", "rating": 4.25,
+		"movies": [(10, 4.5, False), (11, 3.0, True), (12, 3.75, False)]
+	},
+]
+
+@pytest.fixture
+def store_path(tmp_path):
+	"""Store con le top features di due utenti."""
+
+	path = tmp_path / 'top_features.sqlite'
+	connection = create_top_features_store(path)
+	with connection:
+		connection.executemany('INSERT INTO user_top_features VALUES (?, ?, ?, ?)', [
+			(user_id, 5, 3, encode_top_features(TOP_FEATURES_LIST)) for user_id in (1, 2)
+		])
+	connection.close()
+	return path
+
+	# end
+
+#	########################################################################	#
+#	TEST
+
+def test_get_decodes_session_format(store_path):
+
+	store = TopFeaturesStore(store_path)
+
+	top_features_list = store.get(1, 5, 3)
+	assert top_features_list[0]["name"] == "Drama"
+	assert top_features_list[0]["movies"] == [(10, 4.5, False), (12, 3.75, False)]
+
+	assert store.get(3, 5, 3) is None
+	assert store.get(1, 6, 3) is None
+
+	store.close()
+
+	# end
+
+def test_request_threads_share_one_connection(store_path):
+
+	store = TopFeaturesStore(store_path)
+
+	# Come ThreadingHTTPServer: ogni richiesta è eseguita da un nuovo thread.
+	results = []
+	for user_id in (1, 2, 1, 2):
+		thread = threading.Thread(target=lambda u=user_id: results.append(store.get(u, 5, 3)))
+		thread.start()
+		thread.join()
+
+	connection = store._connection
+	assert len(results) == 4 and all(r is not None for r in results)
+
+	with ThreadPoolExecutor(max_workers=8) as executor:
+		assert all(executor.map(lambda u: store.get(u, 5, 3) is not None, [1, 2] * 50))
+
+	assert store._connection is connection
+
+	store.close()
+	assert store._connection is None
+
+	# end
@@ -0,0 +1,128 @@
+"""
+
+	top_features_store.py \n
+	by MARIO GABRIELE CAROFANO and OLEKSANDR SOSOVSKYY.
+
+	Implementa uno store SQLite, incorporato nel server, delle top features
+	precalcolate per ogni utente. Per ogni terna (utente, MIN_SUPPORT,
+	TOP_FEATURES) viene salvata in JSON la lista delle top features con i
+	film non visti candidati al MAB e i relativi rating complementati: al
+	login la lista viene letta con una sola query per chiave primaria.
+
+	Il file viene scritto una sola volta dallo script 'build_top_features.py'
+	e aperto dal server in sola lettura, con un'unica connessione condivisa
+	dai thread delle richieste: il server avvia un thread per ogni richiesta,
+	quindi una connessione per thread verrebbe aperta ad ogni login.
+
+"""
+
+#	########################################################################	#
+#	LIBRERIE
+
+import json
+import sqlite3
+import threading
+
+#	########################################################################	#
+#	VARIABILI GLOBALI
+
+STORE_SCHEMA = """
+	CREATE TABLE IF NOT EXISTS user_top_features (
+		user_id INTEGER NOT NULL,
+		min_support INTEGER NOT NULL,
+		top_features INTEGER NOT NULL,
+		payload TEXT NOT NULL,
+		PRIMARY KEY (user_id, min_support, top_features)
+	) WITHOUT ROWID
+"""
+"""Schema della tabella delle top features precalcolate."""
+
+#	########################################################################	#
+#	CLASSI
+
+class TopFeaturesStore:
+	"""Store SQLite (in sola lettura) delle top features precalcolate, indicizzato per utente e parametri."""
+
+	def __init__(self, path):
+
+		self.path = path
+		"""Percorso del file SQLite."""
+
+		self._connection = None
+		self._lock = threading.Lock()
+		"""Serializza l'uso della connessione condivisa tra i thread."""
+
+		# end
+
+	def _open(self) -> sqlite3.Connection:
+		"""Restituisce la connessione condivisa, aprendola alla prima richiesta (da chiamare con il lock)."""
+
+		if self._connection is None:
+			self._connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+
+		return self._connection
+
+		# end
+
+	def get(self, user_id: int, min_support: int, top_features: int):
+		"""
+		Restituisce le top features precalcolate dell'utente, nel formato di 'session.top_features_list'
+		(i film sono tuple (movieId, rating, seen) con seen sempre False), oppure None se assenti.
+		"""
+
+		with self._lock:
+			row = self._open().execute(
+				'SELECT payload FROM user_top_features WHERE user_id = ? AND min_support = ? AND top_features = ?',
+				(user_id, min_support, top_features)
+			).fetchone()
+
+		if row is None:
+			return None
+
+		top_features_list = json.loads(row[0])
+		for f in top_features_list:
+			f["movies"] = [(m_id, rating, False) for m_id, rating in f["movies"]]
+
+		return top_features_list
+
+		# end
+
+	def close(self):
+		"""Chiude la connessione condivisa, se aperta."""
+
+		with self._lock:
+			if self._connection is not None:
+				self._connection.close()
+				self._connection = None
+
+		# end
+
+	# end class
+
+#	########################################################################	#
+#	ALTRE FUNZIONI
+
+def create_top_features_store(path) -> sqlite3.Connection:
+	"""Crea (o apre) lo store in scrittura e restituisce la connessione."""
+
+	connection = sqlite3.connect(path)
+	connection.execute(STORE_SCHEMA)
+	return connection
+
+	# end
+
+def encode_top_features(top_features_list) -> str:
+	"""Serializza in JSON le top features, mantenendo solo i film non visti come coppie [movieId, rating]."""
+
+	return json.dumps([
+		{
+			"id": f["id"],
+			"category": f["category"],
+			"name": f["name"],
+			"rating": f["rating"],
+			"movies": [[m_id, rating] for m_id, rating, seen in f["movies"] if not seen]
+		}
+		for f in top_features_list
+	], separators=(',', ':'))
+
+	# end
@@ -5,15 +5,20 @@
 
     Questo script costruisce la matrice sparsa film x feature a partire dai file CSV dei metadati dei film. Ogni feature è rappresentata come una coppia (categoria, valore), dove la categoria può essere ad esempio 'genres', 'directors', 'actors', ecc. La matrice sparsa risultante viene salvata in formato NPZ, insieme agli indici dei film e delle feature in file CSV.
 
+    La costruzione procede per array: ogni file dei metadati viene letto in blocco, le coppie (riga, colonna) vengono raccolte in array int32 e la matrice viene assemblata con un'unica 'coo_matrix' (valori uint8), eliminando i duplicati e convertendo in CSR una sola volta.
+
+    Con '--incremental' la matrice e gli indici esistenti vengono aggiornati senza cambiare gli id già assegnati: i nuovi film e le nuove coppie (categoria, valore) ricevono id in coda e vengono riscritte solo le righe dei film le cui feature sono cambiate.
+
 """
 
 #   ########################################################################    #
 #   LIBRERIE
 
+import argparse
+
+import numpy as np
 import pandas as pd
-from collections import defaultdict
-from tqdm import tqdm
-from scipy.sparse import lil_matrix, save_npz
+from scipy.sparse import coo_matrix, csr_matrix, diags, load_npz, save_npz
 
 from constants import EXISTING_MOVIES_PATH, \
     MOVIE_FEATURE_MATRIX_PATH, \
@@ -22,82 +27,258 @@ from constants import EXISTING_MOVIES_PATH, \
     CATEGORIES_PATH_MAPPING
 
 #   ########################################################################    #
-#   CARICA GLI ID DEI FILM
+#   LETTURA DEI METADATI
+
+def read_category_pairs(category: str, file_path, movie_id_to_index: dict) -> pd.DataFrame:
+    """
+    Legge in blocco un file dei metadati e restituisce le coppie (riga del film, valore).
+
+    Ogni riga del file è divisa sulla prima virgola in 'movieId' e valore (entrambi
+    ripuliti dagli spazi, senza interpretare le virgolette CSV); le righe vuote,
+    senza virgola o relative a film non presenti vengono scartate.
+    """
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        lines = pd.Series(f.read().split('\n'), dtype=object).str.strip()
+
+    parts = lines[lines != ''].str.split(',', n=1, expand=True)
+    if parts.shape[1] < 2:
+        return pd.DataFrame({"row": np.zeros(0, dtype=np.int32), "category": category, "feature": []})
 
-movies_df = pd.read_csv(EXISTING_MOVIES_PATH)
-movie_ids = movies_df['movieID'].astype(str).tolist()
-movie_id_to_index = {mid: i for i, mid in enumerate(movie_ids)}
+    parts = parts.dropna()
+    rows = parts[0].str.strip().map(movie_id_to_index)
+    found = rows.notna()
 
-print(f"Sono stati caricati {len(movie_ids)} film.")
+    return pd.DataFrame({
+        "row": rows[found].to_numpy(dtype=np.int32),
+        "category": category,
+        "feature": parts[1][found].str.strip().to_numpy(dtype=object)
+    })
+
+    # end
+
+def collect_pairs(movie_id_to_index: dict) -> pd.DataFrame:
+    """Legge tutti i file dei metadati e restituisce le coppie (riga, categoria, valore)."""
+
+    pairs = []
+    for category, file_path in CATEGORIES_PATH_MAPPING.items():
+        print(f"Reading {file_path} ...")
+        pairs.append(read_category_pairs(category, file_path, movie_id_to_index))
+
+    return pd.concat(pairs, ignore_index=True)
+
+    # end
 
 #   ########################################################################    #
-#   COLLEZIONA TUTTE LE FEATURE PER CIASCUN FILM E CATEGORIA
+#   COSTRUZIONE DELLA MATRICE
 
-movie_to_features = defaultdict(list)
-all_features = []
+def build_feature_matrix(rows, cols, num_movies: int, num_features: int):
+    """
+    Assembla la matrice CSR binaria (film x feature) a partire dagli array int32
+    delle coordinate, rimuovendo le coppie (riga, colonna) duplicate.
+    """
 
-print("Scanning dei metadata files per costruire la lista delle feature e il mapping...")
+    keys = np.unique(rows.astype(np.int64) * num_features + cols)
+    rows, cols = np.divmod(keys, num_features)
 
-for category, file_path in CATEGORIES_PATH_MAPPING.items():
-    print(f"Reading {file_path} ...")
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split(',', 1)
-            if len(parts) < 2:
-                continue
-            movie_id, value = parts[0].strip(), parts[1].strip()
-            if movie_id in movie_id_to_index:
-                # Associa al film la coppia (categoria, feature)
-                feature_key = (category, value)
-                movie_to_features[movie_id].append(feature_key)
-                all_features.append(feature_key)
+    return coo_matrix(
+        (np.ones(keys.size, dtype=np.uint8), (rows.astype(np.int32), cols.astype(np.int32))),
+        shape=(num_movies, num_features)
+    ).tocsr()
+
+    # end
 
 #   ########################################################################    #
-#   CREA UN INDICE GLOBALE PER TUTTE LE FEATURE (categoria, valore)
+#   COSTRUZIONE COMPLETA
+
+def build_full(movies_df):
+    """
+    Costruisce da zero la matrice e gli indici: i film seguono l'ordine di
+    'existing_movies.csv', le feature sono numerate in ordine (categoria, valore).
+    """
 
-unique_features = sorted(set(all_features), key=lambda x: (x[0], x[1]))
-feature_to_index = {feat: i for i, feat in enumerate(unique_features)}
+    movie_ids = movies_df['movieID'].astype(str).tolist()
+    movie_id_to_index = {mid: i for i, mid in enumerate(movie_ids)}
 
-print(f"Coppie (category, feature) uniche totali: {len(unique_features)}")
+    #   ####################################################################    #
+    #   COLLEZIONA TUTTE LE FEATURE PER CIASCUN FILM E CATEGORIA
+
+    print("Scanning dei metadata files per costruire la lista delle feature e il mapping...")
+    pairs = collect_pairs(movie_id_to_index)
+
+    #   ####################################################################    #
+    #   CREA UN INDICE GLOBALE PER TUTTE LE FEATURE (categoria, valore)
+
+    # Le feature sono numerate in ordine (categoria, valore), come con 'sorted'.
+    cols = pairs.groupby(["category", "feature"], sort=True).ngroup().to_numpy(dtype=np.int32)
+    unique_features = pairs.assign(feature_id=cols) \
+        .drop_duplicates("feature_id") \
+        .sort_values("feature_id")
+
+    print(f"Coppie (category, feature) uniche totali: {len(unique_features)}")
+
+    #   ####################################################################    #
+    #   COSTRUISCI LA MATRICE SPARSA (film x feature)
+
+    print("Building sparse matrix...")
+
+    num_movies = len(movie_ids)
+    num_features = len(unique_features)
+    sparse_matrix = build_feature_matrix(pairs["row"].to_numpy(), cols, num_movies, num_features)
+
+    feature_df = pd.DataFrame({
+        "feature_id": range(num_features),
+        "category": unique_features["category"].to_numpy(),
+        "feature": unique_features["feature"].to_numpy()
+    })
+
+    return sparse_matrix, feature_df, movie_id_to_index
+
+    # end
 
 #   ########################################################################    #
-#   COSTRUISCI LA MATRICE SPARSA (film x feature)
+#   AGGIORNAMENTO INCREMENTALE
+
+def update_incremental(movies_df):
+    """
+    Aggiorna la matrice e gli indici esistenti mantenendo stabili gli id.
+
+    I film di 'existing_movies.csv' non ancora indicizzati e le coppie (categoria,
+    valore) mai viste vengono aggiunti in coda, con nuovi id. Vengono riscritte
+    solo le righe dei film le cui feature sono cambiate; le righe dei film non
+    più presenti in 'existing_movies.csv' restano invariate.
+    """
+
+    #   ####################################################################    #
+    #   CARICAMENTO DEGLI OUTPUT ESISTENTI
+
+    old_matrix = load_npz(MOVIE_FEATURE_MATRIX_PATH).tocsr()
+    old_movie_df = pd.read_csv(MOVIE_INDEX_PATH, dtype=int).sort_values("matrix_id")
+    old_feature_df = pd.read_csv(FEATURE_INDEX_PATH, dtype={"category": str, "feature": str}, keep_default_na=False)
+
+    #   ####################################################################    #
+    #   NUOVI FILM IN CODA
+
+    movie_ids = old_movie_df["movie_id"].astype(str).tolist()
+    current_ids = movies_df["movieID"].astype(str).tolist()
+    known = set(movie_ids)
+    new_movie_ids = [mid for mid in dict.fromkeys(current_ids) if mid not in known]
+    movie_ids += new_movie_ids
+    movie_id_to_index = {mid: i for i, mid in enumerate(movie_ids)}
 
-print("Building sparse matrix...")
+    print(f"Film indicizzati: {len(old_movie_df)}, nuovi film: {len(new_movie_ids)}")
 
-num_movies = len(movie_ids)
-num_features = len(unique_features)
-sparse_matrix = lil_matrix((num_movies, num_features), dtype=int)
+    #   ####################################################################    #
+    #   NUOVE FEATURE IN CODA
 
-for movie_id, features in tqdm(movie_to_features.items()):
-    row_idx = movie_id_to_index[movie_id]
-    for feature_key in features:
-        col_idx = feature_to_index[feature_key]
-        sparse_matrix[row_idx, col_idx] = 1
+    pairs = collect_pairs(movie_id_to_index)
+
+    pairs = pairs.merge(old_feature_df, on=["category", "feature"], how="left")
+    is_new = pairs["feature_id"].isna()
+
+    new_features = pairs.loc[is_new, ["category", "feature"]] \
+        .drop_duplicates() \
+        .sort_values(["category", "feature"], ignore_index=True)
+    new_features["feature_id"] = np.arange(len(old_feature_df), len(old_feature_df) + len(new_features))
+
+    if len(new_features):
+        new_ids = pairs.loc[is_new, ["category", "feature"]].merge(new_features, on=["category", "feature"], how="left")
+        pairs.loc[is_new, "feature_id"] = new_ids["feature_id"].to_numpy()
+
+    print(f"Feature indicizzate: {len(old_feature_df)}, nuove feature: {len(new_features)}")
+
+    #   ####################################################################    #
+    #   AGGIORNAMENTO DELLE SOLE RIGHE MODIFICATE
+
+    num_movies = len(movie_ids)
+    num_features = len(old_feature_df) + len(new_features)
+
+    fresh_matrix = build_feature_matrix(
+        pairs["row"].to_numpy(),
+        pairs["feature_id"].to_numpy(dtype=np.int32),
+        num_movies,
+        num_features
+    )
+
+    # La matrice esistente viene estesa con righe vuote (nuovi film) e colonne vuote (nuove feature).
+    old_indptr = np.concatenate([old_matrix.indptr, np.full(num_movies - old_matrix.shape[0], old_matrix.nnz)])
+    old_matrix = csr_matrix((old_matrix.data, old_matrix.indices, old_indptr), shape=(num_movies, num_features))
+
+    # Righe modificate, esclusi i film non più presenti (mantengono le feature già note).
+    affected = np.zeros(num_movies, dtype=bool)
+    affected[np.unique((old_matrix != fresh_matrix).nonzero()[0])] = True
+    affected[[movie_id_to_index[mid] for mid in set(movie_ids) - set(current_ids)]] = False
+
+    print(f"Righe aggiornate: {np.count_nonzero(affected)} su {num_movies}")
+
+    sparse_matrix = (
+        diags(~affected, dtype=np.uint8) @ old_matrix + diags(affected, dtype=np.uint8) @ fresh_matrix
+    ).tocsr()
+    sparse_matrix.sort_indices()
+
+    feature_df = pd.concat([
+        old_feature_df,
+        new_features[["feature_id", "category", "feature"]]
+    ], ignore_index=True)
+
+    return sparse_matrix, feature_df, movie_id_to_index
+
+    # end
 
 #   ########################################################################    #
-#   SALVATAGGIO DEGLI OUTPUT
-
-# Salva la matrice sparsa e gli indici
-save_npz(MOVIE_FEATURE_MATRIX_PATH, sparse_matrix.tocsr())
-print(f"Saved sparse matrix to {MOVIE_FEATURE_MATRIX_PATH}")
-
-# Crea il file CSV con l’indice delle feature
-feature_df = pd.DataFrame({
-    "feature_id": range(num_features),
-    "category": [f[0] for f in unique_features],
-    "feature": [f[1] for f in unique_features]
-})
-feature_df.to_csv(FEATURE_INDEX_PATH, index=False)
-print(f"Saved feature index (with categories) to {FEATURE_INDEX_PATH}")
-
-# Crea il file CSV con l’indice dei film
-movie_df = pd.DataFrame(
-    list(movie_id_to_index.items()),
-    columns=["movie_id", "matrix_id"]
-)
-movie_df.to_csv(MOVIE_INDEX_PATH, index=False, quotechar="'")
-print(f"Saved movie index to {MOVIE_INDEX_PATH}")
\ No newline at end of file
+#   MAIN
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Costruisce la matrice sparsa film x feature.")
+    parser.add_argument('--incremental', action='store_true',
+        help="aggiorna la matrice e gli indici esistenti mantenendo stabili gli id di film e feature")
+    args = parser.parse_args()
+
+    #   ####################################################################    #
+    #   CARICA GLI ID DEI FILM
+
+    movies_df = pd.read_csv(EXISTING_MOVIES_PATH)
+    print(f"Sono stati caricati {len(movies_df)} film.")
+
+    #   ####################################################################    #
+    #   AGGIORNAMENTO INCREMENTALE (id stabili)
+
+    outputs = [MOVIE_FEATURE_MATRIX_PATH, FEATURE_INDEX_PATH, MOVIE_INDEX_PATH]
+
+    if args.incremental and all(path.exists() for path in outputs):
+        print("Aggiornamento incrementale della matrice e degli indici esistenti...")
+        sparse_matrix, feature_df, movie_id_to_index = update_incremental(movies_df)
+
+    else:
+        if args.incremental:
+            print("Output esistenti non trovati: costruzione completa.")
+
+        sparse_matrix, feature_df, movie_id_to_index = build_full(movies_df)
+
+    #   ####################################################################    #
+    #   SALVATAGGIO DEGLI OUTPUT
+
+    # Salva la matrice sparsa e gli indici
+    save_npz(MOVIE_FEATURE_MATRIX_PATH, sparse_matrix)
+    print(f"Saved sparse matrix to {MOVIE_FEATURE_MATRIX_PATH}")
+
+    # Crea il file CSV con l’indice delle feature
+    feature_df.to_csv(FEATURE_INDEX_PATH, index=False)
+    print(f"Saved feature index (with categories) to {FEATURE_INDEX_PATH}")
+
+    # Crea il file CSV con l’indice dei film
+    movie_df = pd.DataFrame(
+        list(movie_id_to_index.items()),
+        columns=["movie_id", "matrix_id"]
+    )
+    movie_df.to_csv(MOVIE_INDEX_PATH, index=False, quotechar="'")
+    print(f"Saved movie index to {MOVIE_INDEX_PATH}")
+
+    # end
+
+#   ########################################################################    #
+#   ENTRY POINT
+
+if __name__ == '__main__':
+    main()